@@ -1,13 +1,44 @@
 from fastapi import FastAPI, HTTPException, Depends, status, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, PlainTextResponse
+from fastapi import Request, Response, Header
 from pydantic import BaseModel
-from typing import List, Dict, Optional, Union, Any, Literal
+from typing import List, Dict, Optional, Union, Any, Literal, Iterable, Iterator, Tuple, Set, get_args
+import abc
 import asyncio
-import random
+import array
+import codecs
+import contextlib
+import functools
+import gzip
+import hashlib
+import json
+import os
 import logging
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from datetime import datetime
 import paramiko
+try:
+    import asyncssh
+except ImportError:  # asyncsshバックエンドを使う場合のみ必要
+    asyncssh = None
+try:
+    import orjson
+except ImportError:  # FAST_JSON=1 の場合のみ使用
+    orjson = None
+try:
+    import brotli
+except ImportError:  # インストールされていればbrで圧縮
+    brotli = None
 import re
+import select
+import socket
 import ipaddress
 from enum import Enum
 
@@ -18,7 +49,34 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Network Router API")
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI):
+    """起動時にキャッシュを開いて定期タスクを開始し、終了時に止める"""
+    vendor_cache.open()
+    history_store.open()
+    ssh_pool_task = asyncio.create_task(ssh_pool_maintenance())
+    diagnostics_task = None
+    if DIAGNOSTICS_INTERVAL > 0:
+        diagnostics_task = asyncio.create_task(diagnostics_scheduler.run())
+    history_task = None
+    if HISTORY_INTERVAL > 0:
+        history_task = asyncio.create_task(history_recorder.run())
+    try:
+        yield
+    finally:
+        ssh_pool_task.cancel()
+        if diagnostics_task is not None:
+            diagnostics_task.cancel()
+            await diagnostics_scheduler.stop()
+        if history_task is not None:
+            history_task.cancel()
+        await ssh_backend.close_all()
+        ssh_executor.shutdown(wait=False, cancel_futures=True)
+        vendor_probe_executor.shutdown(wait=False, cancel_futures=True)
+        vendor_cache.close()
+        history_store.close()
+
+app = FastAPI(title="Network Router API", lifespan=lifespan)
 
 # CORS設定
 app.add_middleware(
@@ -29,6 +87,24 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """エンドポイントごとのレイテンシを記録（ラベルはパスではなくルートのテンプレート）"""
+    started = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        HTTP_REQUEST_SECONDS.observe(
+            time.perf_counter() - started,
+            method=request.method,
+            route=getattr(route, "path", "unmatched"),
+            status=status_code,
+        )
+
 # サポートするベンダーの列挙型
 class VendorType(str, Enum):
     CISCO = "cisco"
@@ -111,6 +187,9 @@ class DiagnosticResult(BaseModel):
     summary: str
     issues: List[DiagnosticIssue]
     timestamp: str
+    timings: Optional[Dict[str, float]] = None  # データ収集とチェックごとの所要時間（ミリ秒）
+    skipped_checks: Optional[List[str]] = None  # データ取得失敗などで実行できなかったチェック
+    reused_checks: Optional[List[str]] = None  # 入力が変わっていないため前回の結果を使ったチェック
 
 class ConnectionResponse(BaseModel):
     success: bool
@@ -118,17 +197,226 @@ class ConnectionResponse(BaseModel):
     session_id: Optional[str] = None
     vendor: Optional[VendorType] = None
 
+class RouteLookupRequest(BaseModel):
+    destinations: List[str]
+
+class TopologyCrawlRequest(RouterInfo):
+    # ip は起点のルーター。認証情報は発見した全デバイスで共通に使う
+    max_depth: Optional[int] = None  # 起点から何ホップ先まで隣接情報を取得するか
+    concurrency: Optional[int] = None
+    fresh: bool = False
+
+ProbeKind = Literal["ping", "traceroute"]
+
+class ProbeBatchRequest(BaseModel):
+    targets: List[str]
+    probes: List[ProbeKind] = ["ping"]
+    count: int = 5  # pingの送信回数
+
+BulkDataKind = Literal["version", "interfaces", "routes", "neighbors"]
+
+class BulkCollectRequest(BaseModel):
+    ips: Optional[List[str]] = None  # 省略時は接続中の全ルーター
+    kinds: List[BulkDataKind] = ["version", "interfaces", "routes", "neighbors"]
+    timeout: Optional[float] = None  # デバイスごとのタイムアウト（秒）
+    fresh: bool = False
+
+# メトリクス（Prometheusのテキスト形式で /metrics から公開）
+SSH_LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+PARSE_DURATION_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+HTTP_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+def format_labels(labelnames, values) -> str:
+    if not labelnames:
+        return ""
+    pairs = []
+    for name, value in zip(labelnames, values):
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+class Counter:
+    """単調増加するカウンター"""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in self._values.items():
+                lines.append(f"{self.name}{format_labels(self.labelnames, key)} {value}")
+        return lines
+
+class Histogram:
+    """累積バケット形式のヒストグラム"""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = HTTP_LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                # [バケットごとの件数..., 合計, 件数]
+                series = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        labelnames = self.labelnames + ("le",)
+        with self._lock:
+            for key, series in self._values.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets, series):
+                    cumulative += count
+                    lines.append(f"{self.name}_bucket{format_labels(labelnames, key + (bound,))} {cumulative}")
+                lines.append(f"{self.name}_bucket{format_labels(labelnames, key + ('+Inf',))} {series[-1]}")
+                lines.append(f"{self.name}_sum{format_labels(self.labelnames, key)} {series[-2]}")
+                lines.append(f"{self.name}_count{format_labels(self.labelnames, key)} {series[-1]}")
+        return lines
+
+class Gauge:
+    """出力時にコールバックで値を取得するゲージ
+
+    コールバックは数値、または {ラベル値のタプル: 数値} を返す。
+    """
+
+    def __init__(self, name: str, documentation: str, callback, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+        self.labelnames = labelnames
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        try:
+            value = self.callback()
+        except Exception as e:
+            logger.warning(f"Failed to collect metric {self.name}: {str(e)}")
+            return lines
+        if isinstance(value, dict):
+            for key, item in value.items():
+                lines.append(f"{self.name}{format_labels(self.labelnames, key)} {item}")
+        else:
+            lines.append(f"{self.name} {value}")
+        return lines
+
+METRICS: List[Any] = []
+
+def register_metric(metric):
+    METRICS.append(metric)
+    return metric
+
+SSH_COMMAND_SECONDS = register_metric(Histogram(
+    "router_api_ssh_command_seconds", "SSH command latency including the device and network",
+    ("vendor", "command", "outcome"), SSH_LATENCY_BUCKETS
+))
+SSH_EXECUTOR_WAIT_SECONDS = register_metric(Histogram(
+    "router_api_ssh_executor_wait_seconds", "Time SSH work waited for a router slot and an executor thread",
+    (), SSH_LATENCY_BUCKETS
+))
+PARSE_SECONDS = register_metric(Histogram(
+    "router_api_parse_seconds", "Time spent in output parsers", ("parser", "vendor"), PARSE_DURATION_BUCKETS
+))
+HTTP_REQUEST_SECONDS = register_metric(Histogram(
+    "router_api_http_request_seconds", "HTTP request latency by route", ("method", "route", "status"), HTTP_LATENCY_BUCKETS
+))
+DUMMY_FALLBACKS = register_metric(Counter(
+    "router_api_dummy_fallbacks_total", "Responses served from dummy data", ("endpoint", "reason")
+))
+HISTORY_COLLECTIONS = register_metric(Counter(
+    "router_api_history_collections_total", "Scheduled history collections by result", ("result",)
+))
+HISTORY_SAMPLES = register_metric(Counter(
+    "router_api_history_samples_total", "Samples written to the history store", ("metric",)
+))
+
+def vendor_label(vendor) -> str:
+    return vendor.value if isinstance(vendor, VendorType) else str(vendor or "unknown")
+
+def command_kind(vendor, command: str) -> str:
+    """メトリクスのラベル用にコマンドをVENDOR_COMMANDSの種別に変換（該当なしは custom）"""
+    templates = VENDOR_COMMANDS.get(vendor, VENDOR_COMMANDS[VendorType.CISCO])
+    prefix_kind = None
+    for kind, template in templates.items():
+        if command == template:
+            return kind
+        prefix = template.split("{")[0]
+        if "{" in template and prefix and command.startswith(prefix) and prefix_kind is None:
+            prefix_kind = kind
+    return prefix_kind or "custom"
+
+def instrument_ssh(func):
+    """SSHバックエンドのコマンド実行 (self, ip, command, ...) の所要時間を記録"""
+    @functools.wraps(func)
+    async def wrapper(self, ip, command, *args, **kwargs):
+        started = time.perf_counter()
+        result = None
+        try:
+            result = await func(self, ip, command, *args, **kwargs)
+            return result
+        finally:
+            # 接続中はセッションのベンダー（再検出で変わる場合がある）、接続処理中は検出済みのベンダー
+            vendor = session_registry.vendor_of(ip) or vendor_cache.get(ip) or VendorType.UNKNOWN
+            SSH_COMMAND_SECONDS.observe(
+                time.perf_counter() - started,
+                vendor=vendor_label(vendor),
+                command=command_kind(vendor, command),
+                outcome="success" if result and result.get("success") else "failure",
+            )
+    return wrapper
+
+def instrument_parser(func):
+    """パーサー (output, ..., vendor) の所要時間をパーサー名ごとに記録"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            vendor = kwargs.get("vendor", args[-1] if args else None)
+            PARSE_SECONDS.observe(time.perf_counter() - started, parser=func.__name__, vendor=vendor_label(vendor))
+    return wrapper
+
+def render_metrics() -> str:
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
 # ベンダー固有のコマンド
 VENDOR_COMMANDS = {
     VendorType.CISCO: {
         "version": "show version",
         "interfaces": "show ip interface brief",
         "interface_detail": "show interfaces {interface}",
+        "interface_detail_all": "show interfaces",
         "routing_table": "show ip route",
         "neighbors": "show cdp neighbors detail",
         "config": "show running-config",
         "traceroute": "traceroute {target}",
-        "ping": "ping {target}",
+        "ping": "ping {target} repeat {count}",
         "vrf_list": "show vrf",
         "vrf_interfaces": "show ip vrf interfaces",
         "vrf_routes": "show ip route vrf {vrf}",
@@ -137,11 +425,12 @@ VENDOR_COMMANDS = {
         "version": "show version",
         "interfaces": "show interfaces terse",
         "interface_detail": "show interfaces {interface} detail",
+        "interface_detail_all": "show interfaces detail",
         "routing_table": "show route",
         "neighbors": "show lldp neighbors",
         "config": "show configuration",
         "traceroute": "traceroute {target}",
-        "ping": "ping {target} count 5",
+        "ping": "ping {target} count {count}",
         "vrf_list": "show routing-instances",
         "vrf_interfaces": "show interfaces routing-instance {vrf}",
         "vrf_routes": "show route table {vrf}.inet.0",
@@ -150,11 +439,12 @@ VENDOR_COMMANDS = {
         "version": "display version",
         "interfaces": "display interface brief",
         "interface_detail": "display interface {interface}",
+        "interface_detail_all": "display interface",
         "routing_table": "display ip routing-table",
         "neighbors": "display lldp neighbor",
         "config": "display current-configuration",
         "traceroute": "tracert {target}",
-        "ping": "ping {target}",
+        "ping": "ping -c {count} {target}",
         "vrf_list": "display ip vpn-instance",
         "vrf_interfaces": "display ip vpn-instance interface",
         "vrf_routes": "display ip routing-table vpn-instance {vrf}",
@@ -163,11 +453,12 @@ VENDOR_COMMANDS = {
         "version": "display version",
         "interfaces": "display ip interface brief",
         "interface_detail": "display interface {interface}",
+        "interface_detail_all": "display interface",
         "routing_table": "display ip routing-table",
         "neighbors": "display lldp neighbor",
         "config": "display current-configuration",
         "traceroute": "tracert {target}",
-        "ping": "ping {target}",
+        "ping": "ping -c {count} {target}",
         "vrf_list": "display ip vpn-instance",
         "vrf_interfaces": "display ip vpn-instance interface",
         "vrf_routes": "display ip routing-table vpn-instance {vrf}",
@@ -176,156 +467,623 @@ VENDOR_COMMANDS = {
         "version": "/system resource print",
         "interfaces": "/interface print detail",
         "interface_detail": "/interface print detail where name={interface}",
+        "interface_detail_all": "/interface print detail",
         "routing_table": "/ip route print detail",
         "neighbors": "/ip neighbor print detail",
         "config": "/export",
-        "traceroute": "/tool traceroute {target}",
-        "ping": "/ping {target} count=5",
+        "traceroute": "/tool traceroute {target} count=3",
+        "ping": "/ping {target} count={count}",
         "vrf_list": "/routing table print",
         "vrf_interfaces": "/ip address print where routing-table={vrf}",
         "vrf_routes": "/ip route print where routing-table={vrf}",
     },
 }
 
+# インターフェース詳細の取得方法
+# serial: 1インターフェースずつ, parallel: 複数チャネルで同時実行, batched: 1コマンドでまとめて取得
+InterfaceDetailMode = Literal["serial", "parallel", "batched"]
+INTERFACE_DETAIL_MODE = os.getenv("INTERFACE_DETAIL_MODE", "parallel")
+if INTERFACE_DETAIL_MODE not in get_args(InterfaceDetailMode):
+    # クエリパラメータのデフォルト値は検証されないため、ここで弾く
+    logger.error(
+        f"Unknown INTERFACE_DETAIL_MODE {INTERFACE_DETAIL_MODE}, "
+        f"expected one of {', '.join(get_args(InterfaceDetailMode))}; using parallel"
+    )
+    INTERFACE_DETAIL_MODE = "parallel"
+INTERFACE_DETAIL_FANOUT = int(os.getenv("INTERFACE_DETAIL_FANOUT", "4"))
+
 # 接続したルーターとセッションの管理
-connected_routers = {}
+SESSION_TTL = int(os.getenv("SESSION_TTL", "3600"))
 
-# ダミーデータ - 接続できない場合のフォールバック用
-DUMMY_ROUTERS = {
-    VendorType.CISCO: {
-        "info": {
-            "name": "Cisco R1",
-            "model": "C892FSP-K9",
-            "serial_number": "FTX1840ABCD",
-            "firmware_version": "15.7(3)M2",
-            "uptime": "10 days, 4 hours, 32 minutes"
-        },
-        "interfaces": {
-            "GigabitEthernet0/0": {
-                "name": "GigabitEthernet0/0",
-                "status": "up", 
-                "protocol": "up", 
-                "ip": "192.168.1.1",
-                "speed": "1000Mb/s",
-                "duplex": "full",
-                "description": "Connection to PC1",
-                "mac": "00:11:22:33:44:55"
-            },
-            "GigabitEthernet0/1": {
-                "name": "GigabitEthernet0/1",
-                "status": "up", 
-                "protocol": "up", 
-                "ip": "192.168.2.1",
-                "speed": "1000Mb/s",
-                "duplex": "full",
-                "description": "Connection to R2",
-                "mac": "00:11:22:33:44:56"
-            },
-            "GigabitEthernet0/2": {
-                "name": "GigabitEthernet0/2",
-                "status": "administratively down", 
-                "protocol": "down", 
-                "ip": "unassigned",
-                "speed": "auto",
-                "duplex": "auto",
-                "description": "Unused",
-                "mac": "00:11:22:33:44:57"
-            }
-        },
-        "routes": [
-            {"destination": "192.168.1.0", "prefix_length": 24, "next_hop": "Connected", "interface": "GigabitEthernet0/0", "protocol": "C", "metric": 0, "administrative_distance": 0, "type": "Direct"},
-            {"destination": "192.168.2.0", "prefix_length": 24, "next_hop": "Connected", "interface": "GigabitEthernet0/1", "protocol": "C", "metric": 0, "administrative_distance": 0, "type": "Direct"},
-            {"destination": "192.168.3.0", "prefix_length": 24, "next_hop": "192.168.2.2", "interface": "GigabitEthernet0/1", "protocol": "S", "metric": 1, "administrative_distance": 1, "type": "Static"},
-            {"destination": "0.0.0.0", "prefix_length": 0, "next_hop": "192.168.2.2", "interface": "GigabitEthernet0/1", "protocol": "S", "metric": 1, "administrative_distance": 1, "type": "Static"}
-        ]
-    },
-    VendorType.JUNIPER: {
-        "info": {
-            "name": "Juniper R2",
-            "model": "SRX320",
-            "serial_number": "AF1234567890",
-            "firmware_version": "21.4R1.12",
-            "uptime": "15 days, 2 hours, 18 minutes"
-        },
-        "interfaces": {
-            "ge-0/0/0": {
-                "name": "ge-0/0/0",
-                "status": "up", 
-                "protocol": "up", 
-                "ip": "192.168.2.2",
-                "speed": "1000Mb/s",
-                "duplex": "full",
-                "description": "Connection to R1",
-                "mac": "00:a1:b2:c3:d4:e5"
-            },
-            "ge-0/0/1": {
-                "name": "ge-0/0/1",
-                "status": "up", 
-                "protocol": "up", 
-                "ip": "192.168.3.1",
-                "speed": "1000Mb/s",
-                "duplex": "full",
-                "description": "Connection to PC2",
-                "mac": "00:a1:b2:c3:d4:e6"
-            }
-        },
-        "routes": [
-            {"destination": "192.168.1.0", "prefix_length": 24, "next_hop": "192.168.2.1", "interface": "ge-0/0/0", "protocol": "S", "metric": 1, "administrative_distance": 5, "type": "Static"},
-            {"destination": "192.168.2.0", "prefix_length": 24, "next_hop": "Connected", "interface": "ge-0/0/0", "protocol": "Direct", "metric": 0, "administrative_distance": 0, "type": "Direct"},
-            {"destination": "192.168.3.0", "prefix_length": 24, "next_hop": "Connected", "interface": "ge-0/0/1", "protocol": "Direct", "metric": 0, "administrative_distance": 0, "type": "Direct"},
-            {"destination": "0.0.0.0", "prefix_length": 0, "next_hop": "192.168.2.1", "interface": "ge-0/0/0", "protocol": "Static", "metric": 1, "administrative_distance": 5, "type": "Static"}
-        ]
-    }
+class SessionRegistry:
+    """セッションIDとルーターIPの両方から引けるセッション管理
+
+    ルーターIPごとにセッションは1つ。一定時間使われないセッションは期限切れになる。
+    """
+
+    def __init__(self, ttl: int = SESSION_TTL):
+        self.ttl = ttl
+        self._sessions: Dict[str, Dict[str, Any]] = {}
+        self._by_ip: Dict[str, str] = {}
+
+    def _is_expired(self, session: Dict[str, Any]) -> bool:
+        return self.ttl > 0 and time.monotonic() - session["last_used"] > self.ttl
+
+    def create(self, ip: str, vendor: VendorType) -> Dict[str, Any]:
+        """新しいセッションを登録（同じルーターの既存セッションは置き換える）"""
+        old_session_id = self._by_ip.get(ip)
+        if old_session_id:
+            self._sessions.pop(old_session_id, None)
+        
+        session = {
+            "session_id": f"session-{uuid.uuid4().hex}",
+            "ip": ip,
+            "vendor": vendor,
+            "connected_at": datetime.now().isoformat(),
+            "last_used": time.monotonic(),
+        }
+        self._sessions[session["session_id"]] = session
+        self._by_ip[ip] = session["session_id"]
+        return session
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        session = self._sessions.get(session_id)
+        if session is None or self._is_expired(session):
+            return None
+        return session
+
+    def get_by_ip(self, ip: str) -> Optional[Dict[str, Any]]:
+        """ルーターIPからセッションを取得し、最終利用時刻を更新"""
+        session_id = self._by_ip.get(ip)
+        if session_id is None:
+            return None
+        session = self._sessions[session_id]
+        if self._is_expired(session):
+            return None
+        session["last_used"] = time.monotonic()
+        return session
+
+    def vendor_of(self, ip: str) -> Optional[VendorType]:
+        """ルーターIPのセッションのベンダー（最終利用時刻は更新しない）"""
+        session_id = self._by_ip.get(ip)
+        if session_id is None:
+            return None
+        return self._sessions[session_id]["vendor"]
+
+    def remove(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """セッションを削除"""
+        session = self._sessions.pop(session_id, None)
+        if session is not None and self._by_ip.get(session["ip"]) == session_id:
+            del self._by_ip[session["ip"]]
+        return session
+
+    def expire(self) -> List[Dict[str, Any]]:
+        """期限切れのセッションを削除して返す"""
+        expired = [session for session in self._sessions.values() if self._is_expired(session)]
+        for session in expired:
+            self.remove(session["session_id"])
+        return expired
+
+    def ips(self) -> List[str]:
+        return [ip for ip, session_id in self._by_ip.items() if not self._is_expired(self._sessions[session_id])]
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+session_registry = SessionRegistry()
+
+# 合成データ - 接続できない場合のフォールバック用
+# IPごとのシードから決定的に生成する（同じIPには常に同じデータを返す）
+SYNTHETIC_SEED = os.getenv("SYNTHETIC_SEED", "")  # 変えると全デバイスの生成結果が変わる
+SYNTHETIC_ROUTES = int(os.getenv("SYNTHETIC_ROUTES", "20"))  # 接続ルート以外に生成するルート数
+SYNTHETIC_INTERFACES = int(os.getenv("SYNTHETIC_INTERFACES", "4"))  # 最低限のインターフェース数
+SYNTHETIC_FANOUT = int(os.getenv("SYNTHETIC_FANOUT", "4"))  # 1台あたりの下流ルーター数
+SYNTHETIC_CACHE_SIZE = int(os.getenv("SYNTHETIC_CACHE_SIZE", "1024"))  # 生成済みデータを保持するデバイス数
+
+# ベンダーごとの (モデル, ファームウェア, シリアルの接頭辞)
+SYNTHETIC_MODELS = {
+    VendorType.CISCO: (["C892FSP-K9", "ISR4331/K9", "ASR1001-X", "C8300-1N1S-6T"], ["15.7(3)M2", "16.9.4", "17.3.5"], "FTX"),
+    VendorType.JUNIPER: (["SRX320", "MX204", "SRX1500"], ["21.4R1.12", "20.4R3-S2.6", "22.2R1.9"], "AF"),
+    VendorType.HP: (["MSR2003", "MSR3024", "5130-24G-4SFP+ EI"], ["7.1.064", "7.1.070"], "CN"),
+    VendorType.HUAWEI: (["AR2220E", "AR6140-16G4XG", "NE40E-X3"], ["V200R010C10SPC700", "V300R019C10SPC300"], "2102"),
+    VendorType.MIKROTIK: (["RB4011iGS+", "CCR2004-1G-12S+2XS", "CCR1036-8G-2S+"], ["7.11.2", "6.49.10"], "HE0"),
+}
+
+# ベンダーごとの (接続, スタティック, OSPF) のルートプロトコル表記
+SYNTHETIC_ROUTE_PROTOCOLS = {
+    VendorType.CISCO: ("C", "S", "O"),
+    VendorType.MIKROTIK: ("DAC", "AS", "DAo"),
 }
 
+def synthetic_interface_name(vendor, port: int) -> str:
+    """ベンダーの命名規則に沿ったインターフェース名"""
+    if vendor == VendorType.JUNIPER:
+        return f"ge-0/0/{port}"
+    if vendor == VendorType.HP:
+        return f"GigabitEthernet1/0/{port + 1}"
+    if vendor == VendorType.HUAWEI:
+        return f"GigabitEthernet0/0/{port}"
+    if vendor == VendorType.MIKROTIK:
+        return f"ether{port + 1}"
+    return f"GigabitEthernet0/{port}"
+
+class SyntheticRouter:
+    """IPをシードに決定的に生成する仮想ルーター
+
+    同じ /24 の中のホスト番号で木構造（.1 が根、各ルーターの下流に SYNTHETIC_FANOUT 台）を作り、
+    隣接情報・トポロジ・トレースルートはこの木に沿って生成する。
+    各データは初めて参照されたときに生成してキャッシュする。共有されるため変更しないこと。
+    """
+
+    def __init__(self, ip: str, vendor: Optional[VendorType] = None):
+        self.ip = ip
+        self.seed = int.from_bytes(hashlib.blake2b(f"{SYNTHETIC_SEED}:{ip}".encode(), digest_size=8).digest(), "big")
+        try:
+            address = ipaddress.IPv4Address(ip)
+        except ValueError:
+            address = None
+        if address is not None and 1 <= int(address) & 0xFF <= 254:
+            self.site = ip.rsplit(".", 1)[0]
+            self.host = int(address) & 0xFF
+        else:
+            # IPv4以外（ホスト名など）と .0 / .255 は木に含めず、隣接のない単独のルーターとする
+            self.site = None
+            self.host = 0
+        if vendor not in SYNTHETIC_MODELS:
+            vendor = VENDOR_PRIORITY[self.seed % len(VENDOR_PRIORITY)]
+        self.vendor = vendor
+
+    def random(self, *salt) -> random.Random:
+        """用途ごとの乱数（参照順に依存せず同じ値になる）"""
+        return random.Random(f"{self.seed}:{':'.join(map(str, salt))}")
+
+    @staticmethod
+    def parent_of(host: int) -> Optional[int]:
+        return (host - 2) // SYNTHETIC_FANOUT + 1 if host >= 2 else None
+
+    @staticmethod
+    def children_of(host: int) -> range:
+        if host < 1:
+            return range(0)
+        first = SYNTHETIC_FANOUT * (host - 1) + 2
+        return range(min(first, 255), min(first + SYNTHETIC_FANOUT, 255))
+
+    def peer_ip(self, host: int) -> str:
+        return f"{self.site}.{host}"
+
+    def link_subnet(self, child: int) -> str:
+        """親ルーターと child の間の /30（親が .1、子が .2）"""
+        return f"10.{self.site.rsplit('.', 1)[1]}.{child}"
+
+    @property
+    def parent(self) -> Optional[int]:
+        return self.parent_of(self.host) if self.site else None
+
+    @property
+    def children(self) -> range:
+        return self.children_of(self.host) if self.site else range(0)
+
+    @functools.cached_property
+    def hostname(self) -> str:
+        return f"rtr-{self.ip.replace('.', '-').replace(':', '-')}"
+
+    @functools.cached_property
+    def model(self) -> str:
+        models, _, _ = SYNTHETIC_MODELS[self.vendor]
+        return self.random("model").choice(models)
+
+    @functools.cached_property
+    def info(self) -> Dict[str, Any]:
+        models, firmwares, serial_prefix = SYNTHETIC_MODELS[self.vendor]
+        rng = self.random("info")
+        return {
+            "name": get_parser(self.vendor).name,
+            "model": self.model,
+            "serialNumber": f"{serial_prefix}{rng.getrandbits(40):010X}",
+            "firmwareVersion": rng.choice(firmwares),
+            "uptime": f"{rng.randint(1, 400)} days, {rng.randint(0, 23)} hours, {rng.randint(0, 59)} minutes",
+            "ip": self.ip,
+        }
+
+    @functools.cached_property
+    def ports(self) -> List[Dict[str, Any]]:
+        """ポートごとの (用途, アドレス, プレフィックス長, 対向ホスト番号)"""
+        ports = []
+        if self.parent is not None:
+            ports.append({"role": "uplink", "ip": f"{self.link_subnet(self.host)}.2", "prefix_length": 30, "peer": self.parent})
+        elif self.site:
+            third_octet = self.site.rsplit(".", 1)[1]
+            ports.append({"role": "wan", "ip": f"100.64.{third_octet}.2", "prefix_length": 30, "peer": None})
+        for child in self.children:
+            ports.append({"role": "downlink", "ip": f"{self.link_subnet(child)}.1", "prefix_length": 30, "peer": child})
+        ports.append({"role": "lan", "ip": f"172.16.{self.host}.1", "prefix_length": 24, "peer": None})
+        while len(ports) < SYNTHETIC_INTERFACES:
+            ports.append({"role": "unused", "ip": "unassigned", "prefix_length": None, "peer": None})
+        return ports
+
+    def port_for(self, peer: int) -> Optional[str]:
+        for index, port in enumerate(self.ports):
+            if port["peer"] == peer:
+                return synthetic_interface_name(self.vendor, index)
+        return None
+
+    @functools.cached_property
+    def interfaces(self) -> Dict[str, Dict[str, Any]]:
+        mac_base = self.seed & 0xFFFFFFFF00
+        interfaces = {}
+        for index, port in enumerate(self.ports):
+            name = synthetic_interface_name(self.vendor, index)
+            up = port["role"] != "unused"
+            if port["role"] in ("uplink", "downlink"):
+                description = f"Connection to {synthetic_router(self.peer_ip(port['peer'])).hostname}"
+            else:
+                description = {"wan": "Internet", "lan": "LAN", "unused": "Unused"}[port["role"]]
+            mac = (0x02 << 40) | mac_base | index
+            interfaces[name] = {
+                "name": name,
+                "status": "up" if up else "administratively down",
+                "protocol": "up" if up else "down",
+                "ip": port["ip"],
+                "speed": "1000Mb/s" if up else "auto",
+                "duplex": "full" if up else "auto",
+                "description": description,
+                "mac": ":".join(f"{(mac >> shift) & 0xFF:02x}" for shift in range(40, -8, -8)),
+            }
+        return interfaces
+
+    @functools.cached_property
+    def routes(self) -> "RouteTable":
+        connected, static, ospf = SYNTHETIC_ROUTE_PROTOCOLS.get(self.vendor, ("Direct", "Static", "OSPF"))
+        static_distance = 1 if self.vendor == VendorType.CISCO else 5
+        table = RouteTable()
+        gateway = None
+        gateway_interface = None
+        for index, port in enumerate(self.ports):
+            if port["prefix_length"] is None:
+                continue
+            name = synthetic_interface_name(self.vendor, index)
+            network = ipaddress.IPv4Network(f"{port['ip']}/{port['prefix_length']}", strict=False)
+            table.append({
+                "destination": str(network.network_address), "prefix_length": port["prefix_length"],
+                "next_hop": "Connected", "interface": name, "protocol": connected,
+                "metric": 0, "administrative_distance": 0, "type": "Direct",
+            })
+            if port["role"] in ("uplink", "wan"):
+                gateway = str(network.network_address + 1)
+                gateway_interface = name
+        if gateway is not None:
+            table.append({
+                "destination": "0.0.0.0", "prefix_length": 0, "next_hop": gateway, "interface": gateway_interface,
+                "protocol": static, "metric": 1, "administrative_distance": static_distance, "type": "Static",
+            })
+        
+        # OSPFで学習したルート（10.128.0.0/9 の中の連続した /24）
+        # 下流がある場合は下流から、なければ上流から学習したものとする
+        rng = self.random("routes")
+        downlinks = [(index, port) for index, port in enumerate(self.ports) if port["role"] == "downlink"]
+        start = rng.randrange(1 << 15)
+        base = int(ipaddress.IPv4Address("10.128.0.0"))
+        for offset in range(SYNTHETIC_ROUTES):
+            if downlinks:
+                index, port = downlinks[offset % len(downlinks)]
+                next_hop = f"{self.link_subnet(port['peer'])}.2"
+                interface = synthetic_interface_name(self.vendor, index)
+            elif gateway is not None:
+                next_hop, interface = gateway, gateway_interface
+            else:
+                break
+            table.append({
+                "destination": str(ipaddress.IPv4Address(base + (((start + offset) % (1 << 15)) << 8))),
+                "prefix_length": 24, "next_hop": next_hop, "interface": interface, "protocol": ospf,
+                "metric": rng.randint(2, 200), "administrative_distance": 110, "type": "Dynamic",
+            })
+        return table
+
+    @functools.cached_property
+    def route_index(self) -> "RouteLookupIndex":
+        return RouteLookupIndex(self.routes)
+
+    @functools.cached_property
+    def neighbors(self) -> List[Dict[str, Any]]:
+        neighbors = []
+        peers = ([self.parent] if self.parent is not None else []) + list(self.children)
+        for peer in peers:
+            remote = synthetic_router(self.peer_ip(peer))
+            neighbors.append({
+                "device_id": remote.hostname,
+                "ip_address": remote.ip,
+                "platform": f"{get_parser(remote.vendor).name.split()[0]} {remote.model}",
+                "local_interface": self.port_for(peer),
+                "remote_interface": remote.port_for(self.host),
+            })
+        return neighbors
+
+    @functools.cached_property
+    def topology(self) -> Dict[str, Any]:
+        return build_network_topology(self.ip, self.neighbors, self.vendor)
+
+    def path_to(self, target: str) -> List[Tuple[str, Optional[str]]]:
+        """target までの経路上の (アドレス, ホスト名) のリスト（target自身を含む）"""
+        hops = []
+        target_host = None
+        if self.site and target.rsplit(".", 1)[0] == self.site:
+            try:
+                target_host = int(target.rsplit(".", 1)[1])
+            except ValueError:
+                target_host = None
+        
+        if target_host is not None and 1 <= target_host <= 254:
+            # 同じサイト内: 共通の祖先まで上り、そこから下る
+            ancestors = [target_host]
+            while ancestors[-1] != 1:
+                ancestors.append(self.parent_of(ancestors[-1]))
+            current = self.host
+            while current not in ancestors:
+                parent = self.parent_of(current)
+                hops.append((f"{self.link_subnet(current)}.1", synthetic_router(self.peer_ip(parent)).hostname))
+                current = parent
+            for child in reversed(ancestors[:ancestors.index(current)]):
+                if child == target_host:
+                    break
+                hops.append((f"{self.link_subnet(child)}.2", synthetic_router(self.peer_ip(child)).hostname))
+            hops.append((target, synthetic_router(target).hostname))
+            return hops
+        
+        # サイト外: 根のルーターまで上り、インターネット側の経路を辿る
+        current = self.host
+        while self.site and current > 1:
+            parent = self.parent_of(current)
+            hops.append((f"{self.link_subnet(current)}.1", synthetic_router(self.peer_ip(parent)).hostname))
+            current = parent
+        if self.site:
+            hops.append((f"100.64.{self.site.rsplit('.', 1)[1]}.1", None))
+        rng = self.random("path", target)
+        for _ in range(rng.randint(1, 3)):
+            hops.append((f"198.51.100.{rng.randint(1, 254)}", None))
+        hops.append((target, None))
+        return hops
+
+    def traceroute(self, target: str) -> List[Dict[str, Any]]:
+        rng = self.random("traceroute", target)
+        rtt = 0.0
+        hops = []
+        for number, (address, hostname) in enumerate(self.path_to(target), 1):
+            # サイト外の区間は遅延が大きい
+            rtt += rng.uniform(0.3, 1.0) if hostname else rng.uniform(2.0, 8.0)
+            hops.append({"hop": number, "ip": address, "hostname": hostname, "rtt": round(rtt, 1), "status": "success"})
+        return hops
+
+    def ping(self, target: str, count: int = 5) -> Dict[str, Any]:
+        rng = self.random("ping", target)
+        trace = self.traceroute(target)
+        base = trace[-1]["rtt"] if trace else 0.5
+        rtts = [base * rng.uniform(0.8, 1.3) for _ in range(max(1, count))]
+        return {
+            "success": True,
+            "packet_loss": 0,
+            "rtt_min": round(min(rtts), 1),
+            "rtt_avg": round(sum(rtts) / len(rtts), 1),
+            "rtt_max": round(max(rtts), 1),
+            "packets_sent": count,
+            "packets_received": count,
+        }
+
+@functools.lru_cache(maxsize=SYNTHETIC_CACHE_SIZE)
+def synthetic_router(ip: str, vendor: Optional[VendorType] = None) -> SyntheticRouter:
+    """IP（とベンダー）ごとの合成ルーターを取得（LRUでキャッシュ）"""
+    return SyntheticRouter(ip, vendor)
+
 # ベンダー検出
+# 優先順位順（複数にマッチした場合は先のベンダーを採用）
+VENDOR_PRIORITY = [VendorType.CISCO, VendorType.JUNIPER, VendorType.HP, VendorType.HUAWEI, VendorType.MIKROTIK]
+# 単語の途中（"position" の "ios" など）には一致させない
+VENDOR_OUTPUT_PATTERN = re.compile(
+    r'\b(?:(?P<cisco>Cisco|IOS)|(?P<juniper>JUNOS|Juniper)|(?P<hp>HP|Hewlett-Packard|Aruba)'
+    r'|(?P<huawei>Huawei)|(?P<mikrotik>MikroTik|RouterOS))',
+    re.IGNORECASE
+)
+# SSHサーバーのバナー（例: "SSH-2.0-Cisco-1.25", "SSH-2.0-ROSSSH"）
+VENDOR_BANNER_PATTERN = re.compile(
+    r'(?P<cisco>Cisco)|(?P<huawei>HUAWEI)|(?P<hp>Comware)|(?P<mikrotik>ROSSSH)',
+    re.IGNORECASE
+)
+
 def detect_vendor(output: str) -> VendorType:
-    """コマンド出力からベンダーを検出する"""
-    if re.search(r'Cisco|IOS', output, re.IGNORECASE):
-        return VendorType.CISCO
-    elif re.search(r'JUNOS|Juniper', output, re.IGNORECASE):
-        return VendorType.JUNIPER
-    elif re.search(r'HP|Hewlett-Packard|HPE|Aruba', output, re.IGNORECASE):
-        return VendorType.HP
-    elif re.search(r'Huawei', output, re.IGNORECASE):
-        return VendorType.HUAWEI
-    elif re.search(r'MikroTik|RouterOS', output, re.IGNORECASE):
-        return VendorType.MIKROTIK
-    else:
-        return VendorType.UNKNOWN
+    """コマンド出力からベンダーを検出する（出力の走査は1回のみ）"""
+    found = set()
+    for match in VENDOR_OUTPUT_PATTERN.finditer(output):
+        if match.lastgroup == VendorType.CISCO.value:
+            return VendorType.CISCO
+        found.add(match.lastgroup)
+    
+    for vendor in VENDOR_PRIORITY:
+        if vendor.value in found:
+            return vendor
+    return VendorType.UNKNOWN
+
+def detect_vendor_from_banner(banner: Optional[str]) -> VendorType:
+    """SSHサーバーのバナーからベンダーを検出する"""
+    match = VENDOR_BANNER_PATTERN.search(banner or "")
+    return VendorType(match.lastgroup) if match else VendorType.UNKNOWN
+
+# ベンダー検出の設定
+VENDOR_PROBE_COMMANDS = [
+    "show version",  # Cisco, Juniper
+    "display version",  # Huawei, HP
+    "/system resource print",  # MikroTik
+]
+VENDOR_PROBE_TIMEOUT = float(os.getenv("VENDOR_PROBE_TIMEOUT", "5"))
+VENDOR_PROBE_WORKERS = int(os.getenv("VENDOR_PROBE_WORKERS", "64"))
+VENDOR_CACHE_PATH = os.getenv("VENDOR_CACHE_PATH", "")  # SQLiteのファイル（例: vendor_cache.db）。空文字の場合はメモリのみ
+VENDOR_CACHE_TTL = int(os.getenv("VENDOR_CACHE_TTL", str(7 * 24 * 3600)))
+
+vendor_probe_executor = ThreadPoolExecutor(max_workers=VENDOR_PROBE_WORKERS, thread_name_prefix="vendor-probe")
+
+class VendorCache:
+    """IPアドレスごとの検出済みベンダーを保持するキャッシュ（path を指定した場合はSQLiteに永続化）
+
+    再接続時はキャッシュされたベンダーを使い、検出をスキップする。
+    ファイルはopen()（アプリのstartup）で開く。それまではメモリのみで動作する。
+    """
+
+    def __init__(self, path: str = VENDOR_CACHE_PATH, ttl: int = VENDOR_CACHE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._entries: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+        self._db = None
+
+    def open(self):
+        """SQLiteのファイルを開き、保存済みのベンダーを読み込む"""
+        if not self.path or self._db is not None:
+            return
+        with self._lock:
+            try:
+                self._db = sqlite3.connect(self.path, check_same_thread=False)
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS vendor_cache "
+                    "(ip TEXT PRIMARY KEY, vendor TEXT NOT NULL, detected_at REAL NOT NULL)"
+                )
+                self._db.commit()
+                for ip, vendor, detected_at in self._db.execute("SELECT ip, vendor, detected_at FROM vendor_cache"):
+                    self._entries.setdefault(ip, (VendorType(vendor), detected_at))
+            except (sqlite3.Error, ValueError) as e:
+                logger.warning(f"Vendor cache {self.path} unavailable, using memory only: {str(e)}")
+                self._db = None
+
+    def get(self, ip: str) -> Optional[VendorType]:
+        with self._lock:
+            entry = self._entries.get(ip)
+        if entry is None:
+            return None
+        vendor, detected_at = entry
+        if self.ttl > 0 and time.time() - detected_at > self.ttl:
+            return None
+        return vendor
+
+    def set(self, ip: str, vendor: VendorType):
+        if vendor == VendorType.UNKNOWN:
+            return
+        detected_at = time.time()
+        with self._lock:
+            self._entries[ip] = (vendor, detected_at)
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO vendor_cache (ip, vendor, detected_at) VALUES (?, ?, ?)",
+                        (ip, vendor.value, detected_at)
+                    )
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    logger.warning(f"Failed to persist vendor for {ip}: {str(e)}")
+
+    def invalidate(self, ip: str) -> bool:
+        with self._lock:
+            removed = self._entries.pop(ip, None) is not None
+            if self._db is not None:
+                try:
+                    self._db.execute("DELETE FROM vendor_cache WHERE ip = ?", (ip,))
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    logger.warning(f"Failed to remove cached vendor for {ip}: {str(e)}")
+        return removed
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+vendor_cache = VendorCache()
+
+# SSHコネクションプールの設定
+SSH_PORT = int(os.getenv("SSH_PORT", "22"))
+SSH_POOL_MAX_CONNECTIONS = int(os.getenv("SSH_POOL_MAX_CONNECTIONS", "2"))
+SSH_POOL_CHANNELS_PER_CONNECTION = int(os.getenv("SSH_POOL_CHANNELS_PER_CONNECTION", "4"))
+SSH_POOL_KEEPALIVE_INTERVAL = int(os.getenv("SSH_POOL_KEEPALIVE_INTERVAL", "30"))
+SSH_POOL_IDLE_TIMEOUT = int(os.getenv("SSH_POOL_IDLE_TIMEOUT", "300"))
+SSH_POOL_ACQUIRE_TIMEOUT = float(os.getenv("SSH_POOL_ACQUIRE_TIMEOUT", "30"))
+SSH_POOL_RECONNECT_ATTEMPTS = int(os.getenv("SSH_POOL_RECONNECT_ATTEMPTS", "3"))
+SSH_POOL_RECONNECT_BACKOFF = float(os.getenv("SSH_POOL_RECONNECT_BACKOFF", "0.5"))
+SSH_POOL_MAINTENANCE_INTERVAL = int(os.getenv("SSH_POOL_MAINTENANCE_INTERVAL", "30"))
+
+# ストリーミング出力の設定
+STREAM_CHUNK_SIZE = int(os.getenv("STREAM_CHUNK_SIZE", "4096"))
+STREAM_MAX_PENDING_CHUNKS = int(os.getenv("STREAM_MAX_PENDING_CHUNKS", "64"))
+STREAM_POLL_INTERVAL = float(os.getenv("STREAM_POLL_INTERVAL", "1.0"))
+
+def open_ssh_client(router_info: RouterInfo) -> paramiko.SSHClient:
+    """SSHクライアントを作成し、キープアライブを設定する"""
+    client = paramiko.SSHClient()
+    client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+    client.connect(
+        hostname=router_info.ip, 
+        port=SSH_PORT,
+        username=router_info.username, 
+        password=router_info.password, 
+        timeout=10
+    )
+    
+    transport = client.get_transport()
+    if transport is not None and SSH_POOL_KEEPALIVE_INTERVAL > 0:
+        transport.set_keepalive(SSH_POOL_KEEPALIVE_INTERVAL)
+    return client
+
+def probe_vendor(client, timeout: float = VENDOR_PROBE_TIMEOUT) -> VendorType:
+    """検出用コマンドを並列に実行し、最初に判別できたベンダーを返す
+
+    未知のコマンドで応答しない機器でも、待ち時間は最大でtimeout秒になる。
+    """
+    pending = {
+        vendor_probe_executor.submit(execute_ssh_command, client, cmd, timeout)
+        for cmd in VENDOR_PROBE_COMMANDS
+    }
+    deadline = time.monotonic() + timeout
+    while pending:
+        done, pending = wait(pending, timeout=max(0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+        if not done:
+            break
+        for future in done:
+            vendor = detect_vendor(future.result()["output"])
+            if vendor != VendorType.UNKNOWN:
+                # 残りのプローブはタイムアウト後にチャネルを閉じて終了する
+                return vendor
+    return VendorType.UNKNOWN
+
+def known_vendor(router_info: RouterInfo) -> Optional[VendorType]:
+    """指定されたベンダー、またはキャッシュ済みのベンダーを返す（なければNone）"""
+    vendor = router_info.vendor
+    if vendor and vendor != VendorType.UNKNOWN:
+        if vendor_cache.get(router_info.ip) != vendor:
+            vendor_cache.set(router_info.ip, vendor)
+        return vendor
+    return vendor_cache.get(router_info.ip)
+
+def remember_vendor(ip: str, vendor: VendorType) -> VendorType:
+    """検出したベンダーをキャッシュに記録"""
+    logger.info(f"Detected vendor {vendor.value} for {ip}")
+    vendor_cache.set(ip, vendor)
+    return vendor
+
+def resolve_vendor(router_info: RouterInfo, client) -> VendorType:
+    """指定値、キャッシュ、SSHバナー、プローブの順にベンダーを決定する"""
+    vendor = known_vendor(router_info)
+    if vendor:
+        return vendor
+    
+    transport = client.get_transport()
+    vendor = detect_vendor_from_banner(getattr(transport, "remote_version", None))
+    if vendor == VendorType.UNKNOWN:
+        vendor = probe_vendor(client)
+    return remember_vendor(router_info.ip, vendor)
 
 # SSH接続関数
 def connect_ssh(router_info: RouterInfo):
     try:
-        client = paramiko.SSHClient()
-        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        client.connect(
-            hostname=router_info.ip, 
-            username=router_info.username, 
-            password=router_info.password, 
-            timeout=10
-        )
+        client = open_ssh_client(router_info)
         
         # ベンダー検出
-        vendor = router_info.vendor
-        if not vendor or vendor == VendorType.UNKNOWN:
-            # show versionコマンドを試行して自動検出
-            stdin, stdout, stderr = client.exec_command("show version")
-            output = stdout.read().decode()
-            vendor = detect_vendor(output)
-            
-            # Cisco以外の場合、他のコマンドも試行
-            if vendor == VendorType.UNKNOWN:
-                commands = [
-                    "display version",  # Huawei, HP
-                    "/system resource print",  # MikroTik
-                ]
-                for cmd in commands:
-                    stdin, stdout, stderr = client.exec_command(cmd)
-                    output = stdout.read().decode()
-                    vendor = detect_vendor(output)
-                    if vendor != VendorType.UNKNOWN:
-                        break
+        vendor = resolve_vendor(router_info, client)
         
         return {
             "success": True,
@@ -342,239 +1100,2525 @@ def connect_ssh(router_info: RouterInfo):
             "message": f"Failed to connect: {str(e)}"
         }
 
+# コマンド出力の読み取り設定
+SSH_READ_CHUNK_SIZE = int(os.getenv("SSH_READ_CHUNK_SIZE", "32768"))
+SSH_MAX_OUTPUT_BYTES = int(os.getenv("SSH_MAX_OUTPUT_BYTES", str(128 * 1024 * 1024)))
+SSH_MAX_STDERR_BYTES = int(os.getenv("SSH_MAX_STDERR_BYTES", str(1024 * 1024)))
+
+class ChannelReader:
+    """SSHチャネルのstdoutとstderrを同時に読み出すリーダー
+
+    片方のバッファが溢れて相手側が止まらないよう両方を交互に読み出す。
+    stdoutはmax_bytesを超えた時点で読み取りを打ち切る（truncated=True）。
+    """
+
+    def __init__(
+        self,
+        channel,
+        timeout: float = 30,
+        max_bytes: int = SSH_MAX_OUTPUT_BYTES,
+        max_stderr_bytes: int = SSH_MAX_STDERR_BYTES,
+        chunk_size: int = SSH_READ_CHUNK_SIZE,
+        cancel_event: Optional[threading.Event] = None,
+    ):
+        self.channel = channel
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        self.max_stderr_bytes = max_stderr_bytes
+        self.chunk_size = chunk_size
+        self.cancel_event = cancel_event
+        self.stderr = bytearray()
+        self.bytes_read = 0
+        self.truncated = False
+
+    def _drain_stderr(self):
+        while self.channel.recv_stderr_ready():
+            data = self.channel.recv_stderr(self.chunk_size)
+            room = self.max_stderr_bytes - len(self.stderr)
+            if room > 0:
+                self.stderr += data[:room]
+
+    def chunks(self) -> Iterator[bytes]:
+        """stdoutのチャンクを届いた順に返す"""
+        channel = self.channel
+        deadline = time.monotonic() + self.timeout
+        while True:
+            if self.cancel_event is not None and self.cancel_event.is_set():
+                return
+            
+            self._drain_stderr()
+            if channel.recv_ready():
+                data = channel.recv(self.chunk_size)
+                self.bytes_read += len(data)
+                if self.bytes_read > self.max_bytes:
+                    # 上限を超えた分は捨てて読み取りを打ち切る
+                    self.truncated = True
+                    keep = len(data) - (self.bytes_read - self.max_bytes)
+                    if keep > 0:
+                        yield data[:keep]
+                    return
+                if data:
+                    yield data
+                continue
+            
+            if (channel.eof_received or channel.closed) and not channel.recv_stderr_ready():
+                return
+            
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise socket.timeout(f"Command timed out after {self.timeout}s")
+            select.select([channel], [], [], min(remaining, STREAM_POLL_INTERVAL))
+
+    def lines(self) -> Iterator[str]:
+        """stdoutを1行ずつ返す（出力全体は保持しない）"""
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        pending = ""
+        for chunk in self.chunks():
+            lines = (pending + decoder.decode(chunk)).split('\n')
+            pending = lines.pop()
+            yield from lines
+        pending += decoder.decode(b"", final=True)
+        if pending:
+            yield pending
+
+    def error_text(self) -> str:
+        return self.stderr.decode(errors="replace")
+
+def open_command_channel(client, command, timeout=30, combine_stderr=False):
+    """コマンドを実行するチャネルを開く"""
+    channel = client.get_transport().open_session(timeout=timeout)
+    if combine_stderr:
+        channel.set_combine_stderr(True)
+    channel.exec_command(command)
+    return channel
+
 # コマンド実行関数
-def execute_ssh_command(client, command, timeout=30):
+def execute_ssh_command(client, command, timeout=30, max_bytes=SSH_MAX_OUTPUT_BYTES):
     try:
-        stdin, stdout, stderr = client.exec_command(command, timeout=timeout)
-        output = stdout.read().decode()
-        error = stderr.read().decode()
+        channel = open_command_channel(client, command, timeout)
+        try:
+            reader = ChannelReader(channel, timeout, max_bytes)
+            output = b"".join(reader.chunks()).decode(errors="replace")
+            error = reader.error_text()
+        finally:
+            channel.close()
         
         if error:
             return {"success": False, "output": error}
+        if reader.truncated:
+            logger.warning(f"Output of '{command}' truncated at {max_bytes} bytes")
+            return {"success": True, "output": output, "truncated": True}
         return {"success": True, "output": output}
     except Exception as e:
         logger.error(f"Command execution error: {str(e)}")
         return {"success": False, "output": str(e)}
 
-# インターフェース情報の解析 - Ciscoタイプ
-def parse_cisco_interfaces(output):
-    interfaces = {}
-    lines = output.split('\n')
-    
-    for line in lines:
-        parts = line.split()
-        if len(parts) >= 5 and not line.startswith("Interface"):
-            interface_name = parts[0]
-            ip = parts[1] if parts[1] != "unassigned" else "unassigned"
-            status = parts[4] if len(parts) > 4 else "unknown"
-            protocol = parts[5] if len(parts) > 5 else "unknown"
-            
-            interfaces[interface_name] = {
-                "name": interface_name,
-                "status": status,
-                "protocol": protocol,
-                "ip": ip,
-                "speed": "auto",
-                "duplex": "auto"
-            }
-    
-    return interfaces
+def iter_lines(output: Union[str, Iterable[str]]) -> Iterator[str]:
+    """文字列または行のイテラブルから1行ずつ返す（分割済みリストは作らない）"""
+    if not isinstance(output, str):
+        yield from output
+        return
+    start = 0
+    while True:
+        end = output.find('\n', start)
+        if end < 0:
+            yield output[start:]
+            return
+        yield output[start:end]
+        start = end + 1
 
-# インターフェース情報の解析 - Juniperタイプ
-def parse_juniper_interfaces(output):
-    interfaces = {}
-    lines = output.split('\n')
-    current_interface = None
-    
-    for line in lines:
-        if not line.strip():
-            continue
-            
-        if not line.startswith(" "):  # 新しいインターフェース
-            parts = line.split()
-            if len(parts) >= 2:
-                interface_name = parts[0]
-                status = "up" if "up" in line else "down"
-                protocol = "up" if "up" in line else "down"
-                ip = parts[-1] if "." in parts[-1] else "unassigned"
-                
-                interfaces[interface_name] = {
-                    "name": interface_name,
-                    "status": status,
-                    "protocol": protocol,
-                    "ip": ip,
-                    "speed": "auto",
-                    "duplex": "auto"
-                }
-    
-    return interfaces
+def as_text(output: Union[str, Iterable[str]]) -> str:
+    """行のイテラブルを文字列に戻す（文字列はそのまま）"""
+    return output if isinstance(output, str) else '\n'.join(output)
 
-# インターフェース情報の解析 - HPタイプ
-def parse_hp_interfaces(output):
-    interfaces = {}
-    lines = output.split('\n')
-    
-    for line in lines:
-        if not "UP" in line and not "DOWN" in line:
-            continue
-            
-        parts = line.split()
-        if len(parts) >= 3:
-            interface_name = parts[0]
-            status = "up" if "UP" in line else "down"
-            protocol = "up" if "UP" in parts[2] else "down"
-            ip = "unassigned"
-            
-            # IPアドレス情報を探す
-            ip_match = re.search(r'(\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})', line)
-            if ip_match:
-                ip = ip_match.group(1)
-                
-            interfaces[interface_name] = {
-                "name": interface_name,
-                "status": status,
-                "protocol": protocol,
-                "ip": ip,
-                "speed": "auto",
-                "duplex": "auto"
-            }
-    
-    return interfaces
+class PooledConnection:
+    """プール内の1本のSSH接続"""
 
-# ベンダーに応じたインターフェース解析
-def parse_interfaces(output, vendor):
-    if vendor == VendorType.CISCO:
-        return parse_cisco_interfaces(output)
-    elif vendor == VendorType.JUNIPER:
-        return parse_juniper_interfaces(output)
-    elif vendor in [VendorType.HP, VendorType.HUAWEI]:
-        return parse_hp_interfaces(output)
-    else:
-        # デフォルトはCiscoタイプの解析を試みる
-        return parse_cisco_interfaces(output)
-
-# Ciscoルーティングテーブルの解析
-def parse_cisco_routes(output):
-    routes = []
-    lines = output.split('\n')
-    route_pattern = re.compile(r'([CSROBIEGHD\*])\s+(\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})(/(\d{1,2}))?\s+(?:\[(\d+)/(\d+)\])?\s+(?:via\s+)?(\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})?\s*,?\s*(\w+[\d/]+)?')
-    connected_pattern = re.compile(r'([CSROBIEGHD\*])\s+(\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})(/(\d{1,2}))?\s+is directly connected,\s+(\w+[\d/]+)')
-    
-    for line in lines:
-        if line.strip() and any(code in line[:2] for code in "CSROBIEGHD*"):
-            # 直接接続されたルート
-            connected_match = connected_pattern.search(line)
-            if connected_match:
-                protocol = connected_match.group(1)
-                destination = connected_match.group(2)
-                prefix_length = int(connected_match.group(4)) if connected_match.group(4) else 32
-                interface = connected_match.group(5)
+    def __init__(self, client: paramiko.SSHClient):
+        self.client = client
+        self.in_use = 0
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+
+    def is_alive(self) -> bool:
+        transport = self.client.get_transport()
+        return transport is not None and transport.is_active()
+
+    def close(self):
+        try:
+            self.client.close()
+        except Exception as e:
+            logger.debug(f"Failed to close SSH connection: {str(e)}")
+
+class SSHConnectionPool:
+    """ルーターIPをキーにSSH接続を再利用するコネクションプール
+
+    1本の接続上で複数のチャネルを同時に使い、足りない場合のみ
+    max_connectionsまで接続を追加する。切断された接続はバックオフ付きで再接続する。
+    """
+
+    def __init__(
+        self,
+        max_connections: int = SSH_POOL_MAX_CONNECTIONS,
+        channels_per_connection: int = SSH_POOL_CHANNELS_PER_CONNECTION,
+        idle_timeout: int = SSH_POOL_IDLE_TIMEOUT,
+    ):
+        self.max_connections = max_connections
+        self.channels_per_connection = channels_per_connection
+        self.idle_timeout = idle_timeout
+        self._condition = threading.Condition()
+        self._connections: Dict[str, List[PooledConnection]] = {}
+        self._pending: Dict[str, int] = {}
+        self._credentials: Dict[str, RouterInfo] = {}
+        self._counters = {
+            "connects": 0,
+            "reconnects": 0,
+            "reuses": 0,
+            "dropped": 0,
+            "evicted": 0,
+            "failures": 0,
+        }
+
+    def register(self, router_info: RouterInfo, client: Optional[paramiko.SSHClient] = None):
+        """接続情報を登録し、確立済みのクライアントがあればプールの接続と置き換える
+
+        同じルーターへの再接続で max_connections を超えないよう、既存の接続はプールから外す。
+        使用中の接続は返却時に閉じる。
+        """
+        replaced = []
+        with self._condition:
+            self._credentials[router_info.ip] = router_info
+            if client is not None:
+                replaced = self._connections.get(router_info.ip, [])
+                self._connections[router_info.ip] = [PooledConnection(client)]
+                self._counters["connects"] += 1
+            self._condition.notify_all()
+        for conn in replaced:
+            if conn.in_use == 0:
+                conn.close()
+
+    def _open_with_backoff(self, router_info: RouterInfo) -> paramiko.SSHClient:
+        """指数バックオフで再試行しながら接続を確立"""
+        delay = SSH_POOL_RECONNECT_BACKOFF
+        last_error = None
+        for attempt in range(1, SSH_POOL_RECONNECT_ATTEMPTS + 1):
+            try:
+                return open_ssh_client(router_info)
+            except Exception as e:
+                last_error = e
+                logger.warning(f"SSH connect to {router_info.ip} failed (attempt {attempt}): {str(e)}")
+                if attempt < SSH_POOL_RECONNECT_ATTEMPTS:
+                    time.sleep(delay)
+                    delay *= 2
+        raise last_error
+
+    def acquire(self, ip: str) -> PooledConnection:
+        """空きチャネルのある接続を取得（なければ新規接続）"""
+        deadline = time.monotonic() + SSH_POOL_ACQUIRE_TIMEOUT
+        stale = []
+        with self._condition:
+            while True:
+                router_info = self._credentials.get(ip)
+                if router_info is None:
+                    raise KeyError(f"Router {ip} is not registered in the SSH pool")
                 
-                routes.append({
-                    "destination": destination,
-                    "prefix_length": prefix_length,
-                    "next_hop": "Connected",
-                    "interface": interface,
-                    "protocol": protocol,
-                    "metric": 0,
-                    "administrative_distance": 0,
-                    "type": "Direct"
-                })
-                continue
-            
-            # 通常のルート
-            match = route_pattern.search(line)
-            if match:
-                protocol = match.group(1)
-                destination = match.group(2)
-                prefix_length = int(match.group(4)) if match.group(4) else 32
-                administrative_distance = int(match.group(5)) if match.group(5) else 0
-                metric = int(match.group(6)) if match.group(6) else 0
-                next_hop = match.group(7) if match.group(7) else "Connected"
-                interface = match.group(8) if match.group(8) else ""
+                connections = self._connections.setdefault(ip, [])
+                for conn in [c for c in connections if c.in_use == 0 and not c.is_alive()]:
+                    connections.remove(conn)
+                    stale.append(conn)
+                    self._counters["dropped"] += 1
                 
-                routes.append({
-                    "destination": destination,
-                    "prefix_length": prefix_length,
-                    "next_hop": next_hop,
-                    "interface": interface,
-                    "protocol": protocol,
-                    "metric": metric,
-                    "administrative_distance": administrative_distance,
-                    "type": "Static" if protocol == "S" else "Dynamic"
-                })
-    
-    return routes
-
-# Juniperルーティングテーブルの解析
-def parse_juniper_routes(output):
-    routes = []
-    lines = output.split('\n')
-    in_entry = False
-    current_route = {}
-    
-    for line in lines:
-        line = line.strip()
-        if not line:
-            continue
-            
-        if not line.startswith(" "):
-            # 新しいルートエントリ
-            if current_route and "destination" in current_route:
-                routes.append(current_route)
-                current_route = {}
+                candidates = [
+                    c for c in connections
+                    if c.in_use < self.channels_per_connection and c.is_alive()
+                ]
+                if candidates:
+                    conn = min(candidates, key=lambda c: c.in_use)
+                    conn.in_use += 1
+                    conn.last_used = time.monotonic()
+                    self._counters["reuses"] += 1
+                    break
                 
-            dest_match = re.match(r'^(\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})/(\d{1,2})', line)
-            if dest_match:
-                current_route = {
-                    "destination": dest_match.group(1),
-                    "prefix_length": int(dest_match.group(2)),
-                    "next_hop": "",
-                    "interface": "",
-                    "protocol": "",
-                    "metric": 0,
-                    "administrative_distance": 0,
-                    "type": ""
-                }
-                in_entry = True
-        elif in_entry:
-            # ルートエントリの詳細
-            if "via" in line:
-                parts = line.split()
-                current_route["interface"] = parts[1]
+                if len(connections) + self._pending.get(ip, 0) < self.max_connections:
+                    self._pending[ip] = self._pending.get(ip, 0) + 1
+                    conn = None
+                    break
                 
-                # プロトコル情報を抽出
-                if "Direct" in line:
-                    current_route["protocol"] = "Direct"
-                    current_route["next_hop"] = "Connected"
-                    current_route["type"] = "Direct"
-                elif "Static" in line:
-                    current_route["protocol"] = "Static"
-                    current_route["type"] = "Static"
-                    # 次ホップを探す
-                    next_hop_match = re.search(r'to (\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})', line)
-                    if next_hop_match:
-                        current_route["next_hop"] = next_hop_match.group(1)
-    
-    # 最後のルートを追加
-    if current_route and "destination" in current_route:
-        routes.append(current_route)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"Timed out waiting for an SSH connection to {ip}")
+                self._condition.wait(remaining)
         
-    return routes
+        for old in stale:
+            old.close()
+        if conn is not None:
+            return conn
+        
+        # 新しい接続はロックの外で確立する
+        try:
+            client = self._open_with_backoff(router_info)
+        except Exception:
+            with self._condition:
+                self._pending[ip] -= 1
+                self._counters["failures"] += 1
+                self._condition.notify_all()
+            raise
+        
+        conn = PooledConnection(client)
+        conn.in_use = 1
+        with self._condition:
+            self._pending[ip] -= 1
+            if ip not in self._credentials:
+                # 接続中に切断要求があった
+                self._condition.notify_all()
+                conn.close()
+                raise KeyError(f"Router {ip} was removed from the SSH pool")
+            self._connections.setdefault(ip, []).append(conn)
+            self._counters["reconnects" if stale else "connects"] += 1
+        return conn
 
-# ベンダーに応じたルーティングテーブル解析
-def parse_routes(output, vendor):
-    if vendor == VendorType.CISCO:
-        return parse_cisco_routes(output)
-    elif vendor == VendorType.JUNIPER:
-        return parse_juniper_routes(output)
-    else:
-        # デフォルトはCiscoタイプの解析を試みる
-        return parse_cisco_routes(output)
+    def release(self, ip: str, conn: PooledConnection):
+        """接続をプールに返却"""
+        dead = False
+        with self._condition:
+            conn.in_use -= 1
+            conn.last_used = time.monotonic()
+            connections = self._connections.get(ip, [])
+            if conn.in_use == 0 and conn not in connections:
+                # 再接続や切断でプールから外された接続
+                dead = True
+            elif conn.in_use == 0 and not conn.is_alive():
+                connections.remove(conn)
+                self._counters["dropped"] += 1
+                dead = True
+            self._condition.notify_all()
+        if dead:
+            conn.close()
 
-# APIエンドポイント
-@app.get("/")
-async def root():
+    def _run_with_retry(self, ip: str, run) -> Dict[str, Any]:
+        """プールの接続でrun(conn)を実行（セッションが切れていれば再接続して1回だけ再試行）"""
+        result = {"success": False, "output": f"Router {ip} is not connected"}
+        for attempt in range(2):
+            try:
+                conn = self.acquire(ip)
+            except Exception as e:
+                logger.error(f"Failed to acquire SSH connection to {ip}: {str(e)}")
+                return {"success": False, "output": str(e)}
+            
+            try:
+                result = run(conn)
+            finally:
+                self.release(ip, conn)
+            
+            if result["success"] or conn.is_alive():
+                return result
+            logger.warning(f"SSH session to {ip} dropped, reconnecting")
+        return result
+
+    def execute(self, ip: str, command: str, timeout: int = 30) -> Dict[str, Any]:
+        """プールの接続でコマンドを実行"""
+        return self._run_with_retry(ip, lambda conn: execute_ssh_command(conn.client, command, timeout))
+
+    def execute_lines(self, ip: str, command: str, consumer, timeout: int = 30) -> Dict[str, Any]:
+        """コマンド出力を行イテレータとしてconsumerに渡し、その戻り値を data として返す
+
+        出力全体を文字列として保持しないため、巨大なルーティングテーブル向け。
+        再接続して再試行する場合、consumerは新しいイテレータでもう一度呼ばれる。
+        """
+        def run(conn):
+            try:
+                channel = open_command_channel(conn.client, command, timeout)
+                try:
+                    reader = ChannelReader(channel, timeout)
+                    data = consumer(reader.lines())
+                    error = reader.error_text()
+                finally:
+                    channel.close()
+            except Exception as e:
+                logger.error(f"Command execution error: {str(e)}")
+                return {"success": False, "output": str(e)}
+            
+            if error:
+                return {"success": False, "output": error}
+            if reader.truncated:
+                logger.warning(f"Output of '{command}' on {ip} truncated at {reader.max_bytes} bytes")
+            return {"success": True, "output": "", "data": data, "truncated": reader.truncated}
+        
+        return {"data": None, **self._run_with_retry(ip, run)}
+
+    def stream(self, ip: str, command: str, on_chunk, cancel_event: threading.Event, timeout: int = 60) -> Dict[str, Any]:
+        """コマンドの出力を届いた順にon_chunkへ渡す
+
+        on_chunkがFalseを返すか、cancel_eventがセットされると読み取りを中断する。
+        """
+        try:
+            conn = self.acquire(ip)
+        except Exception as e:
+            logger.error(f"Failed to acquire SSH connection to {ip}: {str(e)}")
+            return {"success": False, "output": str(e)}
+        
+        channel = None
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        try:
+            channel = open_command_channel(conn.client, command, timeout, combine_stderr=True)
+            reader = ChannelReader(channel, timeout, chunk_size=STREAM_CHUNK_SIZE, cancel_event=cancel_event)
+            for data in reader.chunks():
+                text = decoder.decode(data)
+                if text and on_chunk(text) is False:
+                    break
+            
+            if cancel_event.is_set():
+                return {"success": False, "output": "Cancelled"}
+            tail = decoder.decode(b"", final=True)
+            if tail:
+                on_chunk(tail)
+            return {"success": True, "output": ""}
+        except Exception as e:
+            logger.error(f"Command streaming error: {str(e)}")
+            return {"success": False, "output": str(e)}
+        finally:
+            if channel is not None:
+                channel.close()
+            self.release(ip, conn)
+
+    def evict_idle(self):
+        """アイドル時間を超えた接続と切断済みの接続を閉じる"""
+        now = time.monotonic()
+        closing = []
+        with self._condition:
+            for ip, connections in self._connections.items():
+                for conn in list(connections):
+                    if conn.in_use > 0:
+                        continue
+                    if not conn.is_alive():
+                        self._counters["dropped"] += 1
+                    elif now - conn.last_used > self.idle_timeout:
+                        self._counters["evicted"] += 1
+                    else:
+                        continue
+                    connections.remove(conn)
+                    closing.append(conn)
+        for conn in closing:
+            conn.close()
+
+    def close(self, ip: str):
+        """ルーターの接続をすべて閉じ、接続情報を削除"""
+        with self._condition:
+            self._credentials.pop(ip, None)
+            connections = self._connections.pop(ip, [])
+            self._condition.notify_all()
+        for conn in connections:
+            conn.close()
+
+    def close_all(self):
+        with self._condition:
+            ips = list(self._credentials)
+        for ip in ips:
+            self.close(ip)
+
+    def stats(self) -> Dict[str, Any]:
+        """プールの統計情報"""
+        now = time.monotonic()
+        with self._condition:
+            devices = {}
+            for ip in self._credentials:
+                connections = self._connections.get(ip, [])
+                devices[ip] = {
+                    "connections": len(connections),
+                    "alive": sum(1 for c in connections if c.is_alive()),
+                    "channels_in_use": sum(c.in_use for c in connections),
+                    "pending": self._pending.get(ip, 0),
+                    "idle_seconds": round(min((now - c.last_used for c in connections), default=0), 1),
+                }
+            return {
+                "max_connections_per_device": self.max_connections,
+                "channels_per_connection": self.channels_per_connection,
+                "idle_timeout": self.idle_timeout,
+                "devices": devices,
+                "counters": dict(self._counters),
+            }
+
+ssh_pool = SSHConnectionPool()
+
+# SSH実行レイヤー - paramikoのブロッキング処理はイベントループ外で実行する
+SSH_EXECUTOR_WORKERS = int(os.getenv("SSH_EXECUTOR_WORKERS", "32"))
+SSH_PER_ROUTER_CONCURRENCY = int(os.getenv("SSH_PER_ROUTER_CONCURRENCY", "4"))
+
+ssh_executor = ThreadPoolExecutor(max_workers=SSH_EXECUTOR_WORKERS, thread_name_prefix="ssh")
+router_semaphores: Dict[str, asyncio.Semaphore] = {}
+# run_ssh で投入し、まだスレッドで実行が始まっていないジョブ数
+ssh_executor_queued = 0
+ssh_executor_lock = threading.Lock()
+
+def get_router_semaphore(ip: str) -> asyncio.Semaphore:
+    """ルーターごとの同時実行数を制限するセマフォを取得"""
+    semaphore = router_semaphores.get(ip)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(SSH_PER_ROUTER_CONCURRENCY)
+        router_semaphores[ip] = semaphore
+    return semaphore
+
+def forget_router_semaphore(ip: str):
+    """切断したルーターのセマフォを破棄（実行中の処理は取得済みのセマフォで完了する）"""
+    router_semaphores.pop(ip, None)
+
+async def run_ssh(ip: str, func, *args, **kwargs):
+    """SSH処理をスレッドプールで実行する（ルーターごとに同時実行数を制限）"""
+    global ssh_executor_queued
+    queued = time.perf_counter()
+    waiting = True
+    
+    def dequeue():
+        # 実行開始とキャンセルのどちらか先に来た方で1回だけ減らす
+        global ssh_executor_queued
+        nonlocal waiting
+        with ssh_executor_lock:
+            if waiting:
+                waiting = False
+                ssh_executor_queued -= 1
+    
+    def call():
+        dequeue()
+        SSH_EXECUTOR_WAIT_SECONDS.observe(time.perf_counter() - queued)
+        return func(*args, **kwargs)
+    
+    async with get_router_semaphore(ip):
+        with ssh_executor_lock:
+            ssh_executor_queued += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(ssh_executor, call)
+        finally:
+            dequeue()
+
+# SSHバックエンド
+# SSH_BACKEND=paramiko（デフォルト、スレッドプール）または asyncssh（イベントループ上で多重化）
+SSH_BACKEND = os.getenv("SSH_BACKEND", "paramiko")
+
+class SSHBackend(abc.ABC):
+    """SSHトランスポートの共通インターフェース
+
+    結果は {"success", "output"} 形式。stream の on_chunk はコルーチン関数で、
+    Falseを返すと読み取りを中断する。
+    """
+    name = "base"
+
+    @abc.abstractmethod
+    async def connect(self, router_info: RouterInfo) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def execute(self, ip: str, command: str, timeout: int = 30) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def execute_lines(self, ip: str, command: str, consumer, timeout: int = 30) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def stream(self, ip: str, command: str, on_chunk, cancel_event: threading.Event, timeout: int = 60) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def close(self, ip: str):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def close_all(self):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def evict_idle(self):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def stats(self) -> Dict[str, Any]:
+        raise NotImplementedError
+
+class ParamikoBackend(SSHBackend):
+    """paramikoのブロッキング処理をスレッドプールで実行するバックエンド"""
+    name = "paramiko"
+
+    def __init__(self, pool: SSHConnectionPool):
+        self.pool = pool
+
+    async def connect(self, router_info: RouterInfo) -> Dict[str, Any]:
+        result = await run_ssh(router_info.ip, connect_ssh, router_info)
+        if result["success"]:
+            self.pool.register(router_info, result["client"])
+        return result
+
+    @instrument_ssh
+    async def execute(self, ip: str, command: str, timeout: int = 30) -> Dict[str, Any]:
+        return await run_ssh(ip, self.pool.execute, ip, command, timeout)
+
+    @instrument_ssh
+    async def execute_lines(self, ip: str, command: str, consumer, timeout: int = 30) -> Dict[str, Any]:
+        return await run_ssh(ip, self.pool.execute_lines, ip, command, consumer, timeout)
+
+    @instrument_ssh
+    async def stream(self, ip: str, command: str, on_chunk, cancel_event: threading.Event, timeout: int = 60) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        
+        def deliver(text):
+            # 読み取りスレッドからイベントループ上のon_chunkを呼び、完了を待つ
+            return asyncio.run_coroutine_threadsafe(on_chunk(text), loop).result()
+        
+        return await run_ssh(ip, self.pool.stream, ip, command, deliver, cancel_event, timeout)
+
+    async def close(self, ip: str):
+        await run_ssh(ip, self.pool.close, ip)
+
+    async def close_all(self):
+        await asyncio.get_running_loop().run_in_executor(None, self.pool.close_all)
+
+    async def evict_idle(self):
+        await asyncio.get_running_loop().run_in_executor(ssh_executor, self.pool.evict_idle)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.name, **self.pool.stats()}
+
+class AsyncSSHBackend(SSHBackend):
+    """asyncsshで全セッションを単一のイベントループ上に多重化するバックエンド
+
+    ルーターごとに1本の接続を保持し、コマンドはその上のチャネルで並行実行する。
+    """
+    name = "asyncssh"
+
+    def __init__(self):
+        if asyncssh is None:
+            raise RuntimeError("asyncssh is not installed")
+        self._credentials: Dict[str, RouterInfo] = {}
+        self._connections: Dict[str, Any] = {}
+        self._last_used: Dict[str, float] = {}
+        self._connect_locks: Dict[str, asyncio.Lock] = {}
+        self.idle_timeout = SSH_POOL_IDLE_TIMEOUT
+        self.line_queue_size = 64  # execute_lines で解析待ちにできる受信チャンク数
+        self._counters = {"connects": 0, "reconnects": 0, "failures": 0, "evicted": 0, "dropped": 0}
+
+    async def _open(self, router_info: RouterInfo):
+        return await asyncssh.connect(
+            router_info.ip,
+            port=SSH_PORT,
+            username=router_info.username,
+            password=router_info.password,
+            known_hosts=None,
+            connect_timeout=10,
+            keepalive_interval=SSH_POOL_KEEPALIVE_INTERVAL or None,
+        )
+
+    async def _open_with_backoff(self, router_info: RouterInfo):
+        delay = SSH_POOL_RECONNECT_BACKOFF
+        last_error = None
+        for attempt in range(1, SSH_POOL_RECONNECT_ATTEMPTS + 1):
+            try:
+                return await self._open(router_info)
+            except Exception as e:
+                last_error = e
+                logger.warning(f"SSH connect to {router_info.ip} failed (attempt {attempt}): {str(e)}")
+                if attempt < SSH_POOL_RECONNECT_ATTEMPTS:
+                    await asyncio.sleep(delay)
+                    delay *= 2
+        raise last_error
+
+    async def _connection(self, ip: str, reconnect: bool = False):
+        """接続を取得（切断済み、またはreconnect指定時は張り直す）"""
+        lock = self._connect_locks.setdefault(ip, asyncio.Lock())
+        async with lock:
+            router_info = self._credentials.get(ip)
+            if router_info is None:
+                raise KeyError(f"Router {ip} is not registered in the SSH pool")
+            
+            conn = self._connections.get(ip)
+            if conn is not None and not reconnect:
+                return conn
+            if conn is not None:
+                conn.close()
+                self._counters["dropped"] += 1
+            
+            try:
+                conn = await self._open_with_backoff(router_info)
+            except Exception:
+                self._connections.pop(ip, None)
+                self._counters["failures"] += 1
+                raise
+            self._connections[ip] = conn
+            self._counters["reconnects" if reconnect else "connects"] += 1
+            return conn
+
+    async def _run(self, conn, command: str, timeout: float, on_chunk=None, cancel_event=None, on_lines=None) -> Dict[str, Any]:
+        """コマンドを実行し出力を読み取る（timeoutはコマンド全体の制限時間）"""
+        try:
+            return await asyncio.wait_for(self._read(conn, command, on_chunk, cancel_event, on_lines), timeout)
+        except asyncio.TimeoutError:
+            raise socket.timeout(f"Command timed out after {timeout}s")
+
+    async def _read(self, conn, command: str, on_chunk=None, cancel_event=None, on_lines=None) -> Dict[str, Any]:
+        """出力を読み取る
+
+        on_chunk 指定時は届いた文字列を順に配信し、on_lines 指定時は改行で分けた行のリストを
+        配信する（どちらも出力全体は保持しない）。
+        """
+        process = await conn.create_process(command, encoding=None)
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        # stderrはstdoutと並行して読み出す（片方で詰まらないように）
+        stderr_task = asyncio.ensure_future(process.stderr.read(SSH_MAX_STDERR_BYTES))
+        chunks = []
+        pending = ""
+        received = 0
+        truncated = False
+        chunk_size = STREAM_CHUNK_SIZE if on_chunk else SSH_READ_CHUNK_SIZE
+        try:
+            while True:
+                if cancel_event is not None and cancel_event.is_set():
+                    return {"success": False, "output": "Cancelled"}
+                data = await process.stdout.read(chunk_size)
+                if not data:
+                    break
+                
+                received += len(data)
+                if on_chunk is not None:
+                    text = decoder.decode(data)
+                    if text and await on_chunk(text) is False:
+                        return {"success": False, "output": "Cancelled"}
+                    continue
+                if received > SSH_MAX_OUTPUT_BYTES:
+                    data = data[:len(data) - (received - SSH_MAX_OUTPUT_BYTES)]
+                    truncated = True
+                if on_lines is not None:
+                    lines = (pending + decoder.decode(data)).split('\n')
+                    pending = lines.pop()
+                    if lines:
+                        await on_lines(lines)
+                else:
+                    chunks.append(data)
+                if truncated:
+                    break
+            
+            if on_chunk is not None:
+                tail = decoder.decode(b"", final=True)
+                if tail:
+                    await on_chunk(tail)
+                return {"success": True, "output": ""}
+            if on_lines is not None:
+                pending += decoder.decode(b"", final=True)
+                if pending:
+                    await on_lines([pending])
+            
+            error = b""
+            if not truncated:
+                error = await stderr_task
+            if error.strip():
+                return {"success": False, "output": error.decode(errors="replace")}
+            output = b"".join(chunks).decode(errors="replace")
+            if truncated:
+                logger.warning(f"Output of '{command}' truncated at {SSH_MAX_OUTPUT_BYTES} bytes")
+            return {"success": True, "output": output, "truncated": truncated}
+        finally:
+            stderr_task.cancel()
+            process.close()
+
+    async def _run_lines(self, conn, command: str, consumer, timeout: float) -> Dict[str, Any]:
+        """受信した行をキュー経由でスレッド上のconsumerに渡し、読み取りと解析を並行させる
+
+        キューが一杯の間は受信を待たせるため、解析が遅くても出力全体を溜め込まない。
+        """
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue(self.line_queue_size)
+        
+        def lines():
+            while True:
+                batch = asyncio.run_coroutine_threadsafe(queue.get(), loop).result()
+                if batch is None:
+                    return
+                yield from batch
+        
+        parsed = loop.run_in_executor(ssh_executor, consumer, lines())
+        
+        async def deliver(batch):
+            # consumerが途中で読むのをやめた場合、残りの行は捨てる
+            if parsed.done():
+                return
+            put = asyncio.ensure_future(queue.put(batch))
+            try:
+                await asyncio.wait([put, parsed], return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                put.cancel()
+        
+        try:
+            result = await self._run(conn, command, timeout, on_lines=deliver)
+        except BaseException:
+            # 読み取りの失敗を優先して返す（consumerは終了を待つだけ）
+            await deliver(None)
+            await asyncio.wait([parsed])
+            if not parsed.cancelled():
+                parsed.exception()
+            raise
+        await deliver(None)
+        data = await parsed
+        if not result["success"]:
+            return {**result, "data": None}
+        return {**result, "data": data}
+
+    async def _execute(self, ip: str, run, retry: bool = True) -> Dict[str, Any]:
+        """run(conn) を実行（接続が切れていれば1回だけ張り直して再試行）"""
+        self._last_used[ip] = time.monotonic()
+        async with get_router_semaphore(ip):
+            for attempt in range(2):
+                try:
+                    conn = await self._connection(ip, reconnect=attempt > 0)
+                except Exception as e:
+                    logger.error(f"Failed to acquire SSH connection to {ip}: {str(e)}")
+                    return {"success": False, "output": str(e)}
+                try:
+                    return await run(conn)
+                except (asyncssh.ConnectionLost, asyncssh.ChannelOpenError, BrokenPipeError, ConnectionError) as e:
+                    logger.warning(f"SSH session to {ip} dropped, reconnecting: {str(e)}")
+                    if not retry:
+                        return {"success": False, "output": str(e)}
+                except Exception as e:
+                    logger.error(f"Command execution error: {str(e)}")
+                    return {"success": False, "output": str(e)}
+                finally:
+                    self._last_used[ip] = time.monotonic()
+            return {"success": False, "output": f"SSH session to {ip} dropped"}
+
+    async def _detect_vendor(self, conn, ip: str) -> VendorType:
+        """SSHバナー、次に検出用コマンドの並列実行でベンダーを判定"""
+        vendor = detect_vendor_from_banner(conn.get_extra_info("server_version"))
+        if vendor != VendorType.UNKNOWN:
+            return vendor
+        
+        probes = [
+            asyncio.ensure_future(self._run(conn, cmd, VENDOR_PROBE_TIMEOUT))
+            for cmd in VENDOR_PROBE_COMMANDS
+        ]
+        try:
+            for probe in asyncio.as_completed(probes, timeout=VENDOR_PROBE_TIMEOUT):
+                try:
+                    result = await probe
+                except Exception:
+                    continue
+                vendor = detect_vendor(result["output"])
+                if vendor != VendorType.UNKNOWN:
+                    return vendor
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            for probe in probes:
+                probe.cancel()
+        return VendorType.UNKNOWN
+
+    async def connect(self, router_info: RouterInfo) -> Dict[str, Any]:
+        ip = router_info.ip
+        conn = None
+        try:
+            conn = await self._open(router_info)
+            vendor = known_vendor(router_info)
+            if not vendor:
+                vendor = remember_vendor(ip, await self._detect_vendor(conn, ip))
+        except Exception as e:
+            logger.error(f"SSH connection error: {str(e)}")
+            if conn is not None:
+                # ベンダー判定で失敗した接続を残さない
+                conn.close()
+            return {
+                "success": False,
+                "client": None,
+                "vendor": VendorType.UNKNOWN,
+                "message": f"Failed to connect: {str(e)}"
+            }
+        
+        old = self._connections.pop(ip, None)
+        if old is not None:
+            old.close()
+        self._credentials[ip] = router_info
+        self._connections[ip] = conn
+        self._last_used[ip] = time.monotonic()
+        self._counters["connects"] += 1
+        return {
+            "success": True,
+            "client": conn,
+            "vendor": vendor,
+            "message": f"Successfully connected to {ip}"
+        }
+
+    @instrument_ssh
+    async def execute(self, ip: str, command: str, timeout: int = 30) -> Dict[str, Any]:
+        return await self._execute(ip, lambda conn: self._run(conn, command, timeout))
+
+    @instrument_ssh
+    async def execute_lines(self, ip: str, command: str, consumer, timeout: int = 30) -> Dict[str, Any]:
+        # 解析はイベントループを塞がないようスレッドで行い、受信と並行して進める。
+        # 再接続して再試行する場合、consumerは新しいイテレータでもう一度呼ばれる
+        result = await self._execute(ip, lambda conn: self._run_lines(conn, command, consumer, timeout))
+        return {"data": None, **result}
+
+    @instrument_ssh
+    async def stream(self, ip: str, command: str, on_chunk, cancel_event: threading.Event, timeout: int = 60) -> Dict[str, Any]:
+        # 一部の出力を配信済みの場合があるため再試行しない
+        return await self._execute(
+            ip, lambda conn: self._run(conn, command, timeout, on_chunk, cancel_event), retry=False
+        )
+
+    async def close(self, ip: str):
+        self._credentials.pop(ip, None)
+        self._last_used.pop(ip, None)
+        self._connect_locks.pop(ip, None)
+        conn = self._connections.pop(ip, None)
+        if conn is not None:
+            conn.close()
+
+    async def close_all(self):
+        for ip in list(self._credentials):
+            await self.close(ip)
+
+    async def evict_idle(self):
+        """アイドル時間を超えた接続を閉じる（接続情報は残し、次回使用時に再接続）"""
+        now = time.monotonic()
+        for ip, conn in list(self._connections.items()):
+            if get_router_semaphore(ip).locked():
+                continue
+            if now - self._last_used.get(ip, now) > self.idle_timeout:
+                self._connections.pop(ip, None)
+                conn.close()
+                self._counters["evicted"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "backend": self.name,
+            "idle_timeout": self.idle_timeout,
+            "devices": {
+                ip: {
+                    "connections": 1 if ip in self._connections else 0,
+                    "idle_seconds": round(now - self._last_used.get(ip, now), 1),
+                }
+                for ip in self._credentials
+            },
+            "counters": dict(self._counters),
+        }
+
+def create_ssh_backend(name: str = SSH_BACKEND) -> SSHBackend:
+    """設定に応じたSSHバックエンドを作成"""
+    if name == "asyncssh":
+        if asyncssh is not None:
+            return AsyncSSHBackend()
+        logger.warning("SSH_BACKEND=asyncssh but asyncssh is not installed, falling back to paramiko")
+    elif name != "paramiko":
+        logger.warning(f"Unknown SSH_BACKEND {name}, using paramiko")
+    return ParamikoBackend(ssh_pool)
+
+ssh_backend = create_ssh_backend()
+
+# デバイス状態のキャッシュ設定
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+
+# コマンド種別ごとのキャッシュ有効期間（秒）。0はキャッシュしない
+CACHE_TTLS = {
+    "version": 300,
+    "interfaces": 15,
+    "interface_detail": 60,
+    "interface_detail_all": 60,
+    "routing_table": 30,
+    "neighbors": 60,
+    "config": 120,
+}
+
+# 出力が巨大になり得るため、生の出力をキャッシュせず読み取りながら解析するコマンド種別
+STREAMED_KINDS = {"routing_table"}
+
+class CommandCache:
+    """(ルーターIP, コマンド)をキーにしたTTL付きLRUキャッシュ
+
+    同じキーへの同時リクエストは1回の取得結果を共有する。
+    """
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._inflight: Dict[tuple, asyncio.Future] = {}
+        self._counters = {
+            "hits": 0,
+            "misses": 0,
+            "coalesced": 0,
+            "evictions": 0,
+            "invalidations": 0,
+        }
+
+    def get(self, key: tuple):
+        """有効なキャッシュがあれば値を返す（なければNone）"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: tuple, value, ttl: float):
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._counters["evictions"] += 1
+
+    async def get_or_load(self, key: tuple, ttl: float, loader, fresh: bool = False, cache_if=None):
+        """キャッシュから取得し、なければloaderで取得してキャッシュする"""
+        if not fresh:
+            value = self.get(key)
+            if value is not None:
+                self._counters["hits"] += 1
+                return value
+            inflight = self._inflight.get(key)
+            if inflight is not None:
+                self._counters["coalesced"] += 1
+                return await asyncio.shield(inflight)
+        
+        self._counters["misses"] += 1
+        # 呼び出し元がキャンセルされても、共有している他の待機者のために取得は継続する
+        task = asyncio.ensure_future(self._load(key, ttl, loader, cache_if))
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        self._inflight[key] = task
+        return await asyncio.shield(task)
+
+    async def _load(self, key: tuple, ttl: float, loader, cache_if):
+        try:
+            value = await loader()
+        finally:
+            if self._inflight.get(key) is asyncio.current_task():
+                del self._inflight[key]
+        
+        if cache_if is None or cache_if(value):
+            self.set(key, value, ttl)
+        return value
+
+    def invalidate(self, ip: Optional[str] = None) -> int:
+        """ルーターのキャッシュを削除（ip省略時は全て）"""
+        if ip is None:
+            keys = list(self._entries)
+        else:
+            keys = [key for key in self._entries if key[0] == ip]
+        for key in keys:
+            del self._entries[key]
+        self._counters["invalidations"] += len(keys)
+        return len(keys)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self._counters["hits"] + self._counters["coalesced"] + self._counters["misses"]
+        shared = self._counters["hits"] + self._counters["coalesced"]
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "inflight": len(self._inflight),
+            "hit_ratio": round(shared / lookups, 4) if lookups else 0.0,
+            **self._counters,
+        }
+
+command_cache = CommandCache()
+
+def is_cacheable(result: Dict[str, Any]) -> bool:
+    """成功し、出力が上限で打ち切られていない結果のみキャッシュする"""
+    return result["success"] and not result["truncated"]
+
+async def fetch_command(ip, vendor, kind, fresh=False, timeout=30, **params):
+    """ベンダーコマンドを実行（成功した結果はコマンド種別ごとのTTLの間キャッシュ）
+
+    戻り値は {"success", "output", "truncated"}。truncated は出力が SSH_MAX_OUTPUT_BYTES で打ち切られたか。
+    """
+    command = VENDOR_COMMANDS.get(vendor, VENDOR_COMMANDS[VendorType.CISCO])[kind].format(**params)
+    ttl = CACHE_TTLS.get(kind, 0)
+    
+    async def load():
+        result = await ssh_backend.execute(ip, command, timeout)
+        return {**result, "truncated": result.get("truncated", False)}
+    
+    if ttl <= 0:
+        return await load()
+    return await command_cache.get_or_load((ip, command), ttl, load, fresh=fresh, cache_if=is_cacheable)
+
+def output_digest(output) -> str:
+    """コマンド出力のハッシュ（入力データが変わったかの判定用）"""
+    return hashlib.blake2b(as_text(output).encode(errors="replace"), digest_size=16).hexdigest()
+
+async def fetch_parsed(ip, vendor, kind, parser, fresh=False):
+    """ベンダーコマンドを実行して解析（解析結果もキャッシュ）
+
+    戻り値は {"success", "output", "data", "digest", "truncated"}。digest は生の出力のハッシュ。
+    打ち切られた出力の解析結果（truncated=True）はキャッシュしない。
+    キャッシュされた data は変更しないこと。
+    STREAMED_KINDS のコマンドは出力を保持せず、読み取りながら解析する。
+    """
+    command = VENDOR_COMMANDS.get(vendor, VENDOR_COMMANDS[VendorType.CISCO])[kind]
+    
+    async def load():
+        if kind in STREAMED_KINDS:
+            def consume(lines):
+                # 行を解析へ渡しながらハッシュを計算する（再試行時は最初から計算し直す）
+                digest = hashlib.blake2b(digest_size=16)
+                
+                def hashed():
+                    for line in lines:
+                        digest.update(line.encode(errors="replace"))
+                        digest.update(b"\n")
+                        yield line
+                data = parser(hashed(), vendor)
+                return data, digest.hexdigest()
+            
+            result = await ssh_backend.execute_lines(ip, command, consume)
+            if not result["success"]:
+                return {"success": False, "output": result["output"], "data": None, "digest": None, "truncated": False}
+            data, digest = result["data"]
+            return {"success": True, "output": "", "data": data, "digest": digest, "truncated": result.get("truncated", False)}
+        result = await fetch_command(ip, vendor, kind, fresh=fresh)
+        if not result["success"]:
+            return {"success": False, "output": result["output"], "data": None, "digest": None, "truncated": False}
+        return {
+            "success": True,
+            "output": result["output"],
+            "data": parser(result["output"], vendor),
+            "digest": output_digest(result["output"]),
+            "truncated": result["truncated"],
+        }
+    
+    return await command_cache.get_or_load(
+        (ip, command, parser.__name__), CACHE_TTLS.get(kind, 0), load, fresh=fresh, cache_if=is_cacheable
+    )
+
+# パーサーレジストリ
+# 正規表現はモジュール読み込み時に一度だけコンパイルする
+IPV4_PATTERN = re.compile(r'(\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})')
+DESCRIPTION_PATTERN = re.compile(r'Description\s*:\s*(.+)')
+UPTIME_PATTERN = re.compile(r'uptime is (.+)')
+
+# Cisco
+# "S*    0.0.0.0/0 [1/0] via 203.0.113.1" / "O IA     10.30.0.0/24 [110/2] via 10.10.0.2, 3d04h, GigabitEthernet0/0/1"
+CISCO_ROUTE_PATTERN = re.compile(r'^([A-Za-z]{1,2})\*?\s+(?:(?:IA|E1|E2|N1|N2|EX|L1|L2|ia|su)\s+)?(\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})(/(\d{1,2}))?\s+(?:\[(\d+)/(\d+)\])?\s+(?:via\s+)?(\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})?(?:,\s*(?:[\dwdhmy:]+,\s*)?([A-Za-z][\w./:-]*))?')
+CISCO_CONNECTED_ROUTE_PATTERN = re.compile(r'^([A-Za-z]{1,2})\*?\s+(\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})(/(\d{1,2}))?\s+is directly connected,\s+([\w./:-]+)')
+CISCO_MODEL_PATTERN = re.compile(r'^[Cc]isco (\S+) \([^)]*\) (?:processor )?with', re.MULTILINE)
+CISCO_VERSION_PATTERN = re.compile(r'Version ([^,]+)')
+CISCO_SERIAL_PATTERN = re.compile(r'(?:[Ss]erial [Nn]umber\s*:|Processor board ID)\s*(\w+)')
+CISCO_BANDWIDTH_PATTERN = re.compile(r'BW (\d+) Kbit/sec')
+CISCO_DUPLEX_PATTERN = re.compile(r'(Half|Full)-duplex')
+CISCO_MAC_PATTERN = re.compile(r'address is ([0-9a-fA-F]{4}\.[0-9a-fA-F]{4}\.[0-9a-fA-F]{4})')
+CISCO_MTU_PATTERN = re.compile(r'MTU (\d+) bytes')
+CDP_BLOCK_SEPARATOR = re.compile(r'-{4,}')
+CDP_DEVICE_PATTERN = re.compile(r'Device ID: (.+?)(?:\r|\n)')
+CDP_IP_PATTERN = re.compile(r'IP address: (\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})')
+CDP_PLATFORM_PATTERN = re.compile(r'Platform: (.+?),')
+CDP_INTERFACE_PATTERN = re.compile(r'Interface: (.+?),[\s\r\n]+Port ID')
+CDP_PORT_PATTERN = re.compile(r'Port ID \(outgoing port\): (.+?)(?:\r|\n)')
+CISCO_PING_SUCCESS_PATTERN = re.compile(r'Success rate is (\d+) percent \((\d+)/(\d+)\)')
+CISCO_PING_PROGRESS_PATTERN = re.compile(r'[!.UQMA?&]+')
+
+# ping / traceroute（BSD形式: Juniper, HP, Huawei, Cisco NX-OS など）
+PING_REPLY_PATTERN = re.compile(r'(?:bytes from|Reply from)\s+\S+?:?\s.*?time\s*[=<]\s*(\d+(?:\.\d+)?)\s*ms', re.IGNORECASE)
+PING_TIMEOUT_PATTERN = re.compile(r'Request time ?out', re.IGNORECASE)
+PING_SENT_PATTERN = re.compile(r'(\d+) packets?(?:\(s\))? transmitted')
+PING_RECEIVED_PATTERN = re.compile(r'(\d+) (?:packets?(?:\(s\))? )?received')
+PING_LOSS_PATTERN = re.compile(r'(\d+(?:\.\d+)?)% packet loss')
+PING_RTT_PATTERN = re.compile(r'min/avg/max(?:/[\w-]+)? = (\d+(?:\.\d+)?)/(\d+(?:\.\d+)?)/(\d+(?:\.\d+)?)')
+TRACEROUTE_HOP_PATTERN = re.compile(r'^\s*(\d+)\s+(.*)$')
+TRACEROUTE_ANNOTATION_PATTERN = re.compile(r'\[[^\]]*\]')
+TRACEROUTE_ADDRESS_PATTERN = re.compile(r'([^\s(*]+)\s*(?:\(([^)\s]+)\))?')
+TRACEROUTE_RTT_PATTERN = re.compile(r'<?(\d+(?:\.\d+)?)\s*(?:ms|msec)\b')
+TRACEROUTE_UNREACHABLE_PATTERN = re.compile(r'(?:^|\s)!\w*')
+
+# Juniper
+JUNIPER_ROUTE_PATTERN = re.compile(r'^(\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})/(\d{1,2})\s+[*+\-]?\[(\w+)/(\d+)\](?:.*metric (\d+))?')
+JUNIPER_NEXT_HOP_PATTERN = re.compile(r'(?:to (\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}) )?via (\S+)')
+JUNIPER_MODEL_PATTERN = re.compile(r'Model: (\w+)')
+JUNIPER_VERSION_PATTERN = re.compile(r'^(?:Junos: (\S+)|JUNOS (?:Software Release|Base OS boot) \[([^\]]+)\])', re.MULTILINE)
+JUNIPER_SERIAL_PATTERN = re.compile(r'Serial Number: (\w+)')
+JUNIPER_UPTIME_PATTERN = re.compile(r'System booted: (.+)')
+JUNIPER_SPEED_PATTERN = re.compile(r'Speed: (\d+)([mg])bps', re.IGNORECASE)
+JUNIPER_DUPLEX_PATTERN = re.compile(r'Link-mode: (Half|Full)-duplex')
+JUNIPER_MAC_PATTERN = re.compile(r'Current address: ([0-9a-fA-F:]{17})')
+JUNIPER_MTU_PATTERN = re.compile(r'MTU: (\d+)')
+JUNIPER_DETAIL_HEADER_PATTERN = re.compile(r'^Physical interface: ([^,\s]+)')
+
+# HP (Comware) / Huawei (VRP)
+VRP_ROUTE_PATTERN = re.compile(r'^\s*(\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})/(\d{1,2})\s+(\S+)\s+(\d+)\s+(\d+)\s+(?:[A-Za-z]+\s+)?(\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})\s+(\S+)')
+VRP_ROUTE_CONTINUATION_PATTERN = re.compile(r'^\s+([A-Za-z_\-]+)\s+(\d+)\s+(\d+)\s+(?:[A-Za-z]+\s+)?(\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})\s+(\S+)')
+VRP_LLDP_PORT_PATTERN = re.compile(r'^(?:LLDP neighbor-information of port \d+\[(.+?)\]|(\S+) has \d+ neighbors?)')
+VRP_MTU_PATTERN = re.compile(r'(?:Maximum Transmit Unit is|Maximum transmission unit:?)\s*(\d+)', re.IGNORECASE)
+VRP_MAC_PATTERN = re.compile(r'hardware address(?: is|:)\s*([0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4})', re.IGNORECASE)
+VRP_SPEED_PATTERN = re.compile(r'Speed\s*:\s*(\d+)|(\d+)([MG])bps-speed mode', re.IGNORECASE)
+VRP_DUPLEX_PATTERN = re.compile(r'Duplex\s*:\s*(full|half)|(full|half)-duplex', re.IGNORECASE)
+HP_MODEL_PATTERN = re.compile(r'^(?:HPE?|H3C)\s+(.+?)\s+uptime is', re.MULTILINE)
+HP_VERSION_PATTERN = re.compile(r'Version ([\d.]+)(?:, Release (\w+))?')
+HUAWEI_MODEL_PATTERN = re.compile(r'^HUAWEI\s+(\S+).*?uptime is', re.MULTILINE)
+HUAWEI_VERSION_PATTERN = re.compile(r'Version ([\d.]+)(?: \(([^)]+)\))?')
+
+# MikroTik (RouterOS)
+MIKROTIK_ENTRY_PATTERN = re.compile(r'^\s*(\d+)\s+((?:[A-Za-z]+\s+)*)(.*)$')
+MIKROTIK_KV_PATTERN = re.compile(r'([\w.-]+)=("[^"]*"|\S*)')
+MIKROTIK_REACHABLE_VIA_PATTERN = re.compile(r'reachable via\s+(\S+)')
+MIKROTIK_RESOURCE_PATTERN = re.compile(r'^\s*([\w-]+):\s*(.+?)\s*$', re.MULTILINE)
+MIKROTIK_PING_ROW_PATTERN = re.compile(r'^\s*(\d+)\s+(\S+)\s+(?:(\d+)\s+(\d+)\s+(\S+)|.*?\b(timeout|host unreachable|net unreachable)\b)')
+MIKROTIK_PING_SUMMARY_PATTERN = re.compile(r'sent=(\d+)\s+received=(\d+)\s+packet-loss=(\d+(?:\.\d+)?)%(?:\s+min-rtt=(\S+)\s+avg-rtt=(\S+)\s+max-rtt=(\S+))?')
+MIKROTIK_TRACEROUTE_ROW_PATTERN = re.compile(r'^\s*(\d+)\s+(?:(\S+)\s+)?(\d+(?:\.\d+)?)%\s+(\d+)\s+(\S+)(?:\s+(\d+(?:\.\d+)?))?')
+MIKROTIK_DURATION_PATTERN = re.compile(r'(\d+(?:\.\d+)?)(ms|us|s)')
+
+def format_speed_kbps(speed):
+    """Kbit/sec単位の速度を表示用の文字列に変換"""
+    if speed >= 1000000:
+        return f"{speed // 1000000}Gb/s"
+    elif speed >= 1000:
+        return f"{speed // 1000}Mb/s"
+    return f"{speed}Kb/s"
+
+def route_type(protocol):
+    """プロトコル名からルートの種類を判定"""
+    if protocol in ("Direct", "Local", "C"):
+        return "Direct"
+    elif protocol in ("Static", "S"):
+        return "Static"
+    return "Dynamic"
+
+class PingState:
+    """ping出力を1行ずつ解析する途中の状態
+
+    応答行・タイムアウト行から数えた値と、統計行（送信数、受信数、損失率、RTT）の値を
+    別々に持ち、結果では統計行の値を優先する。統計行がない途中の出力でも結果を返せる。
+    """
+
+    def __init__(self):
+        self.probes = 0  # 応答またはタイムアウトを確認したプローブ数
+        self.replies = 0
+        self.rtt_count = 0
+        self.rtt_total = 0.0
+        self.rtt_min: Optional[float] = None
+        self.rtt_max: Optional[float] = None
+        self.summary: Dict[str, Any] = {}
+
+    def reply(self, rtt: Optional[float] = None):
+        self.probes += 1
+        self.replies += 1
+        if rtt is not None:
+            self.rtt_count += 1
+            self.rtt_total += rtt
+            self.rtt_min = rtt if self.rtt_min is None else min(self.rtt_min, rtt)
+            self.rtt_max = rtt if self.rtt_max is None else max(self.rtt_max, rtt)
+
+    def timeout(self, count: int = 1):
+        self.probes += count
+
+    def result(self) -> Dict[str, Any]:
+        sent = self.summary.get("sent", self.probes)
+        received = self.summary.get("received", self.replies)
+        packet_loss = self.summary.get("packet_loss")
+        if packet_loss is None:
+            packet_loss = round((sent - received) * 100 / sent, 2) if sent else 100
+        rtt_avg = round(self.rtt_total / self.rtt_count, 3) if self.rtt_count else None
+        return {
+            "success": received > 0,
+            "packet_loss": packet_loss,
+            "rtt_min": self.summary.get("rtt_min", self.rtt_min),
+            "rtt_avg": self.summary.get("rtt_avg", rtt_avg),
+            "rtt_max": self.summary.get("rtt_max", self.rtt_max),
+            "packets_sent": sent,
+            "packets_received": received
+        }
+
+def traceroute_hop(hop_num: int, text: str) -> Dict[str, Any]:
+    """ホップ番号以降のテキスト（アドレスと応答時間の並び）を解析"""
+    text = TRACEROUTE_ANNOTATION_PATTERN.sub(" ", text)
+    address_match = TRACEROUTE_ADDRESS_PATTERN.search(text)
+    # 先頭が応答時間の場合（"1 ms" など）はアドレスなし
+    if address_match and TRACEROUTE_RTT_PATTERN.match(text, address_match.start()):
+        address_match = None
+    if not address_match:
+        return {"hop": hop_num, "ip": "*", "hostname": None, "rtt": None, "status": "timeout"}
+
+    name, address = address_match.group(1), address_match.group(2)
+    if address and address != name:
+        ip, hostname = address, name
+    else:
+        ip, hostname = address or name, None
+    rest = text[address_match.end():]
+    rtt_match = TRACEROUTE_RTT_PATTERN.search(rest)
+    return {
+        "hop": hop_num,
+        "ip": ip,
+        "hostname": hostname,
+        "rtt": float(rtt_match.group(1)) if rtt_match else None,
+        "status": "unreachable" if TRACEROUTE_UNREACHABLE_PATTERN.search(rest) else "success"
+    }
+
+class VendorParser:
+    """ベンダー固有の出力パーサーの基底クラス
+
+    出力は文字列または行のイテラブルで受け取る。ping/tracerouteは1行ずつ解析し、
+    ベンダー固有の実装がない場合はBSD形式（"bytes from ... time=", "N packets transmitted"）として扱う。
+    parse_routes はルートを1件ずつ返し、呼び出し側で RouteTable に直接追加する（辞書のリストを作らない）。
+    """
+    vendor = VendorType.UNKNOWN
+    name = "Network Router"
+
+    def parse_interfaces(self, output) -> Dict[str, Dict[str, Any]]:
+        return {}
+
+    def parse_routes(self, output) -> Iterator[Dict[str, Any]]:
+        return iter(())
+
+    def parse_neighbors(self, output) -> List[Dict[str, Any]]:
+        return []
+
+    def extract_router_info(self, output) -> Dict[str, Any]:
+        return self.router_info()
+
+    def router_info(self, model=None, serial_number=None, firmware_version=None, uptime=None) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "model": model or "Unknown",
+            "serialNumber": serial_number or "Unknown",
+            "firmwareVersion": firmware_version or "Unknown",
+            "uptime": uptime or "Unknown"
+        }
+
+    def extract_interface_details(self, output, interface):
+        """インターフェースの詳細情報を抽出して interface に反映"""
+
+    def interface_detail_name(self, line) -> Optional[str]:
+        """詳細出力でインターフェースの開始行ならインターフェース名を返す"""
+        if line and not line[0].isspace():
+            parts = line.split()
+            if len(parts) >= 2 and parts[1] in ("is", "current"):
+                return parts[0]
+        return None
+
+    def split_interface_details(self, output) -> Dict[str, str]:
+        """全インターフェースの詳細出力をインターフェース名ごとのブロックに分割"""
+        blocks = {}
+        current_name = None
+        current_lines = []
+
+        for line in iter_lines(output):
+            name = self.interface_detail_name(line)
+            if name:
+                if current_name:
+                    blocks[current_name] = '\n'.join(current_lines)
+                current_name = name
+                current_lines = [line]
+            elif current_name:
+                current_lines.append(line)
+
+        if current_name:
+            blocks[current_name] = '\n'.join(current_lines)
+
+        return blocks
+
+    def parse_ping_line(self, line, state: PingState) -> bool:
+        """ping出力の1行を解析して state に反映（プローブの結果が増えた場合はTrue）"""
+        reply_match = PING_REPLY_PATTERN.search(line)
+        if reply_match:
+            state.reply(float(reply_match.group(1)))
+            return True
+        if PING_TIMEOUT_PATTERN.search(line):
+            state.timeout()
+            return True
+
+        # 統計行（1行にまとまる形式と、項目ごとに行が分かれる形式がある）
+        sent_match = PING_SENT_PATTERN.search(line)
+        if sent_match:
+            state.summary["sent"] = int(sent_match.group(1))
+        received_match = PING_RECEIVED_PATTERN.search(line)
+        if received_match:
+            state.summary["received"] = int(received_match.group(1))
+        loss_match = PING_LOSS_PATTERN.search(line)
+        if loss_match:
+            state.summary["packet_loss"] = float(loss_match.group(1))
+        rtt_match = PING_RTT_PATTERN.search(line)
+        if rtt_match:
+            state.summary["rtt_min"] = float(rtt_match.group(1))
+            state.summary["rtt_avg"] = float(rtt_match.group(2))
+            state.summary["rtt_max"] = float(rtt_match.group(3))
+        return False
+
+    def parse_ping_result(self, output) -> Dict[str, Any]:
+        """Ping結果を解析"""
+        state = PingState()
+        for line in iter_lines(output):
+            self.parse_ping_line(line, state)
+        return state.result()
+
+    def parse_traceroute_line(self, line) -> Optional[Dict[str, Any]]:
+        """トレースルート出力の1行を解析（ホップ行でなければNone）"""
+        hop_match = TRACEROUTE_HOP_PATTERN.match(line)
+        if not hop_match:
+            return None
+        return traceroute_hop(int(hop_match.group(1)), hop_match.group(2))
+
+    def parse_traceroute(self, output) -> List[Dict[str, Any]]:
+        """トレースルート結果を解析
+
+        同じホップが複数回出力された場合（表示を更新する形式）は最後の行を使う。
+        """
+        hops = {}
+        for line in iter_lines(output):
+            hop = self.parse_traceroute_line(line)
+            if hop:
+                hops[hop["hop"]] = hop
+        return list(hops.values())
+
+PARSER_REGISTRY: Dict[VendorType, VendorParser] = {}
+
+def register_parser(cls):
+    """パーサークラスをベンダーに登録するデコレーター"""
+    PARSER_REGISTRY[cls.vendor] = cls()
+    return cls
+
+def get_parser(vendor) -> VendorParser:
+    """ベンダーに対応するパーサーを取得"""
+    parser = PARSER_REGISTRY.get(vendor)
+    if parser is None:
+        logger.warning(f"No parser registered for vendor {vendor}, using the unknown-vendor parser")
+        parser = PARSER_REGISTRY[VendorType.UNKNOWN]
+    return parser
+
+@register_parser
+class CiscoParser(VendorParser):
+    """Cisco IOS"""
+    vendor = VendorType.CISCO
+    name = "Cisco Router"
+
+    def parse_ping_line(self, line, state):
+        # "!!.!!" の進捗行（1文字が1プローブ）と "Success rate is ..." の統計行
+        progress = line.strip()
+        if progress and CISCO_PING_PROGRESS_PATTERN.fullmatch(progress):
+            replies = progress.count("!")
+            state.probes += len(progress)
+            state.replies += replies
+            return True
+
+        success_match = CISCO_PING_SUCCESS_PATTERN.search(line)
+        if success_match:
+            state.summary["packet_loss"] = 100 - int(success_match.group(1))
+            state.summary["received"] = int(success_match.group(2))
+            state.summary["sent"] = int(success_match.group(3))
+            rtt_match = PING_RTT_PATTERN.search(line)
+            if rtt_match:
+                state.summary["rtt_min"] = float(rtt_match.group(1))
+                state.summary["rtt_avg"] = float(rtt_match.group(2))
+                state.summary["rtt_max"] = float(rtt_match.group(3))
+            return False
+
+        # NX-OS などのBSD形式
+        return super().parse_ping_line(line, state)
+
+    def parse_interfaces(self, output):
+        # show ip interface brief
+        interfaces = {}
+
+        for line in iter_lines(output):
+            parts = line.split()
+            if len(parts) >= 5 and not line.startswith("Interface"):
+                interface_name = parts[0]
+                ip = parts[1] if parts[1] != "unassigned" else "unassigned"
+                status = parts[4] if len(parts) > 4 else "unknown"
+                protocol = parts[5] if len(parts) > 5 else "unknown"
+                # "administratively down" は2語に分かれる
+                if status == "administratively" and len(parts) > 6:
+                    status = "administratively down"
+                    protocol = parts[6]
+
+                interfaces[interface_name] = {
+                    "name": interface_name,
+                    "status": status,
+                    "protocol": protocol,
+                    "ip": ip,
+                    "speed": "auto",
+                    "duplex": "auto"
+                }
+
+        return interfaces
+
+    def parse_routes(self, output):
+        # show ip route
+        for line in iter_lines(output):
+            if not line.strip() or not any(code in line[:2] for code in "CSROBIEGHD*"):
+                continue
+
+            # 直接接続されたルート
+            connected_match = CISCO_CONNECTED_ROUTE_PATTERN.search(line)
+            if connected_match:
+                yield {
+                    "destination": connected_match.group(2),
+                    "prefix_length": int(connected_match.group(4)) if connected_match.group(4) else 32,
+                    "next_hop": "Connected",
+                    "interface": connected_match.group(5),
+                    "protocol": connected_match.group(1),
+                    "metric": 0,
+                    "administrative_distance": 0,
+                    "type": "Direct"
+                }
+                continue
+
+            # 通常のルート（"S*" の * は候補デフォルトの印、経過時間の後にインターフェース）
+            match = CISCO_ROUTE_PATTERN.search(line)
+            if match:
+                protocol = match.group(1)
+                yield {
+                    "destination": match.group(2),
+                    "prefix_length": int(match.group(4)) if match.group(4) else 32,
+                    "next_hop": match.group(7) if match.group(7) else "Connected",
+                    "interface": match.group(8) if match.group(8) else "",
+                    "protocol": protocol,
+                    "metric": int(match.group(6)) if match.group(6) else 0,
+                    "administrative_distance": int(match.group(5)) if match.group(5) else 0,
+                    "type": "Static" if protocol == "S" else "Dynamic"
+                }
+
+    def parse_neighbors(self, output):
+        # show cdp neighbors detail - デバイスごとのブロックを処理
+        neighbors = []
+        for block in CDP_BLOCK_SEPARATOR.split(as_text(output)):
+            if not block.strip():
+                continue
+
+            device_match = CDP_DEVICE_PATTERN.search(block)
+            if not device_match:
+                continue
+            ip_match = CDP_IP_PATTERN.search(block)
+            platform_match = CDP_PLATFORM_PATTERN.search(block)
+            interface_match = CDP_INTERFACE_PATTERN.search(block)
+            port_match = CDP_PORT_PATTERN.search(block)
+
+            neighbors.append({
+                "device_id": device_match.group(1).strip(),
+                "ip_address": ip_match.group(1) if ip_match else None,
+                "platform": platform_match.group(1).strip() if platform_match else "Unknown",
+                "local_interface": interface_match.group(1).strip() if interface_match else "Unknown",
+                "remote_interface": port_match.group(1).strip() if port_match else "Unknown"
+            })
+
+        return neighbors
+
+    def extract_router_info(self, output):
+        output = as_text(output)
+        model_match = CISCO_MODEL_PATTERN.search(output)
+        version_match = CISCO_VERSION_PATTERN.search(output)
+        serial_match = CISCO_SERIAL_PATTERN.search(output)
+        uptime_match = UPTIME_PATTERN.search(output)
+
+        return self.router_info(
+            model_match.group(1) if model_match else None,
+            serial_match.group(1) if serial_match else None,
+            version_match.group(1) if version_match else None,
+            uptime_match.group(1) if uptime_match else None,
+        )
+
+    def extract_interface_details(self, output, interface):
+        # スピード
+        speed_match = CISCO_BANDWIDTH_PATTERN.search(output)
+        if speed_match:
+            interface["speed"] = format_speed_kbps(int(speed_match.group(1)))
+
+        # デュプレックス
+        duplex_match = CISCO_DUPLEX_PATTERN.search(output)
+        if duplex_match:
+            interface["duplex"] = duplex_match.group(1).lower()
+
+        # MAC
+        mac_match = CISCO_MAC_PATTERN.search(output)
+        if mac_match:
+            interface["mac"] = mac_match.group(1)
+
+        # MTU
+        mtu_match = CISCO_MTU_PATTERN.search(output)
+        if mtu_match:
+            interface["mtu"] = int(mtu_match.group(1))
+
+        # 説明
+        desc_match = DESCRIPTION_PATTERN.search(output)
+        if desc_match:
+            interface["description"] = desc_match.group(1).strip()
+
+@register_parser
+class JuniperParser(VendorParser):
+    """Juniper Junos"""
+    vendor = VendorType.JUNIPER
+    name = "Juniper Router"
+
+    def parse_interfaces(self, output):
+        # show interfaces terse
+        interfaces = {}
+
+        # Interface  Admin  Link  Proto  Local  Remote
+        for line in iter_lines(output):
+            if not line.strip() or line.startswith(" ") or line.startswith("Interface "):
+                continue
+
+            # 新しいインターフェース
+            parts = line.split()
+            if len(parts) >= 3:
+                interface_name = parts[0]
+                link = parts[2]
+                status = "administratively down" if parts[1] == "down" else link
+                # "inet 10.0.0.1/24"（ループバックは "10.255.1.1 --> 0/0"）
+                ip = parts[4].split("/")[0] if len(parts) >= 5 and parts[3] == "inet" else "unassigned"
+
+                interfaces[interface_name] = {
+                    "name": interface_name,
+                    "status": status,
+                    "protocol": link,
+                    "ip": ip,
+                    "speed": "auto",
+                    "duplex": "auto"
+                }
+
+        return interfaces
+
+    def parse_routes(self, output):
+        # show route - 宛先行の後にインデントされた次ホップ行が続く
+        current_route = None
+
+        for line in iter_lines(output):
+            if not line.strip():
+                continue
+
+            if not line[0].isspace():
+                # 新しいルートエントリ（前のエントリは次ホップ行まで読み終えている）
+                if current_route is not None:
+                    yield current_route
+                route_match = JUNIPER_ROUTE_PATTERN.match(line)
+                if not route_match:
+                    current_route = None
+                    continue
+                protocol = route_match.group(3)
+                current_route = {
+                    "destination": route_match.group(1),
+                    "prefix_length": int(route_match.group(2)),
+                    "next_hop": "Connected" if route_type(protocol) == "Direct" else "",
+                    "interface": "",
+                    "protocol": protocol,
+                    "metric": int(route_match.group(5)) if route_match.group(5) else 0,
+                    "administrative_distance": int(route_match.group(4)),
+                    "type": route_type(protocol)
+                }
+            elif current_route is not None and not current_route["interface"]:
+                # ルートエントリの詳細（最初の次ホップのみ）
+                next_hop_match = JUNIPER_NEXT_HOP_PATTERN.search(line)
+                if next_hop_match:
+                    current_route["interface"] = next_hop_match.group(2)
+                    if next_hop_match.group(1):
+                        current_route["next_hop"] = next_hop_match.group(1)
+
+        if current_route is not None:
+            yield current_route
+
+    def parse_neighbors(self, output):
+        # show lldp neighbors
+        # Local Interface  Parent Interface  Chassis Id  Port info  System Name
+        # 表形式のため管理アドレスは含まれない。System Nameが空ならChassis Idを使う
+        neighbors = []
+        in_table = False
+
+        for line in iter_lines(output):
+            if line.startswith("Local Interface"):
+                in_table = True
+                continue
+            parts = line.split()
+            if not in_table or len(parts) < 4:
+                continue
+
+            neighbors.append({
+                "device_id": " ".join(parts[4:]) or parts[2],
+                "ip_address": None,
+                "platform": "Unknown",
+                "local_interface": parts[0],
+                "remote_interface": parts[3]
+            })
+
+        return neighbors
+
+    def extract_router_info(self, output):
+        output = as_text(output)
+        model_match = JUNIPER_MODEL_PATTERN.search(output)
+        # 新しいリリースは "Junos: 21.4R3", 古いリリースは "JUNOS Base OS boot [12.3R6.6]"
+        version_match = JUNIPER_VERSION_PATTERN.search(output)
+        serial_match = JUNIPER_SERIAL_PATTERN.search(output)
+        uptime_match = JUNIPER_UPTIME_PATTERN.search(output)
+
+        return self.router_info(
+            model_match.group(1) if model_match else None,
+            serial_match.group(1) if serial_match else None,
+            (version_match.group(1) or version_match.group(2)) if version_match else None,
+            uptime_match.group(1) if uptime_match else None,
+        )
+
+    def interface_detail_name(self, line):
+        # "Physical interface: ge-0/0/0, Enabled, Physical link is Up"
+        header_match = JUNIPER_DETAIL_HEADER_PATTERN.match(line)
+        return header_match.group(1) if header_match else None
+
+    def extract_interface_details(self, output, interface):
+        # スピード
+        speed_match = JUNIPER_SPEED_PATTERN.search(output)
+        if speed_match:
+            unit = 1000000 if speed_match.group(2).lower() == "g" else 1000
+            interface["speed"] = format_speed_kbps(int(speed_match.group(1)) * unit)
+
+        # デュプレックス
+        duplex_match = JUNIPER_DUPLEX_PATTERN.search(output)
+        if duplex_match:
+            interface["duplex"] = duplex_match.group(1).lower()
+
+        # MAC
+        mac_match = JUNIPER_MAC_PATTERN.search(output)
+        if mac_match:
+            interface["mac"] = mac_match.group(1)
+
+        # MTU
+        mtu_match = JUNIPER_MTU_PATTERN.search(output)
+        if mtu_match:
+            interface["mtu"] = int(mtu_match.group(1))
+
+        # 説明
+        desc_match = DESCRIPTION_PATTERN.search(output)
+        if desc_match:
+            interface["description"] = desc_match.group(1).strip()
+
+class VrpStyleParser(VendorParser):
+    """HP Comware / Huawei VRP 共通の解析（displayコマンド系）"""
+
+    def parse_routes(self, output):
+        # display ip routing-table
+        # Destination/Mask    Proto  Pre  Cost  [Flags]  NextHop  Interface
+        last_destination = None
+
+        for line in iter_lines(output):
+            match = VRP_ROUTE_PATTERN.match(line)
+            if match:
+                last_destination = (match.group(1), int(match.group(2)))
+                protocol, preference, cost, next_hop, interface = match.groups()[2:]
+            else:
+                # 等コストの2本目以降は宛先が省略される
+                match = VRP_ROUTE_CONTINUATION_PATTERN.match(line)
+                if not match or last_destination is None:
+                    continue
+                protocol, preference, cost, next_hop, interface = match.groups()
+
+            kind = route_type(protocol)
+            yield {
+                "destination": last_destination[0],
+                "prefix_length": last_destination[1],
+                "next_hop": "Connected" if kind == "Direct" else next_hop,
+                "interface": interface,
+                "protocol": protocol,
+                "metric": int(cost),
+                "administrative_distance": int(preference),
+                "type": kind
+            }
+
+    def parse_neighbors(self, output):
+        # display lldp neighbor - "キー : 値" 形式のブロック
+        neighbors = []
+        local_interface = "Unknown"
+        current_neighbor = None
+
+        def finish(neighbor):
+            if neighbor and neighbor.get("device_id"):
+                neighbor.setdefault("ip_address", None)
+                neighbor.setdefault("platform", "Unknown")
+                neighbor.setdefault("remote_interface", "Unknown")
+                neighbors.append(neighbor)
+
+        for line in iter_lines(output):
+            port_match = VRP_LLDP_PORT_PATTERN.match(line)
+            if port_match:
+                finish(current_neighbor)
+                current_neighbor = None
+                local_interface = port_match.group(1) or port_match.group(2)
+                continue
+
+            if ":" not in line:
+                continue
+            key, value = line.split(":", 1)
+            key = key.strip().lower()
+            value = value.strip()
+
+            if key in ("lldp neighbor index", "neighbor index"):
+                finish(current_neighbor)
+                current_neighbor = {"local_interface": local_interface}
+                continue
+            if current_neighbor is None:
+                current_neighbor = {"local_interface": local_interface}
+
+            if key == "system name" and value:
+                current_neighbor["device_id"] = value
+            elif key in ("chassisid/subtype", "chassis id") and "device_id" not in current_neighbor:
+                current_neighbor["device_id"] = value.split("/")[0]
+            elif key == "port id/subtype":
+                current_neighbor["remote_interface"] = value.rsplit("/", 1)[0]
+            elif key == "port id":
+                current_neighbor["remote_interface"] = value
+            elif key in ("management address", "management address value"):
+                ip_match = IPV4_PATTERN.search(value)
+                if ip_match:
+                    current_neighbor["ip_address"] = ip_match.group(1)
+            elif key == "system description" and value:
+                current_neighbor["platform"] = value.split(",")[0].strip()
+
+        finish(current_neighbor)
+        return neighbors
+
+    def interface_detail_name(self, line):
+        # Comware: インターフェース名のみの行 / VRP: "GigabitEthernet0/0/1 current state : UP"
+        if line and not line[0].isspace() and ":" not in line.split(" current")[0]:
+            parts = line.split()
+            if len(parts) == 1 and any(c.isdigit() for c in parts[0]):
+                return parts[0]
+        return super().interface_detail_name(line)
+
+    def extract_interface_details(self, output, interface):
+        # スピード（VRPはMbps単位、Comwareは "1000Mbps-speed mode"）
+        speed_match = VRP_SPEED_PATTERN.search(output)
+        if speed_match:
+            if speed_match.group(1):
+                interface["speed"] = format_speed_kbps(int(speed_match.group(1)) * 1000)
+            else:
+                unit = 1000000 if speed_match.group(3).upper() == "G" else 1000
+                interface["speed"] = format_speed_kbps(int(speed_match.group(2)) * unit)
+
+        # デュプレックス
+        duplex_match = VRP_DUPLEX_PATTERN.search(output)
+        if duplex_match:
+            interface["duplex"] = (duplex_match.group(1) or duplex_match.group(2)).lower()
+
+        # MAC
+        mac_match = VRP_MAC_PATTERN.search(output)
+        if mac_match:
+            interface["mac"] = mac_match.group(1)
+
+        # MTU
+        mtu_match = VRP_MTU_PATTERN.search(output)
+        if mtu_match:
+            interface["mtu"] = int(mtu_match.group(1))
+
+        # 説明
+        desc_match = DESCRIPTION_PATTERN.search(output)
+        if desc_match:
+            interface["description"] = desc_match.group(1).strip()
+
+@register_parser
+class HPParser(VrpStyleParser):
+    """HP / HPE Comware"""
+    vendor = VendorType.HP
+    name = "HP Router"
+
+    def parse_interfaces(self, output):
+        # display interface brief
+        interfaces = {}
+
+        for line in iter_lines(output):
+            if not "UP" in line and not "DOWN" in line and not "ADM" in line:
+                continue
+
+            # 凡例の行（"Link: ADM - administratively down; ..."）は除く
+            parts = line.split()
+            if len(parts) < 3 or parts[1] not in ("UP", "DOWN", "ADM") or parts[0].endswith(":"):
+                continue
+
+            interface_name = parts[0]
+            status = {"UP": "up", "ADM": "administratively down"}.get(parts[1], "down")
+            if parts[2] in ("UP", "DOWN"):
+                protocol = "up" if parts[2] == "UP" else "down"
+            else:
+                protocol = "up" if parts[1] == "UP" else "down"
+
+            # IPアドレス情報を探す
+            ip_match = IPV4_PATTERN.search(line)
+
+            interfaces[interface_name] = {
+                "name": interface_name,
+                "status": status,
+                "protocol": protocol,
+                "ip": ip_match.group(1) if ip_match else "unassigned",
+                "speed": "auto",
+                "duplex": "auto"
+            }
+
+        return interfaces
+
+    def extract_router_info(self, output):
+        output = as_text(output)
+        model_match = HP_MODEL_PATTERN.search(output)
+        version_match = HP_VERSION_PATTERN.search(output)
+        uptime_match = UPTIME_PATTERN.search(output)
+
+        version = None
+        if version_match:
+            version = version_match.group(1)
+            if version_match.group(2):
+                version = f"{version} Release {version_match.group(2)}"
+
+        return self.router_info(
+            model_match.group(1) if model_match else None,
+            None,
+            version,
+            uptime_match.group(1).strip() if uptime_match else None,
+        )
+
+@register_parser
+class HuaweiParser(VrpStyleParser):
+    """Huawei VRP"""
+    vendor = VendorType.HUAWEI
+    name = "Huawei Router"
+
+    def parse_interfaces(self, output):
+        # display ip interface brief
+        # Interface  IP Address/Mask  Physical  Protocol
+        interfaces = {}
+
+        for line in iter_lines(output):
+            parts = line.split()
+            if len(parts) < 4:
+                continue
+            if not IPV4_PATTERN.match(parts[1]) and parts[1] != "unassigned":
+                continue
+
+            interface_name = parts[0]
+            physical = parts[2]
+            # "*down" は管理上のシャットダウン、"up(s)" はスプーフィング
+            if physical.startswith("*"):
+                status = "administratively down"
+            else:
+                status = physical.split("(")[0]
+
+            interfaces[interface_name] = {
+                "name": interface_name,
+                "status": status,
+                "protocol": parts[3].split("(")[0],
+                "ip": parts[1].split("/")[0],
+                "speed": "auto",
+                "duplex": "auto"
+            }
+
+        return interfaces
+
+    def extract_router_info(self, output):
+        output = as_text(output)
+        model_match = HUAWEI_MODEL_PATTERN.search(output)
+        version_match = HUAWEI_VERSION_PATTERN.search(output)
+        uptime_match = UPTIME_PATTERN.search(output)
+
+        version = None
+        if version_match:
+            version = version_match.group(1)
+            if version_match.group(2):
+                version = f"{version} ({version_match.group(2)})"
+
+        return self.router_info(
+            model_match.group(1) if model_match else None,
+            None,
+            version,
+            uptime_match.group(1).strip() if uptime_match else None,
+        )
+
+def iter_mikrotik_entries(output):
+    """RouterOSの print detail 出力をエントリごとに (フラグ, 属性, 元のテキスト) で返す"""
+    flags = None
+    parts = []
+
+    for line in iter_lines(output):
+        if not line.strip() or line.startswith("Flags:"):
+            continue
+
+        entry_match = MIKROTIK_ENTRY_PATTERN.match(line)
+        if entry_match:
+            if parts:
+                yield flags, parts
+            # v6は列がそろうように "A S" とフラグの間に空白が入る
+            flags = "".join(entry_match.group(2).split())
+            parts = [entry_match.group(3)]
+        elif parts:
+            # 前のエントリの続き
+            parts.append(line.strip())
+
+    if parts:
+        yield flags, parts
+
+def parse_mikrotik_attributes(parts):
+    """key=value 形式の属性を辞書に変換"""
+    text = " ".join(parts)
+    attributes = {key: value.strip('"') for key, value in MIKROTIK_KV_PATTERN.findall(text)}
+    # ";;; コメント" は説明として扱う
+    if parts and parts[0].startswith(";;;"):
+        attributes.setdefault("comment", parts[0][3:].strip())
+    return attributes, text
+
+def mikrotik_duration_ms(value: Optional[str]) -> Optional[float]:
+    """RouterOSの時間表記（"9ms", "9ms383us", "456us", "1s2ms"）をミリ秒に変換"""
+    if not value:
+        return None
+    parts = MIKROTIK_DURATION_PATTERN.findall(value)
+    if not parts:
+        return None
+    scale = {"s": 1000.0, "ms": 1.0, "us": 0.001}
+    return round(sum(float(number) * scale[unit] for number, unit in parts), 3)
+
+@register_parser
+class MikroTikParser(VendorParser):
+    """MikroTik RouterOS"""
+    vendor = VendorType.MIKROTIK
+    name = "MikroTik Router"
+
+    # ルートフラグ -> プロトコル
+    ROUTE_FLAG_PROTOCOLS = {"C": "C", "S": "S", "o": "O", "b": "B", "r": "R", "d": "D"}
+
+    def parse_interfaces(self, output):
+        # /interface print detail
+        interfaces = {}
+
+        for flags, parts in iter_mikrotik_entries(output):
+            attributes, _ = parse_mikrotik_attributes(parts)
+            interface_name = attributes.get("name")
+            if not interface_name:
+                continue
+
+            if "X" in flags:
+                status = "administratively down"
+            else:
+                status = "up" if "R" in flags else "down"
+
+            interface = {
+                "name": interface_name,
+                "status": status,
+                "protocol": "up" if "R" in flags else "down",
+                "ip": "unassigned",
+                "speed": "auto",
+                "duplex": "auto"
+            }
+            self._apply_attributes(attributes, interface)
+            interfaces[interface_name] = interface
+
+        return interfaces
+
+    def _apply_attributes(self, attributes, interface):
+        if attributes.get("mac-address"):
+            interface["mac"] = attributes["mac-address"]
+        mtu = attributes.get("actual-mtu") or attributes.get("mtu")
+        if mtu and mtu.isdigit():
+            interface["mtu"] = int(mtu)
+        if attributes.get("comment"):
+            interface["description"] = attributes["comment"]
+
+    def parse_routes(self, output):
+        # /ip route print detail
+        for flags, parts in iter_mikrotik_entries(output):
+            attributes, text = parse_mikrotik_attributes(parts)
+            destination = attributes.get("dst-address", "")
+            if "/" not in destination or "X" in flags:
+                continue
+            address, prefix_length = destination.split("/", 1)
+
+            protocol = next((self.ROUTE_FLAG_PROTOCOLS[f] for f in flags if f in self.ROUTE_FLAG_PROTOCOLS), "S")
+            gateway = attributes.get("gateway", "")
+            if protocol == "C":
+                next_hop = "Connected"
+                interface = gateway
+            else:
+                next_hop = gateway
+                # v6: "reachable via ether1" / v7: immediate-gw=192.168.88.1%ether1
+                via_match = MIKROTIK_REACHABLE_VIA_PATTERN.search(text)
+                immediate_gw = attributes.get("immediate-gw", "")
+                if via_match:
+                    interface = via_match.group(1)
+                elif "%" in immediate_gw:
+                    interface = immediate_gw.split("%", 1)[1]
+                else:
+                    interface = attributes.get("vrf-interface", "")
+
+            distance = attributes.get("distance", "0")
+            yield {
+                "destination": address,
+                "prefix_length": int(prefix_length),
+                "next_hop": next_hop,
+                "interface": interface,
+                "protocol": protocol,
+                "metric": 0,
+                "administrative_distance": int(distance) if distance.isdigit() else 0,
+                "type": route_type(protocol)
+            }
+
+    def parse_neighbors(self, output):
+        # /ip neighbor print detail
+        neighbors = []
+
+        for _, parts in iter_mikrotik_entries(output):
+            attributes, _ = parse_mikrotik_attributes(parts)
+            device_id = attributes.get("identity") or attributes.get("mac-address")
+            if not device_id:
+                continue
+            ip_match = IPV4_PATTERN.search(attributes.get("address", ""))
+
+            neighbors.append({
+                "device_id": device_id,
+                "ip_address": ip_match.group(1) if ip_match else None,
+                "platform": attributes.get("platform") or attributes.get("board") or "Unknown",
+                "local_interface": attributes.get("interface", "Unknown").split(",")[0],
+                "remote_interface": attributes.get("interface-name") or "Unknown"
+            })
+
+        return neighbors
+
+    def extract_router_info(self, output):
+        # /system resource print - "key: value" 形式
+        resources = dict(MIKROTIK_RESOURCE_PATTERN.findall(as_text(output)))
+        return self.router_info(
+            resources.get("board-name"),
+            None,
+            resources.get("version"),
+            resources.get("uptime"),
+        )
+
+    def split_interface_details(self, output):
+        # name= が継続行にある場合もあるため、エントリ単位で分割する
+        blocks = {}
+        for flags, parts in iter_mikrotik_entries(output):
+            attributes, _ = parse_mikrotik_attributes(parts)
+            if attributes.get("name"):
+                blocks[attributes["name"]] = f"0 {flags} " + "\n    ".join(parts)
+        return blocks
+
+    def extract_interface_details(self, output, interface):
+        for _, parts in iter_mikrotik_entries(output):
+            attributes, _ = parse_mikrotik_attributes(parts)
+            self._apply_attributes(attributes, interface)
+            break
+
+    def parse_ping_line(self, line, state):
+        # /ping - "SEQ HOST SIZE TTL TIME STATUS" の表と "sent=5 received=5 packet-loss=0% ..." の統計行
+        row_match = MIKROTIK_PING_ROW_PATTERN.match(line)
+        if row_match:
+            if row_match.group(6):
+                state.timeout()
+            else:
+                state.reply(mikrotik_duration_ms(row_match.group(5)))
+            return True
+
+        summary_match = MIKROTIK_PING_SUMMARY_PATTERN.search(line)
+        if summary_match:
+            state.summary["sent"] = int(summary_match.group(1))
+            state.summary["received"] = int(summary_match.group(2))
+            state.summary["packet_loss"] = float(summary_match.group(3))
+            if summary_match.group(4):
+                state.summary["rtt_min"] = mikrotik_duration_ms(summary_match.group(4))
+                state.summary["rtt_avg"] = mikrotik_duration_ms(summary_match.group(5))
+                state.summary["rtt_max"] = mikrotik_duration_ms(summary_match.group(6))
+        return False
+
+    def parse_traceroute_line(self, line):
+        # /tool traceroute - "# ADDRESS LOSS SENT LAST AVG BEST WORST STD-DEV STATUS" の表
+        row_match = MIKROTIK_TRACEROUTE_ROW_PATTERN.match(line)
+        if not row_match:
+            return None
+        hop_num = int(row_match.group(1))
+        address = row_match.group(2)
+        if not address or float(row_match.group(3)) >= 100:
+            return {"hop": hop_num, "ip": address or "*", "hostname": None, "rtt": None, "status": "timeout"}
+        rtt = float(row_match.group(6)) if row_match.group(6) else mikrotik_duration_ms(row_match.group(5))
+        return {
+            "hop": hop_num,
+            "ip": address,
+            "hostname": None,
+            "rtt": rtt,
+            "status": "unreachable" if "unreachable" in line else "success"
+        }
+
+@register_parser
+class GenericParser(CiscoParser):
+    """ベンダー不明（最も一般的なCisco形式として解析を試みる）"""
+    vendor = VendorType.UNKNOWN
+    name = "Network Router"
+
+# ベンダーに応じた解析
+@instrument_parser
+def parse_interfaces(output, vendor):
+    return get_parser(vendor).parse_interfaces(output)
+
+@instrument_parser
+def parse_routes(output, vendor):
+    return RouteTable.from_routes(get_parser(vendor).parse_routes(output))
+
+@instrument_parser
+def parse_neighbors(output, vendor):
+    """隣接デバイス情報を解析"""
+    return get_parser(vendor).parse_neighbors(output)
+
+@instrument_parser
+def extract_router_info(output, vendor):
+    """ベンダーに応じたルーター情報の抽出"""
+    return get_parser(vendor).extract_router_info(output)
+
+@instrument_parser
+def extract_interface_details(output, interface, vendor):
+    """インターフェースの詳細情報を抽出"""
+    get_parser(vendor).extract_interface_details(output, interface)
+
+@instrument_parser
+def split_interface_details(output, vendor):
+    """全インターフェースの詳細出力をインターフェース名ごとのブロックに分割"""
+    return get_parser(vendor).split_interface_details(output)
+
+@instrument_parser
+def parse_traceroute(output, vendor):
+    """トレースルート結果を解析"""
+    return get_parser(vendor).parse_traceroute(output)
+
+def parse_traceroute_line(line, vendor):
+    """トレースルート出力の1行を解析（ホップ行でなければNone）"""
+    return get_parser(vendor).parse_traceroute_line(line)
+
+@instrument_parser
+def parse_ping_result(output, vendor):
+    """Ping結果を解析"""
+    return get_parser(vendor).parse_ping_result(output)
+
+def parse_ping_line(line, vendor, state: PingState) -> bool:
+    """ping出力の1行を解析して state に反映（プローブの結果が増えた場合はTrue）"""
+    return get_parser(vendor).parse_ping_line(line, state)
+
+# コンパクトなルートテーブル
+UINT32_MAX = 0xFFFFFFFF
+
+def ipv4_to_int(value: str) -> Optional[int]:
+    """ドット区切りのIPv4アドレスを整数に変換（IPv4でなければNone）"""
+    try:
+        return int.from_bytes(socket.inet_pton(socket.AF_INET, value), "big")
+    except (OSError, TypeError):
+        return None
+
+def int_to_ipv4(value: int) -> str:
+    return socket.inet_ntoa(value.to_bytes(4, "big"))
+
+class StringTable:
+    """文字列を小さな整数コードに変換するインターン表"""
+    __slots__ = ("_codes", "values")
+
+    def __init__(self):
+        self._codes: Dict[str, int] = {}
+        self.values: List[str] = []
+
+    def code(self, value: str) -> int:
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+class RouteTable:
+    """列指向のルーティングテーブル
+
+    1ルートを辞書で持つ代わりに、宛先とネクストホップを整数、プロトコルと
+    インターフェースをインターン表のコードとして array の列に格納する。
+    プロトコルと種別は値の種類が少ないため、インターフェース名などとは別の小さな表に持つ
+    （共有の表だとコードがインターフェースの数だけ大きくなり、狭い列に収まらない）。
+    行を参照したときだけ従来と同じ形の辞書を生成し、JSONへの変換は to_list で行う。
+    IPv4以外の宛先は行番号をキーとする疎な辞書に保持する。
+    """
+    FIELDS = ("destination", "prefix_length", "next_hop", "interface", "protocol", "metric", "administrative_distance", "type")
+
+    def __init__(self):
+        self._family = array.array("B")  # 4: IPv4, 6: IPv6, 0: 文字列のまま
+        self._destination = array.array("I")
+        self._wide_destination: Dict[int, Any] = {}
+        self._prefix_length = array.array("B")
+        # 0以上はIPv4アドレス、負の値は文字列表のコード（-(code + 1)）
+        self._next_hop = array.array("q")
+        self._interface = array.array("I")
+        self._protocol = array.array("H")
+        self._metric = array.array("I")
+        self._distance = array.array("I")
+        self._type = array.array("H")
+        self._strings = StringTable()  # インターフェース名と、IPv4以外のネクストホップ
+        self._protocols = StringTable()
+        self._types = StringTable()
+
+    @classmethod
+    def from_routes(cls, routes: Iterable[Dict[str, Any]]) -> "RouteTable":
+        if isinstance(routes, cls):
+            return routes
+        table = cls()
+        for route in routes:
+            table.append(route)
+        return table
+
+    def append(self, route: Dict[str, Any]):
+        row = len(self._family)
+        destination = route["destination"]
+        value = ipv4_to_int(destination)
+        if value is not None:
+            self._family.append(4)
+            self._destination.append(value)
+            bits = 32
+        else:
+            try:
+                address = ipaddress.ip_address(destination)
+            except ValueError:
+                address = None
+            self._family.append(6 if address is not None else 0)
+            self._destination.append(0)
+            self._wide_destination[row] = int(address) if address is not None else destination
+            bits = 128 if address is not None else 32
+        
+        prefix_length = route.get("prefix_length")
+        if prefix_length is None:
+            prefix_length = bits
+        self._prefix_length.append(prefix_length)
+        self._next_hop.append(self._encode_next_hop(route.get("next_hop") or ""))
+        self._interface.append(self._strings.code(route.get("interface") or ""))
+        self._protocol.append(self._protocols.code(route.get("protocol") or ""))
+        self._metric.append(min(route.get("metric") or 0, UINT32_MAX))
+        self._distance.append(min(route.get("administrative_distance") or 0, UINT32_MAX))
+        self._type.append(self._types.code(route.get("type") or ""))
+
+    def _encode_next_hop(self, next_hop: str) -> int:
+        value = ipv4_to_int(next_hop)
+        if value is None:
+            return -(self._strings.code(next_hop) + 1)
+        return value
+
+    def _decode_next_hop(self, value: int) -> str:
+        if value >= 0:
+            return int_to_ipv4(value)
+        return self._strings.values[-value - 1]
+
+    def destination_value(self, row: int) -> Optional[tuple]:
+        """(IPバージョン, アドレスの整数値)。アドレスでない宛先はNone"""
+        family = self._family[row]
+        if family == 4:
+            return 4, self._destination[row]
+        if family == 6:
+            return 6, self._wide_destination[row]
+        return None
+
+    def prefix_length(self, row: int) -> int:
+        return self._prefix_length[row]
+
+    def preference(self, row: int) -> tuple:
+        return self._distance[row], self._metric[row]
+
+    def key(self, row: int) -> tuple:
+        """差分計算用の正規化したキー（宛先/プレフィックス長/ネクストホップ）"""
+        destination = self._destination[row] if self._family[row] == 4 else self._wide_destination[row]
+        return self._family[row], destination, self._prefix_length[row], self._next_hop_key(row)
+
+    def _next_hop_key(self, row: int):
+        value = self._next_hop[row]
+        return value if value >= 0 else self._strings.values[-value - 1]
+
+    def row(self, row: int) -> tuple:
+        """行の全列の値（テーブル間で比較可能な形）"""
+        strings = self._strings.values
+        return self.key(row) + (
+            strings[self._interface[row]],
+            self._protocols.values[self._protocol[row]],
+            self._metric[row],
+            self._distance[row],
+            self._types.values[self._type[row]],
+        )
+
+    def route(self, row: int) -> Dict[str, Any]:
+        """行を従来の辞書形式に変換"""
+        family = self._family[row]
+        if family == 4:
+            destination = int_to_ipv4(self._destination[row])
+        elif family == 6:
+            destination = str(ipaddress.IPv6Address(self._wide_destination[row]))
+        else:
+            destination = self._wide_destination[row]
+        strings = self._strings.values
+        return {
+            "destination": destination,
+            "prefix_length": self._prefix_length[row],
+            "next_hop": self._decode_next_hop(self._next_hop[row]),
+            "interface": strings[self._interface[row]],
+            "protocol": self._protocols.values[self._protocol[row]],
+            "metric": self._metric[row],
+            "administrative_distance": self._distance[row],
+            "type": self._types.values[self._type[row]],
+        }
+
+    def __len__(self) -> int:
+        return len(self._family)
+
+    def __getitem__(self, row: int) -> Dict[str, Any]:
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError("route index out of range")
+        return self.route(row)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for row in range(len(self)):
+            yield self.route(row)
+
+    def to_list(self) -> List[Dict[str, Any]]:
+        """JSONで返すためのルート辞書のリスト（レスポンスの直前でのみ使う）"""
+        return list(self)
+
+    def nbytes(self) -> int:
+        """列データのおおよそのメモリ使用量（バイト）"""
+        columns = (
+            self._family, self._destination, self._prefix_length, self._next_hop,
+            self._interface, self._protocol, self._metric, self._distance, self._type,
+        )
+        return sum(column.buffer_info()[1] * column.itemsize for column in columns)
+
+def json_default(value):
+    """json.dumps 用のフォールバック"""
+    if isinstance(value, RouteTable):
+        return value.to_list()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+# 大きなJSONレスポンスの高速化
+# FAST_JSON=1 でorjsonを使う（未インストールの場合は標準のjson）
+FAST_JSON = os.getenv("FAST_JSON", "0") == "1"
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))  # 0で圧縮しない
+GZIP_COMPRESS_LEVEL = int(os.getenv("GZIP_COMPRESS_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))
+
+if FAST_JSON and orjson is None:
+    logger.warning("FAST_JSON=1 but orjson is not installed, using the standard json module")
+
+def dumps_json(content) -> bytes:
+    """JSONにシリアライズ（FastAPIの既定と同じくコンパクトでASCIIエスケープなし）"""
+    if FAST_JSON and orjson is not None:
+        return orjson.dumps(content, default=json_default)
+    return json.dumps(content, default=json_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Accept-Encodingから使用する圧縮方式を選ぶ（br > gzip）"""
+    if not accept_encoding:
+        return None
+    accepted = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    if brotli is not None and accepted.get("br", 0) > 0:
+        return "br"
+    if accepted.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+def json_response(content, accept_encoding: Optional[str] = None, headers: Optional[Dict[str, str]] = None) -> Response:
+    """解析済みのデータをjsonable_encoderを通さずにシリアライズし、大きい場合は圧縮する
+
+    パーサーの出力は既にJSON互換の形なので、レスポンスモデルによる検証と変換を省略する。
+    """
+    body = dumps_json(content)
+    headers = dict(headers or {})
+    if COMPRESSION_MIN_SIZE and len(body) >= COMPRESSION_MIN_SIZE:
+        headers["Vary"] = "Accept-Encoding"
+        encoding = negotiate_encoding(accept_encoding)
+        if encoding == "br":
+            body = brotli.compress(body, quality=BROTLI_QUALITY)
+        elif encoding == "gzip":
+            body = gzip.compress(body, compresslevel=GZIP_COMPRESS_LEVEL)
+        if encoding:
+            headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type="application/json", headers=headers)
+
+# 最長一致検索用のルートインデックス
+class RouteLookupIndex:
+    """ルーティングテーブルの最長一致（LPM）検索インデックス
+
+    プレフィックス長ごとに ネットワークアドレス(整数) -> RouteTableの行番号 の辞書を持ち、
+    長いプレフィックスから順に引く（IPv4は最大33回、IPv6は最大129回の辞書参照）。
+    同じプレフィックスが複数ある場合は管理距離、メトリックの小さいルートを優先する。
+    truncated は元の出力が上限で打ち切られ、一部のルートしか含まないか。
+    """
+
+    def __init__(self, routes: Iterable[Dict[str, Any]] = (), truncated: bool = False):
+        self.routes = RouteTable.from_routes(routes)
+        self.truncated = truncated
+        self._tables: Dict[int, Dict[int, Dict[int, int]]] = {4: {}, 6: {}}
+        self._lengths: Dict[int, List[tuple]] = {4: [], 6: []}
+        self.size = 0
+        for row in range(len(self.routes)):
+            self._add(row)
+        self._build_lengths()
+
+    def _add(self, row: int):
+        destination = self.routes.destination_value(row)
+        if destination is None:
+            return
+        
+        version, value = destination
+        bits = 32 if version == 4 else 128
+        prefix_length = min(self.routes.prefix_length(row), bits)
+        network = value & (((1 << prefix_length) - 1) << (bits - prefix_length))
+        
+        table = self._tables[version].setdefault(prefix_length, {})
+        current = table.get(network)
+        if current is None:
+            self.size += 1
+        if current is None or self.routes.preference(row) < self.routes.preference(current):
+            table[network] = row
+
+    def _build_lengths(self):
+        for version, tables in self._tables.items():
+            bits = 32 if version == 4 else 128
+            self._lengths[version] = [
+                (length, ((1 << length) - 1) << (bits - length), tables[length])
+                for length in sorted(tables, reverse=True)
+            ]
+
+    def lookup(self, destination: str) -> Optional[Dict[str, Any]]:
+        """宛先に最長一致するルートを返す（不正なアドレスはValueError）"""
+        address = ipaddress.ip_address(destination)
+        value = int(address)
+        for _, mask, table in self._lengths[address.version]:
+            row = table.get(value & mask)
+            if row is not None:
+                return self.routes.route(row)
+        return None
+
+    def lookup_many(self, destinations: Iterable[str]) -> List[Dict[str, Any]]:
+        """複数の宛先をまとめて検索"""
+        results = []
+        for destination in destinations:
+            try:
+                results.append({"destination": destination, "route": self.lookup(destination)})
+            except ValueError:
+                results.append({"destination": destination, "route": None, "error": "invalid address"})
+        return results
+
+# APIエンドポイント
+async def teardown_router(ip: str):
+    """ルーターとのSSH接続を閉じ、IPごとに保持している状態を破棄（切断とセッション期限切れで共通）"""
+    await ssh_backend.close(ip)
+    forget_router_semaphore(ip)
+    probe_semaphores.pop(ip, None)
+    command_cache.invalidate(ip)
+    route_tracker.forget(ip)
+    topology_store.forget(ip)
+
+async def ssh_pool_maintenance():
+    """期限切れセッション、アイドル接続、切断済み接続を定期的に整理"""
+    while True:
+        await asyncio.sleep(SSH_POOL_MAINTENANCE_INTERVAL)
+        try:
+            for session in session_registry.expire():
+                logger.info(f"Session {session['session_id']} for {session['ip']} expired")
+                await teardown_router(session["ip"])
+            await ssh_backend.evict_idle()
+        except Exception as e:
+            logger.error(f"SSH pool maintenance error: {str(e)}")
+
+@app.get("/")
+async def root():
     return {"message": "Network Router API", "version": "2.0"}
 
 @app.post("/connect", response_model=ConnectionResponse)
@@ -582,21 +3626,16 @@ async def connect_router(router: RouterInfo):
     logger.info(f"Connection request: {router.ip}")
     
     # 実際のルーターへの接続を試みる
-    connection_result = connect_ssh(router)
+    connection_result = await ssh_backend.connect(router)
     
     if connection_result["success"]:
-        session_id = f"session-{random.randint(1000, 9999)}"
-        connected_routers[session_id] = {
-            "ip": router.ip,
-            "client": connection_result["client"],
-            "vendor": connection_result["vendor"],
-            "connected_at": datetime.now().isoformat()
-        }
+        session = session_registry.create(router.ip, connection_result["vendor"])
+        command_cache.invalidate(router.ip)
         
         return {
             "success": True,
             "message": connection_result["message"],
-            "session_id": session_id,
+            "session_id": session["session_id"],
             "vendor": connection_result["vendor"]
         }
     else:
@@ -608,655 +3647,862 @@ async def connect_router(router: RouterInfo):
             "vendor": VendorType.UNKNOWN
         }
 
+@app.delete("/session/{session_id}")
+async def disconnect_router(session_id: str):
+    """セッションを終了し、ルーターとのSSH接続を閉じる"""
+    session = session_registry.remove(session_id)
+    if session is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Session {session_id} not found")
+    
+    await teardown_router(session["ip"])
+    logger.info(f"Disconnected from {session['ip']} ({session_id})")
+    return {"success": True, "message": f"Disconnected from {session['ip']}"}
+
+@app.get("/pool/stats")
+async def get_pool_stats():
+    """SSHコネクションプールの統計情報を取得"""
+    return ssh_backend.stats()
+
+register_metric(Gauge(
+    "router_api_active_sessions", "Connected router sessions", lambda: len(session_registry)
+))
+register_metric(Gauge(
+    "router_api_ssh_executor_queue_depth", "SSH jobs waiting for an executor thread",
+    lambda: ssh_executor_queued
+))
+register_metric(Gauge(
+    "router_api_ssh_connections", "Open SSH connections",
+    lambda: sum(device["connections"] for device in ssh_backend.stats()["devices"].values())
+))
+register_metric(Gauge(
+    "router_api_cache_hit_ratio", "Share of cache lookups served without running a command",
+    lambda: command_cache.stats()["hit_ratio"]
+))
+register_metric(Gauge(
+    "router_api_cache_entries", "Entries in the device state cache", lambda: command_cache.stats()["entries"]
+))
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Prometheus形式のメトリクスを取得"""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+@app.get("/cache/stats")
+async def get_cache_stats():
+    """デバイス状態キャッシュの統計情報を取得"""
+    return command_cache.stats()
+
+@app.delete("/cache/{ip}")
+async def invalidate_cache(ip: str):
+    """ルーターのキャッシュを削除"""
+    return {"success": True, "invalidated": command_cache.invalidate(ip)}
+
+@app.delete("/vendor-cache/{ip}")
+async def invalidate_vendor_cache(ip: str):
+    """キャッシュされたベンダーを削除（次回接続時に再検出）"""
+    return {"success": True, "invalidated": vendor_cache.invalidate(ip)}
+
 @app.get("/router/{ip}/info")
-async def get_router_info(ip: str):
-    # セッションからクライアントとベンダーを取得
-    session_id = None
-    for sid, router in connected_routers.items():
-        if router["ip"] == ip:
-            session_id = sid
-            break
+async def get_router_info(ip: str, fresh: bool = False):
+    # セッションからベンダーを取得
+    session = session_registry.get_by_ip(ip)
     
-    if session_id:
-        client = connected_routers[session_id]["client"]
-        vendor = connected_routers[session_id]["vendor"]
+    if session:
+        vendor = session["vendor"]
         
-        # ベンダーに応じたコマンドを実行
-        command = VENDOR_COMMANDS.get(vendor, VENDOR_COMMANDS[VendorType.CISCO])["version"]
-        result = execute_ssh_command(client, command)
+        # ベンダーに応じたコマンドを実行し、出力からルーター情報を抽出
+        result = await fetch_parsed(ip, vendor, "version", extract_router_info, fresh)
         
         if result["success"]:
-            # コマンド出力からルーター情報を抽出
-            output = result["output"]
-            router_info = extract_router_info(output, vendor)
+            router_info = dict(result["data"])
             router_info["ip"] = ip
             
             return router_info
         else:
             logger.warning(f"Failed to get router info, using dummy data: {result}")
-            dummy_data = DUMMY_ROUTERS.get(vendor, DUMMY_ROUTERS[VendorType.CISCO])["info"]
-            dummy_data["ip"] = ip
-            return dummy_data
+            DUMMY_FALLBACKS.inc(endpoint="get_router_info", reason="command_failed")
+            return synthetic_router(ip, vendor).info
     else:
         # ルーターに接続されていない場合はダミーデータを返す
         logger.warning(f"Router {ip} not connected, using dummy data")
-        dummy_data = DUMMY_ROUTERS[VendorType.CISCO]["info"]
-        dummy_data["ip"] = ip
-        return dummy_data
-
-def extract_router_info(output, vendor):
-    """ベンダーに応じたルーター情報の抽出"""
-    if vendor == VendorType.CISCO:
-        model_match = re.search(r'[Cc]isco (.+?)(?:\s|\()', output)
-        version_match = re.search(r'Version ([^,]+)', output)
-        serial_match = re.search(r'[Ss]erial [Nn]umber\s*:\s*(\w+)', output)
-        uptime_match = re.search(r'uptime is (.+)', output)
-        
-        return {
-            "name": "Cisco Router",
-            "model": model_match.group(1) if model_match else "Unknown",
-            "serialNumber": serial_match.group(1) if serial_match else "Unknown",
-            "firmwareVersion": version_match.group(1) if version_match else "Unknown",
-            "uptime": uptime_match.group(1) if uptime_match else "Unknown"
-        }
-    elif vendor == VendorType.JUNIPER:
-        model_match = re.search(r'Model: (\w+)', output)
-        version_match = re.search(r'JUNOS ([^,\s]+)', output)
-        serial_match = re.search(r'Serial Number: (\w+)', output)
-        uptime_match = re.search(r'System booted: (.+)', output)
-        
-        return {
-            "name": "Juniper Router",
-            "model": model_match.group(1) if model_match else "Unknown",
-            "serialNumber": serial_match.group(1) if serial_match else "Unknown",
-            "firmwareVersion": version_match.group(1) if version_match else "Unknown",
-            "uptime": uptime_match.group(1) if uptime_match else "Unknown"
-        }
-    else:
-        # デフォルト情報
-        return {
-            "name": "Network Router",
-            "model": "Unknown",
-            "serialNumber": "Unknown",
-            "firmwareVersion": "Unknown",
-            "uptime": "Unknown"
-        }
+        DUMMY_FALLBACKS.inc(endpoint="get_router_info", reason="not_connected")
+        return synthetic_router(ip).info
 
 @app.get("/router/{ip}/interfaces")
-async def get_interfaces(ip: str):
-    # セッションからクライアントとベンダーを取得
-    session_id = None
-    for sid, router in connected_routers.items():
-        if router["ip"] == ip:
-            session_id = sid
-            break
+async def get_interfaces(ip: str, detail_mode: InterfaceDetailMode = INTERFACE_DETAIL_MODE, fresh: bool = False):
+    # セッションからベンダーを取得
+    session = session_registry.get_by_ip(ip)
     
-    if session_id:
-        client = connected_routers[session_id]["client"]
-        vendor = connected_routers[session_id]["vendor"]
-        
-        # ベンダーに応じたコマンドを実行
+    if session:
+        vendor = session["vendor"]
         command = VENDOR_COMMANDS.get(vendor, VENDOR_COMMANDS[VendorType.CISCO])["interfaces"]
-        result = execute_ssh_command(client, command)
         
-        if result["success"]:
+        async def load():
+            # ベンダーに応じたコマンドを実行
+            result = await fetch_command(ip, vendor, "interfaces", fresh=fresh)
+            if not result["success"]:
+                return {"success": False, "output": result["output"], "data": None, "truncated": False}
+            
             # コマンド出力からインターフェース情報を抽出
             interfaces = parse_interfaces(result["output"], vendor)
             
             # インターフェースの詳細情報を取得（オプション）
-            for name, interface in list(interfaces.items()):
-                try:
-                    detail_command = VENDOR_COMMANDS.get(vendor, VENDOR_COMMANDS[VendorType.CISCO])["interface_detail"].format(interface=name)
-                    detail_result = execute_ssh_command(client, detail_command)
-                    if detail_result["success"]:
-                        # スピード、デュプレックス、MAC、MTUなどを抽出
-                        extract_interface_details(detail_result["output"], interface, vendor)
-                except Exception as e:
-                    logger.error(f"Failed to get interface details for {name}: {str(e)}")
+            await collect_interface_details(ip, vendor, interfaces, detail_mode, fresh)
             
-            return interfaces
+            return {"success": True, "output": result["output"], "data": interfaces, "truncated": result["truncated"]}
+        
+        result = await command_cache.get_or_load(
+            (ip, command, f"interfaces:{detail_mode}"), CACHE_TTLS["interfaces"], load,
+            fresh=fresh, cache_if=is_cacheable
+        )
+        
+        if result["success"]:
+            return result["data"]
         else:
             logger.warning(f"Failed to get interfaces, using dummy data: {result}")
-            return DUMMY_ROUTERS.get(vendor, DUMMY_ROUTERS[VendorType.CISCO])["interfaces"]
+            DUMMY_FALLBACKS.inc(endpoint="get_interfaces", reason="command_failed")
+            return synthetic_router(ip, vendor).interfaces
     else:
         # ルーターに接続されていない場合はダミーデータを返す
         logger.warning(f"Router {ip} not connected, using dummy data")
-        return DUMMY_ROUTERS[VendorType.CISCO]["interfaces"]
+        DUMMY_FALLBACKS.inc(endpoint="get_interfaces", reason="not_connected")
+        return synthetic_router(ip).interfaces
 
-def extract_interface_details(output, interface, vendor):
-    """インターフェースの詳細情報を抽出"""
-    if vendor == VendorType.CISCO:
-        # スピード
-        speed_match = re.search(r'BW (\d+) Kbit/sec', output)
-        if speed_match:
-            speed = int(speed_match.group(1))
-            if speed >= 1000000:
-                interface["speed"] = f"{speed//1000000}Gb/s"
-            elif speed >= 1000:
-                interface["speed"] = f"{speed//1000}Mb/s"
-            else:
-                interface["speed"] = f"{speed}Kb/s"
-                
-        # デュプレックス
-        duplex_match = re.search(r'(Half|Full)-duplex', output)
-        if duplex_match:
-            interface["duplex"] = duplex_match.group(1).lower()
-            
-        # MAC
-        mac_match = re.search(r'address is ([0-9a-fA-F]{4}\.[0-9a-fA-F]{4}\.[0-9a-fA-F]{4})', output)
-        if mac_match:
-            interface["mac"] = mac_match.group(1)
-            
-        # MTU
-        mtu_match = re.search(r'MTU (\d+) bytes', output)
-        if mtu_match:
-            interface["mtu"] = int(mtu_match.group(1))
-            
-        # 説明
-        desc_match = re.search(r'Description: (.+)', output)
-        if desc_match:
-            interface["description"] = desc_match.group(1).strip()
-            
-    elif vendor == VendorType.JUNIPER:
-        # スピード
-        speed_match = re.search(r'Speed: (\d+)mbps', output)
-        if speed_match:
-            interface["speed"] = f"{speed_match.group(1)}Mb/s"
-            
-        # デュプレックス
-        duplex_match = re.search(r'Link-mode: (Half|Full)-duplex', output)
-        if duplex_match:
-            interface["duplex"] = duplex_match.group(1).lower()
-            
-        # MAC
-        mac_match = re.search(r'Current address: ([0-9a-fA-F:]{17})', output)
-        if mac_match:
-            interface["mac"] = mac_match.group(1)
-            
-        # MTU
-        mtu_match = re.search(r'MTU: (\d+)', output)
-        if mtu_match:
-            interface["mtu"] = int(mtu_match.group(1))
-            
-        # 説明
-        desc_match = re.search(r'Description: (.+)', output)
-        if desc_match:
-            interface["description"] = desc_match.group(1).strip()
+async def collect_interface_details(ip, vendor, interfaces, mode="parallel", fresh=False):
+    """インターフェースの詳細情報を取得して interfaces に反映"""
+    if mode == "batched":
+        # 全インターフェースの詳細を1コマンドで取得し、インターフェースごとに分割
+        result = await fetch_command(ip, vendor, "interface_detail_all", fresh=fresh)
+        if not result["success"]:
+            logger.error(f"Failed to get interface details for {ip}: {result['output']}")
+            return
+        blocks = split_interface_details(result["output"], vendor)
+        for name, interface in interfaces.items():
+            if name in blocks:
+                extract_interface_details(blocks[name], interface, vendor)
+        return
+    
+    async def fetch_detail(name, interface):
+        try:
+            detail_result = await fetch_command(ip, vendor, "interface_detail", fresh=fresh, interface=name)
+            if detail_result["success"]:
+                # スピード、デュプレックス、MAC、MTUなどを抽出
+                extract_interface_details(detail_result["output"], interface, vendor)
+        except Exception as e:
+            logger.error(f"Failed to get interface details for {name}: {str(e)}")
+    
+    if mode == "serial":
+        for name, interface in interfaces.items():
+            await fetch_detail(name, interface)
+        return
+    
+    # 同じSSH接続上の複数チャネルで同時に取得
+    semaphore = asyncio.Semaphore(INTERFACE_DETAIL_FANOUT)
+    
+    async def fetch_detail_bounded(name, interface):
+        async with semaphore:
+            await fetch_detail(name, interface)
+    
+    await asyncio.gather(*(fetch_detail_bounded(name, interface) for name, interface in interfaces.items()))
+
+# ルーティングテーブルの変更追跡
+ROUTE_HISTORY_DEPTH = int(os.getenv("ROUTE_HISTORY_DEPTH", "32"))
+
+class RouteTableTracker:
+    """ルーターごとに最後に解析したルーティングテーブルとバージョンを保持し、差分を返す
+
+    バージョンは変更時刻（ミリ秒）から作る単調増加の整数で、再起動後も古い値と衝突しない。
+    直近 ROUTE_HISTORY_DEPTH 回分の差分を保持する。
+    """
+
+    def __init__(self, depth: int = ROUTE_HISTORY_DEPTH):
+        self.depth = depth
+        self._tables: Dict[str, Dict[str, Any]] = {}
+
+    def _next_version(self, previous: int) -> int:
+        return max(previous + 1, int(time.time() * 1000))
+
+    def update(self, ip: str, routes: Union[RouteTable, Iterable[Dict[str, Any]]], digest: Optional[str]) -> int:
+        """最新のテーブルを記録してバージョンを返す（生の出力が同じなら差分計算を省略）"""
+        table = self._tables.get(ip)
+        if table is not None and digest is not None and table["digest"] == digest:
+            return table["version"]
+        
+        current = RouteTable.from_routes(routes)
+        if table is None:
+            self._tables[ip] = {
+                "version": self._next_version(0),
+                "digest": digest,
+                "routes": current,
+                "history": deque(maxlen=self.depth),
+            }
+            return self._tables[ip]["version"]
+        
+        # キー -> 行番号 の対応は差分計算の間だけ作る
+        previous = table["routes"]
+        old_rows = {previous.key(row): row for row in range(len(previous))}
+        new_rows = {current.key(row): row for row in range(len(current))}
+        old_keys = old_rows.keys()
+        new_keys = new_rows.keys()
+        diff = {
+            "added": {key: current.route(new_rows[key]) for key in new_keys - old_keys},
+            "removed": {key: previous.route(old_rows[key]) for key in old_keys - new_keys},
+            "modified": {
+                key: (previous.route(old_rows[key]), current.route(new_rows[key]))
+                for key in new_keys & old_keys
+                if previous.row(old_rows[key]) != current.row(new_rows[key])
+            },
+        }
+        table["digest"] = digest
+        table["routes"] = current
+        if not (diff["added"] or diff["removed"] or diff["modified"]):
+            return table["version"]
+        
+        table["history"].append((table["version"], diff))
+        table["version"] = self._next_version(table["version"])
+        return table["version"]
+
+    def version(self, ip: str) -> Optional[int]:
+        table = self._tables.get(ip)
+        return table["version"] if table else None
+
+    def changes(self, ip: str, since: int) -> Optional[Dict[str, Any]]:
+        """since 以降の差分を返す（履歴にないバージョンの場合はNone）"""
+        table = self._tables.get(ip)
+        if table is None:
+            return None
+        if since == table["version"]:
+            return {"version": since, "added": [], "removed": [], "modified": []}
+        
+        steps = list(table["history"])
+        start = next((i for i, (version, _) in enumerate(steps) if version == since), None)
+        if start is None:
+            return None
+        
+        # 各ステップの差分を合成して (変更前, 変更後) の正味の変化にする
+        net: Dict[tuple, list] = {}
+        for _, diff in steps[start:]:
+            for key, route in diff["added"].items():
+                net.setdefault(key, [None, None])[1] = route
+            for key, route in diff["removed"].items():
+                net.setdefault(key, [route, None])[1] = None
+            for key, (before, after) in diff["modified"].items():
+                net.setdefault(key, [before, None])[1] = after
+        
+        added, removed, modified = [], [], []
+        for before, after in net.values():
+            if before is None and after is not None:
+                added.append(after)
+            elif before is not None and after is None:
+                removed.append(before)
+            elif before != after:
+                modified.append({"before": before, "after": after})
+        return {"version": table["version"], "added": added, "removed": removed, "modified": modified}
+
+    def full(self, ip: str) -> Dict[str, Any]:
+        table = self._tables[ip]
+        return {"version": table["version"], "full": True, "routes": table["routes"].to_list()}
+
+    def forget(self, ip: str):
+        self._tables.pop(ip, None)
+
+route_tracker = RouteTableTracker()
+
+def route_etag(ip: str, version: int) -> str:
+    return f'"{ip}-{version}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
 
 @app.get("/router/{ip}/routing-table")
-async def get_routing_table(ip: str):
-    # セッションからクライアントとベンダーを取得
-    session_id = None
-    for sid, router in connected_routers.items():
-        if router["ip"] == ip:
-            session_id = sid
-            break
+async def get_routing_table(
+    ip: str,
+    fresh: bool = False,
+    if_none_match: Optional[str] = Header(None),
+    accept_encoding: Optional[str] = Header(None),
+):
+    """ルーティングテーブルを取得
+
+    ETagを返し、If-None-Matchが一致する場合は本文なしの304を返す。
+    """
+    # セッションからベンダーを取得
+    session = session_registry.get_by_ip(ip)
     
-    if session_id:
-        client = connected_routers[session_id]["client"]
-        vendor = connected_routers[session_id]["vendor"]
+    if session:
+        vendor = session["vendor"]
         
-        # ベンダーに応じたコマンドを実行
-        command = VENDOR_COMMANDS.get(vendor, VENDOR_COMMANDS[VendorType.CISCO])["routing_table"]
-        result = execute_ssh_command(client, command)
+        # ベンダーに応じたコマンドを実行し、出力からルーティングテーブルを抽出
+        result = await fetch_parsed(ip, vendor, "routing_table", parse_routes, fresh)
         
         if result["success"]:
-            # コマンド出力からルーティングテーブルを抽出
-            return parse_routes(result["output"], vendor)
+            etag = route_etag(ip, route_tracker.update(ip, result["data"], result["digest"]))
+            if etag_matches(if_none_match, etag):
+                return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+            headers = {"ETag": etag}
+            if result["truncated"]:
+                # 出力が上限で打ち切られ、一部のルートしか含まない
+                headers["X-Output-Truncated"] = "true"
+            return json_response(result["data"], accept_encoding, headers)
         else:
             logger.warning(f"Failed to get routing table, using dummy data: {result}")
-            return DUMMY_ROUTERS.get(vendor, DUMMY_ROUTERS[VendorType.CISCO])["routes"]
+            DUMMY_FALLBACKS.inc(endpoint="get_routing_table", reason="command_failed")
+            return json_response(synthetic_router(ip, vendor).routes, accept_encoding)
     else:
         # ルーターに接続されていない場合はダミーデータを返す
         logger.warning(f"Router {ip} not connected, using dummy data")
-        return DUMMY_ROUTERS[VendorType.CISCO]["routes"]
+        DUMMY_FALLBACKS.inc(endpoint="get_routing_table", reason="not_connected")
+        return json_response(synthetic_router(ip).routes, accept_encoding)
+
+@app.get("/router/{ip}/routing-table/changes")
+async def get_routing_table_changes(
+    ip: str,
+    since: Optional[int] = None,
+    fresh: bool = False,
+    accept_encoding: Optional[str] = Header(None),
+):
+    """指定バージョン以降に追加・削除・変更されたルートのみを取得
+
+    since が省略された場合や履歴にない場合は full=True で全ルートを返す。
+    """
+    session = session_registry.get_by_ip(ip)
+    if not session:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Router {ip} is not connected")
+    
+    result = await fetch_parsed(ip, session["vendor"], "routing_table", parse_routes, fresh)
+    if not result["success"]:
+        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=result["output"])
+    route_tracker.update(ip, result["data"], result["digest"])
+    
+    changes = route_tracker.changes(ip, since) if since is not None else None
+    if changes is None:
+        return json_response(route_tracker.full(ip), accept_encoding)
+    return json_response({**changes, "full": False}, accept_encoding)
+
+async def get_route_index(ip: str, fresh: bool = False) -> RouteLookupIndex:
+    """ルーターのルーティングテーブルからLPMインデックスを取得（TTLの間キャッシュ）"""
+    session = session_registry.get_by_ip(ip)
+    if not session:
+        logger.warning(f"Router {ip} not connected, using dummy data")
+        DUMMY_FALLBACKS.inc(endpoint="get_route_index", reason="not_connected")
+        return synthetic_router(ip).route_index
+    vendor = session["vendor"]
+    command = VENDOR_COMMANDS.get(vendor, VENDOR_COMMANDS[VendorType.CISCO])["routing_table"]
+    
+    async def load():
+        result = await fetch_parsed(ip, vendor, "routing_table", parse_routes, fresh)
+        if not result["success"]:
+            logger.warning(f"Failed to get routing table, using dummy data: {result}")
+            DUMMY_FALLBACKS.inc(endpoint="get_route_index", reason="command_failed")
+            return None
+        return RouteLookupIndex(result["data"], truncated=result["truncated"])
+    
+    index = await command_cache.get_or_load(
+        (ip, command, "lpm"), CACHE_TTLS["routing_table"], load,
+        fresh=fresh, cache_if=lambda index: index is not None and not index.truncated
+    )
+    if index is None:
+        return synthetic_router(ip, vendor).route_index
+    return index
+
+@app.get("/router/{ip}/lookup")
+async def lookup_route(ip: str, dst: str, fresh: bool = False):
+    """宛先に最長一致するルートを検索"""
+    index = await get_route_index(ip, fresh)
+    try:
+        route = index.lookup(dst)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid destination address: {dst}")
+    return {"destination": dst, "route": route, "truncated": index.truncated}
+
+@app.post("/router/{ip}/lookup")
+async def lookup_routes(ip: str, request: RouteLookupRequest, fresh: bool = False, accept_encoding: Optional[str] = Header(None)):
+    """複数の宛先に最長一致するルートをまとめて検索"""
+    index = await get_route_index(ip, fresh)
+    return json_response(
+        {"routes": index.size, "truncated": index.truncated, "results": index.lookup_many(request.destinations)},
+        accept_encoding
+    )
+
+# ping/トレースルートの宛先はデバイスのコマンドに埋め込むため、アドレスとホスト名に使う文字のみ許可する
+PROBE_TARGET_PATTERN = re.compile(r"[A-Za-z0-9][A-Za-z0-9.:_-]{0,252}")
+
+def validate_probe_target(target) -> str:
+    """ping/トレースルートの宛先を検証（不正な場合はValueError）"""
+    if not isinstance(target, str) or not target:
+        raise ValueError("target is required")
+    if not PROBE_TARGET_PATTERN.fullmatch(target):
+        raise ValueError(f"Invalid target: {target!r}")
+    return target
+
+PING_MAX_COUNT = int(os.getenv("PING_MAX_COUNT", "100"))
+
+def validate_ping_count(count) -> int:
+    """pingの送信回数を検証（1〜PING_MAX_COUNTの整数以外はValueError）"""
+    if isinstance(count, bool) or not isinstance(count, int) or not 1 <= count <= PING_MAX_COUNT:
+        raise ValueError(f"count must be an integer between 1 and {PING_MAX_COUNT}")
+    return count
 
 @app.get("/router/{ip}/traceroute")
 async def traceroute(ip: str, target: str):
-    # IPアドレスの形式チェック
     try:
-        ipaddress.ip_address(target)
-    except ValueError:
-        # ホスト名の場合はそのまま通す
-        pass
+        validate_probe_target(target)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     
-    # セッションからクライアントとベンダーを取得
-    session_id = None
-    for sid, router in connected_routers.items():
-        if router["ip"] == ip:
-            session_id = sid
-            break
+    # セッションからベンダーを取得
+    session = session_registry.get_by_ip(ip)
     
-    if session_id:
-        client = connected_routers[session_id]["client"]
-        vendor = connected_routers[session_id]["vendor"]
+    if session:
+        vendor = session["vendor"]
         
         # ベンダーに応じたコマンドを実行
         command = VENDOR_COMMANDS.get(vendor, VENDOR_COMMANDS[VendorType.CISCO])["traceroute"].format(target=target)
-        result = execute_ssh_command(client, command, timeout=60)  # トレースルートは時間がかかる可能性がある
+        result = await ssh_backend.execute(ip, command, timeout=60)  # トレースルートは時間がかかる可能性がある
         
         if result["success"]:
             # コマンド出力からトレースルート結果を抽出
             return parse_traceroute(result["output"], vendor)
         else:
             logger.warning(f"Failed to traceroute {target}, using dummy data: {result}")
-            return generate_dummy_traceroute(target)
+            DUMMY_FALLBACKS.inc(endpoint="traceroute", reason="command_failed")
+            return synthetic_router(ip, vendor).traceroute(target)
     else:
         # ルーターに接続されていない場合はダミーデータを返す
         logger.warning(f"Router {ip} not connected, using dummy data")
-        return generate_dummy_traceroute(target)
-
-def parse_traceroute(output, vendor):
-    """トレースルート結果を解析"""
-    hops = []
-    
-    if vendor == VendorType.CISCO:
-        lines = output.strip().split('\n')
-        for line in lines:
-            # ヘッダー行をスキップ
-            if "Tracing the route" in line or not line.strip():
-                continue
-            
-            # ホップ番号とIPアドレスを抽出
-            hop_match = re.match(r'^\s*(\d+)\s+(?:\*\s+\*\s+\*|([^\s]+)(?:\s+\(([^\)]+)\))?\s+(\d+(?:\.\d+)?)?\s*ms)', line)
-            if hop_match:
-                hop_num = int(hop_match.group(1))
-                
-                # タイムアウトの場合
-                if "*" in line and not hop_match.group(2):
-                    hops.append({"hop": hop_num, "ip": "*", "hostname": None, "rtt": None, "status": "timeout"})
-                else:
-                    # IP or ホスト名、応答時間
-                    ip_or_host = hop_match.group(2)
-                    ip = hop_match.group(3) if hop_match.group(3) else ip_or_host
-                    hostname = ip_or_host if hop_match.group(3) else None
-                    rtt = float(hop_match.group(4)) if hop_match.group(4) else None
-                    
-                    hops.append({
-                        "hop": hop_num, 
-                        "ip": ip, 
-                        "hostname": hostname, 
-                        "rtt": rtt,
-                        "status": "success"
-                    })
-    else:
-        # 他のベンダーの場合も同様に解析（単純化のためCiscoと同じ処理を使用）
-        return parse_traceroute(output, VendorType.CISCO)
-    
-    return hops
-
-def generate_dummy_traceroute(target):
-    """ダミーのトレースルート結果を生成"""
-    hops = []
-    
-    # PC1 to PC2 route
-    if target == "192.168.3.10":
-        hops.append({"hop": 1, "ip": "192.168.1.1", "hostname": "R1", "rtt": 0.5, "status": "success"})
-        hops.append({"hop": 2, "ip": "192.168.2.2", "hostname": "R2", "rtt": 1.2, "status": "success"})
-        hops.append({"hop": 3, "ip": "192.168.3.10", "hostname": "PC2", "rtt": 2.1, "status": "success"})
-    # PC2 to PC1 route
-    elif target == "192.168.1.10":
-        hops.append({"hop": 1, "ip": "192.168.3.1", "hostname": "R2", "rtt": 0.5, "status": "success"})
-        hops.append({"hop": 2, "ip": "192.168.2.1", "hostname": "R1", "rtt": 1.2, "status": "success"})
-        hops.append({"hop": 3, "ip": "192.168.1.10", "hostname": "PC1", "rtt": 2.1, "status": "success"})
-    # Default route (to internet)
-    else:
-        hops.append({"hop": 1, "ip": "192.168.1.1", "hostname": "R1", "rtt": 0.5, "status": "success"})
-        hops.append({"hop": 2, "ip": "192.168.2.2", "hostname": "R2", "rtt": 1.2, "status": "success"})
-        hops.append({"hop": 3, "ip": "8.8.8.8", "hostname": None, "rtt": 15.3, "status": "success"})
-        hops.append({"hop": 4, "ip": target, "hostname": None, "rtt": 20.1, "status": "success"})
-    
-    return hops
+        DUMMY_FALLBACKS.inc(endpoint="traceroute", reason="not_connected")
+        return synthetic_router(ip).traceroute(target)
 
 @app.get("/router/{ip}/ping")
 async def ping(ip: str, target: str, count: int = 5):
-    # IPアドレスの形式チェック
     try:
-        ipaddress.ip_address(target)
-    except ValueError:
-        # ホスト名の場合はそのまま通す
-        pass
+        validate_probe_target(target)
+        validate_ping_count(count)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     
-    # セッションからクライアントとベンダーを取得
-    session_id = None
-    for sid, router in connected_routers.items():
-        if router["ip"] == ip:
-            session_id = sid
-            break
+    # セッションからベンダーを取得
+    session = session_registry.get_by_ip(ip)
     
-    if session_id:
-        client = connected_routers[session_id]["client"]
-        vendor = connected_routers[session_id]["vendor"]
+    if session:
+        vendor = session["vendor"]
         
         # ベンダーに応じたコマンドを実行
-        base_command = VENDOR_COMMANDS.get(vendor, VENDOR_COMMANDS[VendorType.CISCO])["ping"]
-        command = base_command.format(target=target)
-        
-        # Ciscoの場合、カウント指定を追加
-        if vendor == VendorType.CISCO:
-            command = f"{command} repeat {count}"
-            
-        result = execute_ssh_command(client, command)
+        command = build_ping_command(vendor, target, count)
+        result = await ssh_backend.execute(ip, command)
         
         if result["success"]:
             # コマンド出力からping結果を抽出
             return parse_ping_result(result["output"], vendor)
         else:
             logger.warning(f"Failed to ping {target}, using dummy data: {result}")
-            return generate_dummy_ping_result(target)
+            DUMMY_FALLBACKS.inc(endpoint="ping", reason="command_failed")
+            return synthetic_router(ip, vendor).ping(target, count)
     else:
         # ルーターに接続されていない場合はダミーデータを返す
         logger.warning(f"Router {ip} not connected, using dummy data")
-        return generate_dummy_ping_result(target)
+        DUMMY_FALLBACKS.inc(endpoint="ping", reason="not_connected")
+        return synthetic_router(ip).ping(target, count)
 
-def parse_ping_result(output, vendor):
-    """Ping結果を解析"""
-    if vendor == VendorType.CISCO:
-        # 成功率を抽出
-        success_match = re.search(r'Success rate is (\d+) percent \((\d+)/(\d+)\)', output)
-        if success_match:
-            success_rate = int(success_match.group(1))
-            received = int(success_match.group(2))
-            sent = int(success_match.group(3))
-            
-            # RTT値を抽出
-            rtt_match = re.search(r'min/avg/max = (\d+\.\d+)/(\d+\.\d+)/(\d+\.\d+)', output)
-            
-            if rtt_match:
-                return {
-                    "success": success_rate > 0,
-                    "packet_loss": 100 - success_rate,
-                    "rtt_min": float(rtt_match.group(1)),
-                    "rtt_avg": float(rtt_match.group(2)),
-                    "rtt_max": float(rtt_match.group(3)),
-                    "packets_sent": sent,
-                    "packets_received": received
-                }
-            else:
-                return {
-                    "success": success_rate > 0,
-                    "packet_loss": 100 - success_rate,
-                    "rtt_min": None,
-                    "rtt_avg": None,
-                    "rtt_max": None,
-                    "packets_sent": sent,
-                    "packets_received": received
-                }
-        else:
-            # パターンにマッチしない場合
-            return {
-                "success": False,
-                "packet_loss": 100,
-                "rtt_min": None,
-                "rtt_avg": None,
-                "rtt_max": None,
-                "packets_sent": 5,
-                "packets_received": 0
-            }
-    else:
-        # 他のベンダーについても同様に解析
-        return parse_ping_result(output, VendorType.CISCO)
+def build_ping_command(vendor, target, count=5):
+    """ベンダーに応じたpingコマンドを組み立てる"""
+    return VENDOR_COMMANDS.get(vendor, VENDOR_COMMANDS[VendorType.CISCO])["ping"].format(target=target, count=count)
 
-def generate_dummy_ping_result(target):
-    """ダミーのping結果を生成"""
-    return {
-        "success": True,
-        "packet_loss": 0,
-        "rtt_min": 1.1,
-        "rtt_avg": 2.3,
-        "rtt_max": 3.7,
-        "packets_sent": 5,
-        "packets_received": 5
-    }
+# 複数宛先へのping/トレースルート
+PROBE_BATCH_MAX_TARGETS = int(os.getenv("PROBE_BATCH_MAX_TARGETS", "1000"))
+# 1台のルーターで同時に使うプローブ用チャネル数（全バッチで共有）
+# SSH_PER_ROUTER_CONCURRENCY より小さくして、他のリクエスト用のチャネルを残す
+PROBE_CHANNELS_PER_DEVICE = int(os.getenv("PROBE_CHANNELS_PER_DEVICE", str(max(1, SSH_PER_ROUTER_CONCURRENCY - 1))))
+PROBE_TIMEOUTS = {"ping": 30, "traceroute": 60}
 
-@app.get("/router/{ip}/neighbors")
-async def get_neighbors(ip: str):
-    """隣接デバイス情報を取得"""
-    # セッションからクライアントとベンダーを取得
-    session_id = None
-    for sid, router in connected_routers.items():
-        if router["ip"] == ip:
-            session_id = sid
-            break
+probe_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+def get_probe_semaphore(ip: str) -> asyncio.Semaphore:
+    """ルーターごとのプローブ用チャネル数を制限するセマフォを取得"""
+    semaphore = probe_semaphores.get(ip)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(PROBE_CHANNELS_PER_DEVICE)
+        probe_semaphores[ip] = semaphore
+    return semaphore
+
+async def run_probe(ip: str, vendor, probe: str, target: str, count: int) -> Dict[str, Any]:
+    """1つの宛先に対してpingまたはトレースルートを実行"""
+    try:
+        validate_probe_target(target)
+    except ValueError as e:
+        return {"target": target, "probe": probe, "success": False, "error": str(e)}
     
-    if session_id:
-        client = connected_routers[session_id]["client"]
-        vendor = connected_routers[session_id]["vendor"]
-        
-        # ベンダーに応じたコマンドを実行
-        command = VENDOR_COMMANDS.get(vendor, VENDOR_COMMANDS[VendorType.CISCO])["neighbors"]
-        result = execute_ssh_command(client, command)
-        
-        if result["success"]:
-            # コマンド出力から隣接デバイス情報を抽出
-            return parse_neighbors(result["output"], vendor)
-        else:
-            logger.warning(f"Failed to get neighbors, using dummy data: {result}")
-            return generate_dummy_neighbors()
+    if probe == "ping":
+        command = build_ping_command(vendor, target, count)
     else:
-        # ルーターに接続されていない場合はダミーデータを返す
-        logger.warning(f"Router {ip} not connected, using dummy data")
-        return generate_dummy_neighbors()
-
-def parse_neighbors(output, vendor):
-    """隣接デバイス情報を解析"""
-    neighbors = []
-    
-    if vendor == VendorType.CISCO:
-        # CDPネイバー情報の解析
-        device_pattern = re.compile(r'Device ID: (.+?)(?:\r|\n)')
-        ip_pattern = re.compile(r'IP address: (\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})')
-        platform_pattern = re.compile(r'Platform: (.+?),')
-        interface_pattern = re.compile(r'Interface: (.+?),[\s\r\n]+Port ID')
-        port_pattern = re.compile(r'Port ID \(outgoing port\): (.+?)(?:\r|\n)')
-        
-        # デバイスごとのブロックを処理
-        device_blocks = re.split(r'-{4,}', output)
-        for block in device_blocks:
-            if not block.strip():
-                continue
-                
-            device_match = device_pattern.search(block)
-            ip_match = ip_pattern.search(block)
-            platform_match = platform_pattern.search(block)
-            interface_match = interface_pattern.search(block)
-            port_match = port_pattern.search(block)
-            
-            if device_match:
-                neighbor = {
-                    "device_id": device_match.group(1).strip(),
-                    "ip_address": ip_match.group(1) if ip_match else None,
-                    "platform": platform_match.group(1).strip() if platform_match else "Unknown",
-                    "local_interface": interface_match.group(1).strip() if interface_match else "Unknown",
-                    "remote_interface": port_match.group(1).strip() if port_match else "Unknown"
-                }
-                neighbors.append(neighbor)
+        command = VENDOR_COMMANDS.get(vendor, VENDOR_COMMANDS[VendorType.CISCO])["traceroute"].format(target=target)
     
-    elif vendor == VendorType.JUNIPER:
-        # LLDPネイバー情報の解析
-        lines = output.split('\n')
-        current_neighbor = {}
-        
-        for line in lines:
-            line = line.strip()
-            if "Neighbor" in line and "System" in line:
-                if current_neighbor and "device_id" in current_neighbor:
-                    neighbors.append(current_neighbor)
-                current_neighbor = {}
-                
-            if "ChassisId" in line:
-                chassis_match = re.search(r'ChassisId\s+(.+)$', line)
-                if chassis_match:
-                    current_neighbor["device_id"] = chassis_match.group(1).strip()
-                    
-            if "SysName" in line:
-                name_match = re.search(r'SysName\s+(.+)$', line)
-                if name_match:
-                    current_neighbor["device_id"] = name_match.group(1).strip()
-                    
-            if "MgmtAddr" in line:
-                ip_match = re.search(r'MgmtAddr\s+(\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})', line)
-                if ip_match:
-                    current_neighbor["ip_address"] = ip_match.group(1)
-                    
-            if "Local interface" in line:
-                if_match = re.search(r'Local interface\s+: (.+?),', line)
-                if if_match:
-                    current_neighbor["local_interface"] = if_match.group(1).strip()
-                    
-            if "Remote interface" in line:
-                remote_match = re.search(r'Remote interface\s+: (.+?)(?:\s|$)', line)
-                if remote_match:
-                    current_neighbor["remote_interface"] = remote_match.group(1).strip()
-        
-        # 最後のネイバーを追加
-        if current_neighbor and "device_id" in current_neighbor:
-            neighbors.append(current_neighbor)
-    
-    return neighbors
-
-def generate_dummy_neighbors():
-    """ダミーの隣接デバイス情報を生成"""
-    return [
-        {
-            "device_id": "Switch1",
-            "ip_address": "192.168.1.2",
-            "platform": "Cisco WS-C2960X",
-            "local_interface": "GigabitEthernet0/0",
-            "remote_interface": "GigabitEthernet1/0/24"
-        },
-        {
-            "device_id": "Router2",
-            "ip_address": "10.0.0.2",
-            "platform": "Cisco C891F",
-            "local_interface": "GigabitEthernet0/1",
-            "remote_interface": "GigabitEthernet0/0"
-        }
-    ]
+    async with get_probe_semaphore(ip):
+        started = time.monotonic()
+        result = await ssh_backend.execute(ip, command, timeout=PROBE_TIMEOUTS[probe])
+        elapsed = round(time.monotonic() - started, 3)
+    
+    if not result["success"]:
+        return {"target": target, "probe": probe, "success": False, "error": result["output"], "elapsed": elapsed}
+    if probe == "ping":
+        data = parse_ping_result(result["output"], vendor)
+        success = data["success"]
+    else:
+        data = parse_traceroute(result["output"], vendor)
+        success = bool(data) and data[-1]["status"] == "success"
+    return {"target": target, "probe": probe, "success": success, "result": data, "elapsed": elapsed}
 
-@app.get("/router/{ip}/diagnostics")
-async def run_diagnostics(ip: str):
-    """ネットワーク診断を実行"""
-    # セッションからクライアントとベンダーを取得
-    session_id = None
-    for sid, router in connected_routers.items():
-        if router["ip"] == ip:
-            session_id = sid
-            break
+@app.post("/router/{ip}/probe")
+async def probe_targets(ip: str, request: ProbeBatchRequest):
+    """複数の宛先へのping/トレースルートを同じセッションの別チャネルで並行実行し、完了した順にNDJSONで返す
+
+    同時に使うチャネル数はルーターごとに PROBE_CHANNELS_PER_DEVICE まで。
+    各行の result は ping なら PingResult、traceroute なら TraceRouteHop のリスト。
+    """
+    session = session_registry.get_by_ip(ip)
+    if not session:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Router {ip} is not connected")
+    vendor = session["vendor"]
+    
+    try:
+        validate_ping_count(request.count)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    targets = list(dict.fromkeys(request.targets))
+    probes = list(dict.fromkeys(request.probes))
+    if len(targets) * len(probes) > PROBE_BATCH_MAX_TARGETS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Too many probes (max {PROBE_BATCH_MAX_TARGETS})"
+        )
+    logger.info(f"Probing {len(targets)} targets from {ip} ({', '.join(probes)})")
     
-    if session_id:
-        client = connected_routers[session_id]["client"]
-        vendor = connected_routers[session_id]["vendor"]
-        
-        # 各種ネットワーク情報を収集
-        issues = []
-        
-        # 1. インターフェース情報を取得
-        interfaces_command = VENDOR_COMMANDS.get(vendor, VENDOR_COMMANDS[VendorType.CISCO])["interfaces"]
-        interfaces_result = execute_ssh_command(client, interfaces_command)
-        
-        if interfaces_result["success"]:
-            interfaces = parse_interfaces(interfaces_result["output"], vendor)
+    async def stream():
+        started = time.monotonic()
+        succeeded = 0
+        tasks = [
+            asyncio.ensure_future(run_probe(ip, vendor, probe, target, request.count))
+            for target in targets for probe in probes
+        ]
+        try:
+            for next_result in asyncio.as_completed(tasks):
+                result = await next_result
+                succeeded += result["success"]
+                yield dumps_json(result) + b"\n"
             
-            # インターフェース状態をチェック
-            for name, interface in interfaces.items():
-                # ダウンしているインターフェースをチェック
-                if interface["status"] == "down" and interface["protocol"] == "down":
-                    issues.append({
-                        "type": "interface_down",
-                        "severity": "high",
-                        "description": f"インターフェース {name} がダウンしています",
-                        "recommendation": "物理接続を確認するか、'no shutdown'コマンドでインターフェースを有効にしてください",
-                        "affected_component": name
-                    })
-                elif interface["status"] == "administratively down":
-                    issues.append({
-                        "type": "interface_admin_down",
-                        "severity": "medium",
-                        "description": f"インターフェース {name} が管理上ダウンしています",
-                        "recommendation": "'no shutdown'コマンドでインターフェースを有効にしてください",
-                        "affected_component": name
-                    })
+            yield dumps_json({
+                "summary": {
+                    "probes": len(tasks),
+                    "succeeded": succeeded,
+                    "failed": len(tasks) - succeeded,
+                    "elapsed": round(time.monotonic() - started, 3),
+                }
+            }) + b"\n"
+        finally:
+            # クライアントが切断した場合は残りのプローブを中止
+            for task in tasks:
+                task.cancel()
+    
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+@app.get("/router/{ip}/neighbors")
+async def get_neighbors(ip: str, fresh: bool = False):
+    """隣接デバイス情報を取得"""
+    # セッションからベンダーを取得
+    session = session_registry.get_by_ip(ip)
+    
+    if session:
+        vendor = session["vendor"]
         
-        # 2. ルーティングテーブルを確認
-        routing_command = VENDOR_COMMANDS.get(vendor, VENDOR_COMMANDS[VendorType.CISCO])["routing_table"]
-        routing_result = execute_ssh_command(client, routing_command)
+        # ベンダーに応じたコマンドを実行し、出力から隣接デバイス情報を抽出
+        result = await fetch_parsed(ip, vendor, "neighbors", parse_neighbors, fresh)
         
-        if routing_result["success"]:
-            routes = parse_routes(routing_result["output"], vendor)
-            
-            # デフォルトルートをチェック
-            has_default_route = any(route["destination"] == "0.0.0.0" and route["prefix_length"] == 0 for route in routes)
-            
-            if not has_default_route:
+        if result["success"]:
+            record_neighbors(ip, vendor, result)
+            return result["data"]
+        else:
+            logger.warning(f"Failed to get neighbors, using dummy data: {result}")
+            DUMMY_FALLBACKS.inc(endpoint="get_neighbors", reason="command_failed")
+            return synthetic_router(ip, vendor).neighbors
+    else:
+        # ルーターに接続されていない場合はダミーデータを返す
+        logger.warning(f"Router {ip} not connected, using dummy data")
+        DUMMY_FALLBACKS.inc(endpoint="get_neighbors", reason="not_connected")
+        return synthetic_router(ip).neighbors
+
+# 診断エンジン
+# 診断データ名 -> (コマンド種別, パーサー)。パーサーがNoneの場合は生の出力を使う
+DIAGNOSTIC_SOURCES = {
+    "interfaces": ("interfaces", parse_interfaces),
+    "routes": ("routing_table", parse_routes),
+    "config": ("config", None),
+}
+
+# 有効にするチェック名（カンマ区切り）。空の場合は既定で有効なチェックをすべて実行
+DIAGNOSTIC_CHECKS_ENABLED = [name.strip() for name in os.getenv("DIAGNOSTIC_CHECKS", "").split(",") if name.strip()]
+
+class DiagnosticCheck(abc.ABC):
+    """診断チェックの基底クラス
+
+    requires に必要な診断データ名を宣言し、run で問題のリストを返す。
+    """
+    name = "base"
+    requires: tuple = ()
+    enabled_by_default = True
+
+    @abc.abstractmethod
+    def run(self, data: Dict[str, Any], vendor: VendorType) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+DIAGNOSTIC_CHECKS: Dict[str, DiagnosticCheck] = {}
+
+def register_check(cls):
+    """診断チェックを登録するデコレーター"""
+    DIAGNOSTIC_CHECKS[cls.name] = cls()
+    return cls
+
+@register_check
+class InterfaceStatusCheck(DiagnosticCheck):
+    """ダウンしているインターフェースを検出"""
+    name = "interface_status"
+    requires = ("interfaces",)
+
+    def run(self, data, vendor):
+        issues = []
+        for name, interface in data["interfaces"].items():
+            # ダウンしているインターフェースをチェック
+            if interface["status"] == "down" and interface["protocol"] == "down":
                 issues.append({
-                    "type": "missing_default_route",
+                    "type": "interface_down",
                     "severity": "high",
-                    "description": "デフォルトルートが設定されていません",
-                    "recommendation": "'ip route 0.0.0.0 0.0.0.0 [next-hop]'コマンドでデフォルトルートを設定してください",
-                    "affected_component": "routing"
+                    "description": f"インターフェース {name} がダウンしています",
+                    "recommendation": "物理接続を確認するか、'no shutdown'コマンドでインターフェースを有効にしてください",
+                    "affected_component": name
                 })
-                
-            # ルートの重複をチェック
-            route_networks = {}
-            for route in routes:
-                key = f"{route['destination']}/{route['prefix_length']}"
-                if key in route_networks and route["protocol"] != route_networks[key]:
-                    issues.append({
-                        "type": "duplicate_routes",
-                        "severity": "medium",
-                        "description": f"ネットワーク {key} に対して重複するルートがあります",
-                        "recommendation": "不要なルートを削除するか、管理ディスタンスを調整してください",
-                        "affected_component": "routing",
-                        "details": {
-                            "network": key,
-                            "protocols": [route_networks[key], route["protocol"]]
-                        }
-                    })
-                route_networks[key] = route["protocol"]
+            elif interface["status"] == "administratively down":
+                issues.append({
+                    "type": "interface_admin_down",
+                    "severity": "medium",
+                    "description": f"インターフェース {name} が管理上ダウンしています",
+                    "recommendation": "'no shutdown'コマンドでインターフェースを有効にしてください",
+                    "affected_component": name
+                })
+        return issues
+
+@register_check
+class DefaultRouteCheck(DiagnosticCheck):
+    """デフォルトルートの有無を確認"""
+    name = "default_route"
+    requires = ("routes",)
+
+    def run(self, data, vendor):
+        if any(route["destination"] == "0.0.0.0" and route["prefix_length"] == 0 for route in data["routes"]):
+            return []
+        return [{
+            "type": "missing_default_route",
+            "severity": "high",
+            "description": "デフォルトルートが設定されていません",
+            "recommendation": "'ip route 0.0.0.0 0.0.0.0 [next-hop]'コマンドでデフォルトルートを設定してください",
+            "affected_component": "routing"
+        }]
+
+@register_check
+class DuplicateRouteCheck(DiagnosticCheck):
+    """同じ宛先に異なるプロトコルのルートがないか確認"""
+    name = "duplicate_routes"
+    requires = ("routes",)
+
+    def run(self, data, vendor):
+        issues = []
+        route_networks = {}
+        for route in data["routes"]:
+            key = f"{route['destination']}/{route['prefix_length']}"
+            if key in route_networks and route["protocol"] != route_networks[key]:
+                issues.append({
+                    "type": "duplicate_routes",
+                    "severity": "medium",
+                    "description": f"ネットワーク {key} に対して重複するルートがあります",
+                    "recommendation": "不要なルートを削除するか、管理ディスタンスを調整してください",
+                    "affected_component": "routing",
+                    "details": {
+                        "network": key,
+                        "protocols": [route_networks[key], route["protocol"]]
+                    }
+                })
+            route_networks[key] = route["protocol"]
+        return issues
+
+CONFIG_INTERFACE_PATTERN = re.compile(r'^interface (\S+)')
+CONFIG_IP_ADDRESS_PATTERN = re.compile(r'^\s+ip address (\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})')
+
+@register_check
+class InterfaceConfigCheck(DiagnosticCheck):
+    """設定上のIPアドレスと実際のインターフェースのIPアドレスの不一致を検出
+
+    running-configの取得は重いため既定では無効（DIAGNOSTIC_CHECKS で有効化）。
+    """
+    name = "interface_config"
+    requires = ("interfaces", "config")
+    enabled_by_default = False
+
+    def run(self, data, vendor):
+        if vendor not in (VendorType.CISCO, VendorType.HP, VendorType.HUAWEI, VendorType.UNKNOWN):
+            # "interface" ブロック形式の設定のみ対応
+            return []
         
-        # 3. インターフェースと実際の構成の整合性をチェック
-        config_command = VENDOR_COMMANDS.get(vendor, VENDOR_COMMANDS[VendorType.CISCO])["config"]
-        config_result = execute_ssh_command(client, config_command)
+        configured = {}
+        current = None
+        for line in iter_lines(data["config"]):
+            interface_match = CONFIG_INTERFACE_PATTERN.match(line)
+            if interface_match:
+                current = interface_match.group(1)
+                continue
+            if current and line and not line[0].isspace():
+                current = None
+            if current:
+                ip_match = CONFIG_IP_ADDRESS_PATTERN.match(line)
+                if ip_match:
+                    configured[current] = ip_match.group(1)
         
-        if config_result["success"]:
-            # 設定がIPとMTUの不一致などをチェック
-            # この例では簡略化のため省略
-            pass
+        issues = []
+        for name, configured_ip in configured.items():
+            interface = data["interfaces"].get(name)
+            if interface and interface["ip"] != configured_ip:
+                issues.append({
+                    "type": "interface_ip_mismatch",
+                    "severity": "medium",
+                    "description": f"インターフェース {name} のIPアドレスが設定と一致しません",
+                    "recommendation": "インターフェースの設定と状態を確認してください",
+                    "affected_component": name,
+                    "details": {"configured": configured_ip, "actual": interface["ip"]}
+                })
+        return issues
+
+def select_checks(names: Optional[List[str]] = None) -> List[DiagnosticCheck]:
+    """実行するチェックを選択（指定がなければ設定または既定値に従う）"""
+    names = names or DIAGNOSTIC_CHECKS_ENABLED
+    if names:
+        unknown = [name for name in names if name not in DIAGNOSTIC_CHECKS]
+        if unknown:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unknown diagnostic checks: {', '.join(unknown)}")
+        return [DIAGNOSTIC_CHECKS[name] for name in names]
+    return [check for check in DIAGNOSTIC_CHECKS.values() if check.enabled_by_default]
+
+async def collect_diagnostic_data(ip, vendor, sources, fresh=False):
+    """必要な診断データを並行して取得（キャッシュを再利用）
+
+    (データ, 生の出力のハッシュ) を返す。失敗したデータはどちらにも含めない。
+    """
+    async def fetch(source):
+        kind, parser = DIAGNOSTIC_SOURCES[source]
+        if parser is None:
+            result = await fetch_command(ip, vendor, kind, fresh=fresh)
+            if not result["success"]:
+                return None, None
+            return result["output"], output_digest(result["output"])
+        result = await fetch_parsed(ip, vendor, kind, parser, fresh=fresh)
+        if not result["success"]:
+            return None, None
+        return result["data"], result["digest"]
+    
+    sources = sorted(sources)
+    results = await asyncio.gather(*(fetch(source) for source in sources))
+    data = {}
+    digests = {}
+    for source, (value, digest) in zip(sources, results):
+        if value is None:
+            logger.warning(f"Diagnostic data '{source}' unavailable for {ip}")
+        else:
+            data[source] = value
+            digests[source] = digest
+    return data, digests
+
+def summarize_issues(issues) -> Dict[str, str]:
+    """問題の重大度から全体のステータスと概要を決定"""
+    if len(issues) == 0:
+        return {"status": "healthy", "summary": "全てのシステムは正常に動作しています"}
+    
+    has_critical = any(issue["severity"] == "critical" for issue in issues)
+    has_high = any(issue["severity"] == "high" for issue in issues)
+    
+    if has_critical:
+        return {"status": "error", "summary": f"{len(issues)}件の重大な問題が検出されました"}
+    elif has_high:
+        return {"status": "warning", "summary": f"{len(issues)}件の重要な問題が検出されました"}
+    return {"status": "warning", "summary": f"{len(issues)}件の潜在的な問題が検出されました"}
+
+async def diagnose(ip, vendor, checks: List[DiagnosticCheck], fresh=False, state: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """チェックに必要なデータを一度だけ収集し、各チェックを独立して実行
+
+    state を渡すと、チェックごとの入力ハッシュと結果を保存し、
+    入力が前回と変わっていないチェックは再評価せず前回の結果を使う。
+    """
+    timings = {}
+    started = time.perf_counter()
+    sources = {source for check in checks for source in check.requires}
+    data, digests = await collect_diagnostic_data(ip, vendor, sources, fresh)
+    timings["collect"] = round((time.perf_counter() - started) * 1000, 3)
+    
+    issues = []
+    skipped = []
+    reused = []
+    for check in checks:
+        missing = [source for source in check.requires if source not in data]
+        if missing:
+            logger.warning(f"Skipping diagnostic check {check.name} for {ip}: missing {', '.join(missing)}")
+            skipped.append(check.name)
+            continue
         
-        # 4. その他のチェック（例: CPU/メモリ使用率、セキュリティ設定など）
+        inputs = tuple(digests[source] for source in check.requires)
+        previous = state.get(check.name) if state is not None else None
+        if previous is not None and previous["inputs"] == inputs:
+            issues.extend(previous["issues"])
+            reused.append(check.name)
+            continue
         
-        # 診断結果を返す
-        if len(issues) == 0:
-            return {
-                "status": "healthy",
-                "summary": "全てのシステムは正常に動作しています",
-                "issues": [],
-                "timestamp": datetime.now().isoformat()
-            }
-        else:
-            has_critical = any(issue["severity"] == "critical" for issue in issues)
-            has_high = any(issue["severity"] == "high" for issue in issues)
-            
-            if has_critical:
-                status = "error"
-                summary = f"{len(issues)}件の重大な問題が検出されました"
-            elif has_high:
-                status = "warning"
-                summary = f"{len(issues)}件の重要な問題が検出されました"
-            else:
-                status = "warning"
-                summary = f"{len(issues)}件の潜在的な問題が検出されました"
-                
-            return {
-                "status": status,
-                "summary": summary,
-                "issues": issues,
-                "timestamp": datetime.now().isoformat()
-            }
+        check_started = time.perf_counter()
+        try:
+            check_issues = check.run(data, vendor)
+        except Exception as e:
+            logger.error(f"Diagnostic check {check.name} failed for {ip}: {str(e)}")
+            skipped.append(check.name)
+            continue
+        finally:
+            timings[check.name] = round((time.perf_counter() - check_started) * 1000, 3)
+        issues.extend(check_issues)
+        if state is not None:
+            state[check.name] = {"inputs": inputs, "issues": check_issues}
+    
+    result = {
+        **summarize_issues(issues),
+        "issues": issues,
+        "timestamp": datetime.now().isoformat(),
+        "timings": timings
+    }
+    if skipped:
+        result["skipped_checks"] = skipped
+    if reused:
+        result["reused_checks"] = reused
+    return result
+
+@app.get("/router/{ip}/diagnostics")
+async def run_diagnostics(ip: str, checks: Optional[str] = None, fresh: bool = False):
+    """ネットワーク診断を実行
+
+    checks にカンマ区切りでチェック名を指定すると、そのチェックのみ実行する。
+    """
+    # セッションからベンダーを取得
+    session = session_registry.get_by_ip(ip)
+    
+    if session:
+        selected = select_checks([name.strip() for name in checks.split(",") if name.strip()] if checks else None)
+        return await diagnose(ip, session["vendor"], selected, fresh)
     else:
         # ルーターに接続されていない場合はダミーデータを返す
         logger.warning(f"Router {ip} not connected, using dummy data")
+        DUMMY_FALLBACKS.inc(endpoint="run_diagnostics", reason="not_connected")
         return {
             "status": "healthy",
             "summary": "全てのシステムは正常に動作しています",
@@ -1264,18 +4510,442 @@ async def run_diagnostics(ip: str):
             "timestamp": datetime.now().isoformat()
         }
 
+# 定期診断スケジューラー
+DIAGNOSTICS_INTERVAL = int(os.getenv("DIAGNOSTICS_INTERVAL", "0"))  # 実行間隔（秒、例: 300）。0で無効
+DIAGNOSTICS_JITTER = float(os.getenv("DIAGNOSTICS_JITTER", "30"))
+DIAGNOSTICS_RETRY_INTERVAL = int(os.getenv("DIAGNOSTICS_RETRY_INTERVAL", "60"))
+DIAGNOSTICS_CONCURRENCY = int(os.getenv("DIAGNOSTICS_CONCURRENCY", "20"))
+DIAGNOSTICS_TICK = float(os.getenv("DIAGNOSTICS_TICK", "5"))
+
+class DiagnosticsScheduler:
+    """接続中の全ルーターに対して定期的に診断を実行し、最新結果をメモリに保持する
+
+    実行時刻にはジッターを加えて負荷を分散する。前回失敗したデバイスは
+    短い間隔で再試行し、同時に実行待ちになった場合は優先して実行する。
+    """
+
+    def __init__(
+        self,
+        interval: int = DIAGNOSTICS_INTERVAL,
+        jitter: float = DIAGNOSTICS_JITTER,
+        retry_interval: int = DIAGNOSTICS_RETRY_INTERVAL,
+        concurrency: int = DIAGNOSTICS_CONCURRENCY,
+    ):
+        self.interval = interval
+        self.jitter = jitter
+        self.retry_interval = retry_interval
+        self.concurrency = concurrency
+        self._results: Dict[str, Dict[str, Any]] = {}
+        self._states: Dict[str, Dict[str, Any]] = {}
+        self._next_run: Dict[str, float] = {}
+        self._failures: Dict[str, int] = {}
+        self._running: Dict[str, asyncio.Task] = {}
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._counters = {"runs": 0, "failures": 0, "checks_evaluated": 0, "checks_reused": 0}
+
+    def _schedule(self, ip: str, failed: bool):
+        delay = self.retry_interval if failed else self.interval
+        self._next_run[ip] = time.time() + max(0, delay + random.uniform(-self.jitter, self.jitter))
+
+    def due(self, now: float) -> List[str]:
+        """実行時刻を過ぎたルーターを優先順（連続失敗回数の多い順、次に予定時刻順）に返す"""
+        ips = set(session_registry.ips())
+        # 切断されたルーターの状態を破棄
+        for ip in [ip for ip in self._next_run if ip not in ips]:
+            for store in (self._results, self._states, self._next_run, self._failures):
+                store.pop(ip, None)
+        for ip in ips:
+            if ip not in self._next_run:
+                # 新しいルーターは最初の実行時刻をずらして一斉実行を避ける
+                self._next_run[ip] = now + random.uniform(0, self.jitter)
+        
+        due = [ip for ip in ips if self._next_run[ip] <= now and ip not in self._running]
+        due.sort(key=lambda ip: (-self._failures.get(ip, 0), self._next_run[ip]))
+        return due
+
+    async def run_device(self, ip: str):
+        """1台のルーターの診断を実行して結果を保存"""
+        async with self._semaphore:
+            session = session_registry.get_by_ip(ip)
+            if session is None:
+                return
+            started = time.time()
+            state = self._states.setdefault(ip, {})
+            try:
+                result = await diagnose(ip, session["vendor"], select_checks(), state=state)
+                failed = bool(result.get("skipped_checks"))
+            except Exception as e:
+                logger.error(f"Scheduled diagnostics failed for {ip}: {str(e)}")
+                result = {
+                    "status": "error",
+                    "summary": f"診断を実行できませんでした: {str(e)}",
+                    "issues": [],
+                    "timestamp": datetime.now().isoformat()
+                }
+                failed = True
+            
+            self._counters["runs"] += 1
+            self._counters["checks_evaluated"] += len([name for name in result.get("timings", {}) if name != "collect"])
+            self._counters["checks_reused"] += len(result.get("reused_checks") or [])
+            if failed:
+                self._counters["failures"] += 1
+                self._failures[ip] = self._failures.get(ip, 0) + 1
+            else:
+                self._failures.pop(ip, None)
+            
+            self._results[ip] = {
+                **result,
+                "vendor": session["vendor"],
+                "duration_ms": round((time.time() - started) * 1000, 3),
+                "consecutive_failures": self._failures.get(ip, 0),
+            }
+            self._schedule(ip, failed)
+
+    async def run(self):
+        """バックグラウンドループ（アプリ起動時に開始）"""
+        while True:
+            try:
+                for ip in self.due(time.time()):
+                    task = asyncio.create_task(self.run_device(ip))
+                    self._running[ip] = task
+                    task.add_done_callback(lambda _, ip=ip: self._running.pop(ip, None))
+            except Exception as e:
+                logger.error(f"Diagnostics scheduler error: {str(e)}")
+            await asyncio.sleep(DIAGNOSTICS_TICK)
+
+    async def stop(self):
+        tasks = list(self._running.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def summary(self, status_filter: Optional[str] = None) -> Dict[str, Any]:
+        counts = {"healthy": 0, "warning": 0, "error": 0}
+        devices = {}
+        for ip, result in self._results.items():
+            counts[result["status"]] = counts.get(result["status"], 0) + 1
+            if status_filter and result["status"] != status_filter:
+                continue
+            next_run = self._next_run.get(ip)
+            devices[ip] = {
+                **result,
+                "next_run": datetime.fromtimestamp(next_run).isoformat() if next_run else None,
+            }
+        return {
+            "devices": devices,
+            "counts": counts,
+            "pending": len([ip for ip in session_registry.ips() if ip not in self._results]),
+            "scheduler": {
+                "interval": self.interval,
+                "jitter": self.jitter,
+                "retry_interval": self.retry_interval,
+                "concurrency": self.concurrency,
+                "running": len(self._running),
+                **self._counters,
+            },
+        }
+
+diagnostics_scheduler = DiagnosticsScheduler()
+
+@app.get("/diagnostics/summary")
+async def get_diagnostics_summary(status: Optional[str] = None):
+    """定期診断の最新結果を取得（メモリから返す）"""
+    return diagnostics_scheduler.summary(status)
+
+# 計測値の時系列保存
+HISTORY_DB_PATH = os.getenv("HISTORY_DB_PATH", "")  # SQLiteのファイル（例: history.db）。空文字の場合はメモリ上に保持
+HISTORY_INTERVAL = int(os.getenv("HISTORY_INTERVAL", "0"))  # 記録間隔（秒）。0で無効
+HISTORY_CONCURRENCY = int(os.getenv("HISTORY_CONCURRENCY", "20"))
+HISTORY_PING_COUNT = int(os.getenv("HISTORY_PING_COUNT", "5"))
+# Pingの宛先（カンマ区切り）。空の場合は各ルーターのデフォルトゲートウェイ
+HISTORY_PING_TARGETS = [target.strip() for target in os.getenv("HISTORY_PING_TARGETS", "").split(",") if target.strip()]
+HISTORY_MAX_POINTS = int(os.getenv("HISTORY_MAX_POINTS", "2000"))  # resolution=auto で選ぶ際の1系列あたりの上限
+# 解像度ごとの保持期間（秒）。raw は生のサンプル
+HISTORY_RETENTION = {
+    "raw": int(os.getenv("HISTORY_RAW_RETENTION", str(2 * 24 * 3600))),
+    "1m": int(os.getenv("HISTORY_1M_RETENTION", str(7 * 24 * 3600))),
+    "5m": int(os.getenv("HISTORY_5M_RETENTION", str(30 * 24 * 3600))),
+    "1h": int(os.getenv("HISTORY_1H_RETENTION", str(400 * 24 * 3600))),
+}
+HISTORY_RESOLUTIONS = {"1m": 60, "5m": 300, "1h": 3600}
+HISTORY_PRUNE_INTERVAL = 3600
+
+class HistoryStore:
+    """デバイスごとの計測値（Pingの遅延・損失、インターフェースの状態）をSQLiteに保存する時系列ストア
+
+    系列は (IP, メトリック名, キー) で識別する。サンプルの書き込みと同時に
+    1m/5m/1h のロールアップ（件数・合計・最小・最大・最後の値）をUPSERTで更新するため、
+    長期間の参照でも生のサンプルを走査しない。
+    データベースはopen()（アプリのstartup、または最初の読み書き）で開く。
+    """
+
+    def __init__(self, path: str = HISTORY_DB_PATH):
+        self.path = path or ":memory:"
+        self._lock = threading.Lock()
+        self._series: Dict[Tuple[str, str, str], int] = {}
+        self._pruned_at = 0.0
+        self._db = None
+
+    def open(self):
+        """SQLiteのデータベースを開く（開けない場合はメモリ上に保持）"""
+        with self._lock:
+            if self._db is not None:
+                return
+            try:
+                self._db = sqlite3.connect(self.path, check_same_thread=False)
+                self._init_schema()
+            except sqlite3.Error as e:
+                logger.warning(f"History database {self.path} unavailable, using memory only: {str(e)}")
+                self.path = ":memory:"
+                self._db = sqlite3.connect(self.path, check_same_thread=False)
+                self._init_schema()
+
+    def _init_schema(self):
+        if self.path != ":memory:":
+            self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(
+            "CREATE TABLE IF NOT EXISTS history_series ("
+            " id INTEGER PRIMARY KEY, ip TEXT NOT NULL, metric TEXT NOT NULL, key TEXT NOT NULL,"
+            " UNIQUE (ip, metric, key));"
+            "CREATE TABLE IF NOT EXISTS history_samples ("
+            " series_id INTEGER NOT NULL, ts REAL NOT NULL, value REAL NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS history_samples_series_ts ON history_samples (series_id, ts);"
+            "CREATE TABLE IF NOT EXISTS history_rollups ("
+            " series_id INTEGER NOT NULL, resolution INTEGER NOT NULL, bucket INTEGER NOT NULL,"
+            " count INTEGER NOT NULL, sum REAL NOT NULL, min REAL NOT NULL, max REAL NOT NULL, last REAL NOT NULL,"
+            " PRIMARY KEY (series_id, resolution, bucket)) WITHOUT ROWID;"
+        )
+        self._db.commit()
+        for series_id, ip, metric, key in self._db.execute("SELECT id, ip, metric, key FROM history_series"):
+            self._series[(ip, metric, key)] = series_id
+
+    def _series_id(self, ip: str, metric: str, key: str) -> int:
+        series_id = self._series.get((ip, metric, key))
+        if series_id is None:
+            cursor = self._db.execute(
+                "INSERT INTO history_series (ip, metric, key) VALUES (?, ?, ?)", (ip, metric, key)
+            )
+            series_id = self._series[(ip, metric, key)] = cursor.lastrowid
+        return series_id
+
+    def record(self, ip: str, samples: Iterable[Tuple[str, str, float]], timestamp: Optional[float] = None):
+        """(メトリック名, キー, 値) のサンプルをまとめて書き込み、ロールアップを更新"""
+        timestamp = time.time() if timestamp is None else timestamp
+        self.open()
+        with self._lock:
+            try:
+                rows = [(self._series_id(ip, metric, key), float(value)) for metric, key, value in samples]
+                if not rows:
+                    return
+                self._db.executemany(
+                    "INSERT INTO history_samples (series_id, ts, value) VALUES (?, ?, ?)",
+                    [(series_id, timestamp, value) for series_id, value in rows]
+                )
+                for seconds in HISTORY_RESOLUTIONS.values():
+                    bucket = int(timestamp // seconds * seconds)
+                    self._db.executemany(
+                        "INSERT INTO history_rollups VALUES (?, ?, ?, 1, ?, ?, ?, ?) "
+                        "ON CONFLICT (series_id, resolution, bucket) DO UPDATE SET "
+                        "count = count + 1, sum = sum + excluded.sum, min = MIN(min, excluded.min), "
+                        "max = MAX(max, excluded.max), last = excluded.last",
+                        [(series_id, seconds, bucket, value, value, value, value) for series_id, value in rows]
+                    )
+                self._db.commit()
+            except sqlite3.Error as e:
+                self._db.rollback()
+                logger.warning(f"Failed to record history for {ip}: {str(e)}")
+
+    def prune(self, now: Optional[float] = None):
+        """保持期間を過ぎたサンプルとロールアップを削除"""
+        now = time.time() if now is None else now
+        self.open()
+        with self._lock:
+            try:
+                self._db.execute("DELETE FROM history_samples WHERE ts < ?", (now - HISTORY_RETENTION["raw"],))
+                for name, seconds in HISTORY_RESOLUTIONS.items():
+                    self._db.execute(
+                        "DELETE FROM history_rollups WHERE resolution = ? AND bucket < ?",
+                        (seconds, now - HISTORY_RETENTION[name])
+                    )
+                self._db.commit()
+                self._pruned_at = now
+            except sqlite3.Error as e:
+                self._db.rollback()
+                logger.warning(f"Failed to prune history: {str(e)}")
+
+    def prune_due(self, now: float) -> bool:
+        return now - self._pruned_at >= HISTORY_PRUNE_INTERVAL
+
+    def choose_resolution(self, start: float, end: float) -> str:
+        """1系列の点数が HISTORY_MAX_POINTS 以下になる最も細かい解像度"""
+        for name, seconds in HISTORY_RESOLUTIONS.items():
+            if (end - start) / seconds <= HISTORY_MAX_POINTS and start >= time.time() - HISTORY_RETENTION[name]:
+                return name
+        return "1h"
+
+    def query(
+        self, ip: str, start: float, end: float, resolution: str,
+        metric: Optional[str] = None, key: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """期間内の系列ごとの点を返す（raw 以外はロールアップから読む）"""
+        self.open()
+        with self._lock:
+            series = {
+                series_id: (series_metric, series_key)
+                for (series_ip, series_metric, series_key), series_id in self._series.items()
+                if series_ip == ip and metric in (None, series_metric) and key in (None, series_key)
+            }
+            points: Dict[int, List[Dict[str, Any]]] = {series_id: [] for series_id in series}
+            for series_id in series:
+                if resolution == "raw":
+                    rows = self._db.execute(
+                        "SELECT ts, value FROM history_samples WHERE series_id = ? AND ts >= ? AND ts <= ? ORDER BY ts",
+                        (series_id, start, end)
+                    )
+                    points[series_id] = [{"timestamp": ts, "value": value} for ts, value in rows]
+                else:
+                    seconds = HISTORY_RESOLUTIONS[resolution]
+                    rows = self._db.execute(
+                        "SELECT bucket, count, sum, min, max, last FROM history_rollups "
+                        "WHERE series_id = ? AND resolution = ? AND bucket >= ? AND bucket <= ? ORDER BY bucket",
+                        (series_id, seconds, start // seconds * seconds, end)
+                    )
+                    points[series_id] = [
+                        {"timestamp": bucket, "count": count, "avg": total / count, "min": low, "max": high, "last": last}
+                        for bucket, count, total, low, high, last in rows
+                    ]
+        return [
+            {"metric": series_metric, "key": series_key, "points": points[series_id]}
+            for series_id, (series_metric, series_key) in sorted(series.items(), key=lambda item: item[1])
+        ]
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+                self._series.clear()
+
+history_store = HistoryStore()
+
+def default_gateway(routes: RouteTable) -> Optional[str]:
+    """デフォルトルートのネクストホップ（管理距離、メトリックの最も小さいもの）"""
+    best = None
+    for row in range(len(routes)):
+        if routes.prefix_length(row) != 0:
+            continue
+        route = routes.route(row)
+        if route["destination"] not in ("0.0.0.0", "::") or ipv4_to_int(route["next_hop"] or "") is None:
+            continue
+        if best is None or routes.preference(row) < best[0]:
+            best = (routes.preference(row), route["next_hop"])
+    return best[1] if best else None
+
+async def collect_history_samples(ip: str, vendor) -> List[Tuple[str, str, float]]:
+    """1台分の計測値を取得（取得できなかったものは含めない）"""
+    samples = []
+    
+    interfaces = await fetch_parsed(ip, vendor, "interfaces", parse_interfaces)
+    if interfaces["success"]:
+        for name, interface in interfaces["data"].items():
+            samples.append(("interface_up", name, 1.0 if interface.get("status") == "up" else 0.0))
+    
+    targets = HISTORY_PING_TARGETS
+    if not targets:
+        routes = await fetch_parsed(ip, vendor, "routing_table", parse_routes)
+        gateway = default_gateway(routes["data"]) if routes["success"] else None
+        targets = [gateway] if gateway else []
+    for target in targets:
+        result = await ssh_backend.execute(ip, build_ping_command(vendor, target, HISTORY_PING_COUNT))
+        if not result["success"]:
+            continue
+        ping_result = parse_ping_result(result["output"], vendor)
+        samples.append(("ping_loss", target, float(ping_result.get("packet_loss", 100))))
+        if ping_result.get("rtt_avg") is not None:
+            samples.append(("ping_rtt", target, float(ping_result["rtt_avg"])))
+    return samples
+
+class HistoryRecorder:
+    """接続中の全ルーターの計測値を一定間隔で HistoryStore に記録する"""
+
+    def __init__(self, store: HistoryStore, interval: int = HISTORY_INTERVAL, concurrency: int = HISTORY_CONCURRENCY):
+        self.store = store
+        self.interval = interval
+        self._semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def record_device(self, ip: str):
+        async with self._semaphore:
+            session = session_registry.get_by_ip(ip)
+            if session is None:
+                return
+            try:
+                samples = await collect_history_samples(ip, session["vendor"])
+            except Exception as e:
+                logger.error(f"History collection failed for {ip}: {str(e)}")
+                HISTORY_COLLECTIONS.inc(result="failed")
+                return
+            timestamp = time.time()
+            await asyncio.get_running_loop().run_in_executor(None, self.store.record, ip, samples, timestamp)
+            HISTORY_COLLECTIONS.inc(result="success")
+            for metric, _, _ in samples:
+                HISTORY_SAMPLES.inc(metric=metric)
+
+    async def run(self):
+        """バックグラウンドループ（アプリ起動時に開始）"""
+        loop = asyncio.get_running_loop()
+        while True:
+            started = time.monotonic()
+            try:
+                await asyncio.gather(*(self.record_device(ip) for ip in session_registry.ips()))
+                now = time.time()
+                if self.store.prune_due(now):
+                    await loop.run_in_executor(None, self.store.prune, now)
+            except Exception as e:
+                logger.error(f"History recorder error: {str(e)}")
+            await asyncio.sleep(max(0, self.interval - (time.monotonic() - started)))
+
+history_recorder = HistoryRecorder(history_store)
+
+@app.get("/router/{ip}/history")
+async def get_history(
+    ip: str,
+    metric: Optional[str] = None,
+    key: Optional[str] = None,
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+    resolution: Literal["auto", "raw", "1m", "5m", "1h"] = "auto",
+    accept_encoding: Optional[str] = Header(None),
+):
+    """記録済みの計測値を取得
+
+    start / end はUNIX時刻（秒）。省略時は直近24時間。resolution=auto の場合は
+    期間に応じて 1m/5m/1h のロールアップから選ぶ。
+    """
+    end = time.time() if end is None else end
+    start = end - 24 * 3600 if start is None else start
+    if start > end:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="start must be before end")
+    if resolution == "auto":
+        resolution = history_store.choose_resolution(start, end)
+    
+    series = await asyncio.get_running_loop().run_in_executor(
+        None, history_store.query, ip, start, end, resolution, metric, key
+    )
+    return json_response({
+        "ip": ip,
+        "start": start,
+        "end": end,
+        "resolution": resolution,
+        "series": series,
+    }, accept_encoding)
+
 @app.post("/router/{ip}/execute")
 async def execute_command(ip: str, command_req: CommandRequest):
-    # セッションからクライアントとベンダーを取得
-    session_id = None
-    for sid, router in connected_routers.items():
-        if router["ip"] == ip:
-            session_id = sid
-            break
+    # セッションからベンダーを取得
+    session = session_registry.get_by_ip(ip)
     
-    if session_id:
-        client = connected_routers[session_id]["client"]
-        vendor = connected_routers[session_id]["vendor"]
+    if session:
+        vendor = session["vendor"]
         
         # コマンド実行
         try:
@@ -1283,7 +4953,9 @@ async def execute_command(ip: str, command_req: CommandRequest):
             if is_destructive_command(command_req.command):
                 return {"output": "安全のため、破壊的なコマンドは実行できません。"}
             
-            result = execute_ssh_command(client, command_req.command)
+            result = await ssh_backend.execute(ip, command_req.command)
+            # 任意のコマンドは状態を変更し得るため、キャッシュを破棄
+            command_cache.invalidate(ip)
             
             if result["success"]:
                 return {"output": result["output"]}
@@ -1383,119 +5055,658 @@ def is_destructive_command(command):
             
     return False
 
+@app.websocket("/router/{ip}/stream")
+async def stream_command(websocket: WebSocket, ip: str):
+    """コマンド出力をWebSocketでチャンクごとに配信
+
+    最初のメッセージで {"command": "..."} または
+    {"action": "ping" | "traceroute", "target": "...", "count": 5} を受け取る。
+    実行中にクライアントから何かメッセージが届くか切断されると中断する。
+    """
+    await websocket.accept()
+    
+    session = session_registry.get_by_ip(ip)
+    if not session:
+        await websocket.send_json({"type": "error", "message": f"Router {ip} is not connected"})
+        await websocket.close()
+        return
+    vendor = session["vendor"]
+    
+    try:
+        request = await websocket.receive_json()
+    except WebSocketDisconnect:
+        return
+    except ValueError:
+        request = None
+    
+    timeout = 30
+    try:
+        if not isinstance(request, dict):
+            raise ValueError("Request must be a JSON object")
+        action = request.get("action", "command")
+        # 宛先と回数はコマンドにそのまま埋め込むため、改行などを含む値はここで拒否する
+        if action == "traceroute":
+            target = validate_probe_target(request.get("target"))
+            command = VENDOR_COMMANDS.get(vendor, VENDOR_COMMANDS[VendorType.CISCO])["traceroute"].format(target=target)
+            timeout = 60
+        elif action == "ping":
+            target = validate_probe_target(request.get("target"))
+            command = build_ping_command(vendor, target, validate_ping_count(request.get("count", 5)))
+        else:
+            command = request.get("command", "")
+            if not isinstance(command, str) or not command.strip():
+                raise ValueError("command is required")
+            if is_destructive_command(command):
+                raise ValueError("安全のため、破壊的なコマンドは実行できません。")
+            command_cache.invalidate(ip)
+    except ValueError as e:
+        await websocket.send_json({"type": "error", "message": str(e)})
+        await websocket.close()
+        return
+    
+    queue: asyncio.Queue = asyncio.Queue()
+    cancel_event = threading.Event()
+    credits = asyncio.Semaphore(STREAM_MAX_PENDING_CHUNKS)
+    
+    async def on_chunk(chunk):
+        # 送信待ちのチャンクが多すぎる間はSSHの読み取りを止める（バックプレッシャー）
+        while True:
+            try:
+                await asyncio.wait_for(credits.acquire(), STREAM_POLL_INTERVAL)
+                break
+            except asyncio.TimeoutError:
+                if cancel_event.is_set():
+                    return False
+        queue.put_nowait(chunk)
+        return not cancel_event.is_set()
+    
+    producer = asyncio.create_task(ssh_backend.stream(ip, command, on_chunk, cancel_event, timeout))
+    producer.add_done_callback(lambda _: queue.put_nowait(None))
+    watcher = asyncio.create_task(websocket.receive_text())
+    
+    pending_line = ""
+    ping_state = PingState()
+    try:
+        while True:
+            getter = asyncio.create_task(queue.get())
+            done, _ = await asyncio.wait({getter, watcher}, return_when=asyncio.FIRST_COMPLETED)
+            if watcher in done:
+                # クライアントの切断または中断要求
+                getter.cancel()
+                cancel_event.set()
+                break
+            
+            chunk = getter.result()
+            if chunk is None:
+                break
+            credits.release()
+            await websocket.send_json({"type": "output", "data": chunk})
+            
+            # 完了した行ごとに解析して結果を配信
+            lines = (pending_line + chunk).split('\n')
+            pending_line = lines.pop()
+            for line in lines:
+                if action == "traceroute":
+                    hop = parse_traceroute_line(line, vendor)
+                    if hop:
+                        await websocket.send_json({"type": "hop", "hop": hop})
+                elif action == "ping" and parse_ping_line(line, vendor, ping_state):
+                    await websocket.send_json({
+                        "type": "ping_progress",
+                        "sent": ping_state.probes,
+                        "received": ping_state.replies,
+                    })
+            # Ciscoの進捗（"!!.!"）は改行を待たずに配信
+            progress = pending_line.strip()
+            if action == "ping" and progress and CISCO_PING_PROGRESS_PATTERN.fullmatch(progress):
+                await websocket.send_json({
+                    "type": "ping_progress",
+                    "sent": ping_state.probes + len(progress),
+                    "received": ping_state.replies + progress.count("!"),
+                })
+        
+        if cancel_event.is_set():
+            return
+        
+        result = await producer
+        if action == "traceroute" and pending_line:
+            hop = parse_traceroute_line(pending_line, vendor)
+            if hop:
+                await websocket.send_json({"type": "hop", "hop": hop})
+        elif action == "ping" and result["success"]:
+            parse_ping_line(pending_line, vendor, ping_state)
+            await websocket.send_json({"type": "ping_result", "result": ping_state.result()})
+        
+        await websocket.send_json({"type": "done", "success": result["success"], "message": result["output"]})
+        await websocket.close()
+    except WebSocketDisconnect:
+        cancel_event.set()
+    finally:
+        cancel_event.set()
+        watcher.cancel()
+
 @app.get("/router/{ip}/topology")
 async def get_network_topology(ip: str):
     """ネットワークトポロジを取得"""
-    # セッションからクライアントとベンダーを取得
-    session_id = None
-    for sid, router in connected_routers.items():
-        if router["ip"] == ip:
-            session_id = sid
-            break
+    # セッションからベンダーを取得
+    session = session_registry.get_by_ip(ip)
     
-    if session_id:
-        client = connected_routers[session_id]["client"]
-        vendor = connected_routers[session_id]["vendor"]
+    if session:
+        vendor = session["vendor"]
         
         # 隣接デバイス情報を取得
-        neighbors_command = VENDOR_COMMANDS.get(vendor, VENDOR_COMMANDS[VendorType.CISCO])["neighbors"]
-        neighbors_result = execute_ssh_command(client, neighbors_command)
+        neighbors_result = await fetch_parsed(ip, vendor, "neighbors", parse_neighbors)
         
         if neighbors_result["success"]:
-            neighbors = parse_neighbors(neighbors_result["output"], vendor)
+            record_neighbors(ip, vendor, neighbors_result)
             
             # トポロジを構築
-            return build_network_topology(ip, neighbors, vendor)
+            return build_network_topology(ip, neighbors_result["data"], vendor)
         else:
             logger.warning(f"Failed to get topology, using dummy data: {neighbors_result}")
-            return generate_dummy_topology()
+            DUMMY_FALLBACKS.inc(endpoint="get_network_topology", reason="command_failed")
+            return synthetic_router(ip, vendor).topology
     else:
         # ルーターに接続されていない場合はダミーデータを返す
         logger.warning(f"Router {ip} not connected, using dummy topology")
-        return generate_dummy_topology()
+        DUMMY_FALLBACKS.inc(endpoint="get_network_topology", reason="not_connected")
+        return synthetic_router(ip).topology
+
+def neighbor_device_type(neighbor):
+    """隣接情報のプラットフォームからデバイス種別を判定"""
+    return "Switch" if "Switch" in (neighbor.get("platform") or "") else "Router"
+
+class TopologyGraph:
+    """デバイスと接続を名前・IP・接続端点のハッシュで重複排除して保持するグラフ"""
+
+    def __init__(self):
+        self.devices: Dict[str, Dict[str, Any]] = {}
+        self.names_by_ip: Dict[str, str] = {}
+        self.connections: Dict[Tuple[Tuple[str, str], ...], Dict[str, Any]] = {}
+
+    def find(self, name: Optional[str] = None, ip: Optional[str] = None) -> Optional[str]:
+        """IPまたは名前から登録済みのデバイス名を探す"""
+        if ip and ip in self.names_by_ip:
+            return self.names_by_ip[ip]
+        if name and name in self.devices:
+            return name
+        return None
+
+    def add_device(self, name: str, device_type: str, ip: Optional[str] = None, model: Optional[str] = None, **extra) -> str:
+        """デバイスを追加し、既に登録済みの場合はそのデバイス名を返す"""
+        existing = self.find(name, ip)
+        if existing is not None:
+            device = self.devices[existing]
+            if ip and not device.get("ip"):
+                device["ip"] = ip
+                self.names_by_ip[ip] = existing
+            return existing
+        self.devices[name] = {"name": name, "type": device_type, "ip": ip, "model": model, **extra}
+        if ip:
+            self.names_by_ip[ip] = name
+        return name
+
+    def add_connection(self, source: str, source_interface: str, target: str, target_interface: str) -> bool:
+        """接続を追加（両端から報告された同じリンクは1本にまとめる）"""
+        key = tuple(sorted(((source, source_interface), (target, target_interface))))
+        if key in self.connections:
+            return False
+        self.connections[key] = {
+            "source": source,
+            "source_interface": source_interface,
+            "target": target,
+            "target_interface": target_interface,
+        }
+        return True
+
+    def add_neighbors(self, source: str, neighbors, **extra) -> List[Tuple[str, Optional[str]]]:
+        """隣接情報からデバイスと接続を追加し、(デバイス名, IP) の一覧を返す"""
+        found = []
+        for neighbor in neighbors:
+            device_ip = neighbor.get("ip_address")
+            name = self.add_device(
+                neighbor["device_id"],
+                neighbor_device_type(neighbor),
+                device_ip,
+                neighbor.get("platform", "Unknown"),
+                **extra,
+            )
+            self.add_connection(
+                source,
+                neighbor.get("local_interface", "Unknown"),
+                name,
+                neighbor.get("remote_interface", "Unknown"),
+            )
+            found.append((name, device_ip))
+        return found
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "devices": list(self.devices.values()),
+            "connections": list(self.connections.values()),
+        }
 
 def build_network_topology(router_ip, neighbors, vendor):
     """隣接デバイス情報からトポロジを構築"""
-    devices = []
-    connections = []
+    graph = TopologyGraph()
     
     # ルーター自身を追加
-    devices.append({
-        "name": f"Router_{router_ip}",
-        "type": "Router",
-        "ip": router_ip,
-        "model": vendor
-    })
-    
-    # 隣接デバイスを追加
-    for neighbor in neighbors:
-        device_id = neighbor["device_id"]
-        device_ip = neighbor["ip_address"]
-        
-        # デバイスが既に追加されているかチェック
-        if not any(d["name"] == device_id for d in devices):
-            device_type = "Router"
-            if "Switch" in neighbor.get("platform", ""):
-                device_type = "Switch"
-                
-            devices.append({
-                "name": device_id,
-                "type": device_type,
-                "ip": device_ip,
-                "model": neighbor.get("platform", "Unknown")
-            })
-        
-        # 接続情報を追加
-        connections.append({
-            "source": f"Router_{router_ip}",
-            "source_interface": neighbor.get("local_interface", "Unknown"),
-            "target": device_id,
-            "target_interface": neighbor.get("remote_interface", "Unknown")
+    source = graph.add_device(f"Router_{router_ip}", "Router", router_ip, vendor)
+    
+    # 隣接デバイスと接続情報を追加
+    graph.add_neighbors(source, neighbors)
+    
+    return graph.to_dict()
+
+# 隣接情報から差分更新するトポロジの保持と変更通知
+TOPOLOGY_EVENT_QUEUE_SIZE = int(os.getenv("TOPOLOGY_EVENT_QUEUE_SIZE", "1000"))  # 購読者ごとの未送信イベントの上限
+
+LinkKey = Tuple[Tuple[str, str], ...]
+
+class TopologyStore(TopologyGraph):
+    """全ルーターの隣接情報をまとめたトポロジ
+
+    ルーターごとの隣接関係を (ローカルIF, 隣接デバイス, リモートIF) をキーに保持し、
+    1台分の隣接情報が変わったときはその差分だけをグラフへ反映する。
+    リンクはどちらか一方の端から報告されていれば up とし、
+    変化があると link_up / link_down などのイベントを購読者へ配信する。
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.adjacency: Dict[str, Dict[Tuple[str, str, str], LinkKey]] = {}
+        self.reporters: Dict[LinkKey, Set[str]] = {}
+        self.links_by_device: Dict[str, Set[LinkKey]] = {}
+        self.digests: Dict[str, str] = {}
+        self.version = 0
+        self.subscribers: Set[asyncio.Queue] = set()
+        self.events: List[Dict[str, Any]] = []
+
+    def emit(self, event_type: str, **payload):
+        self.version += 1
+        self.events.append({
+            "type": event_type,
+            "version": self.version,
+            "timestamp": datetime.now().isoformat(),
+            **payload,
         })
+
+    def add_device(self, name: str, device_type: str, ip: Optional[str] = None, model: Optional[str] = None, **extra) -> str:
+        is_new = self.find(name, ip) is None
+        name = super().add_device(name, device_type, ip, model, **extra)
+        if is_new:
+            self.emit("device_added", device=self.devices[name])
+        return name
+
+    def link_up(self, key: LinkKey, reporter: str, connection: Dict[str, Any]):
+        reporters = self.reporters.setdefault(key, set())
+        reporters.add(reporter)
+        if len(reporters) == 1:
+            self.connections[key] = connection
+            for device, _ in key:
+                self.links_by_device.setdefault(device, set()).add(key)
+            self.emit("link_up", connection=connection)
+
+    def link_down(self, key: LinkKey, reporter: str):
+        reporters = self.reporters.get(key)
+        if not reporters:
+            return
+        reporters.discard(reporter)
+        if reporters:
+            return
+        del self.reporters[key]
+        connection = self.connections.pop(key)
+        self.emit("link_down", connection=connection)
+        for device, _ in key:
+            links = self.links_by_device.get(device)
+            if links is not None:
+                links.discard(key)
+            # 自身の隣接情報を持たず、他から報告されなくなったデバイスは削除
+            if not links and device not in self.adjacency and device in self.devices:
+                self.remove_device(device)
+
+    def remove_device(self, name: str):
+        device = self.devices.pop(name)
+        self.links_by_device.pop(name, None)
+        if device.get("ip") and self.names_by_ip.get(device["ip"]) == name:
+            del self.names_by_ip[device["ip"]]
+        self.emit("device_removed", device=device)
+
+    def update(self, ip: str, vendor, neighbors, digest: Optional[str] = None) -> List[Dict[str, Any]]:
+        """1台のルーターの隣接情報を反映し、発生したイベントを配信して返す"""
+        self.events = []
+        name = self.add_device(f"Router_{ip}", "Router", ip, vendor)
+        if digest is not None and self.digests.get(name) == digest:
+            # 前回と同じ出力なので隣接関係は変わっていない
+            return []
+        
+        current = {}
+        for neighbor in neighbors:
+            target = self.add_device(
+                neighbor["device_id"],
+                neighbor_device_type(neighbor),
+                neighbor.get("ip_address"),
+                neighbor.get("platform", "Unknown"),
+            )
+            local_interface = neighbor.get("local_interface", "Unknown")
+            remote_interface = neighbor.get("remote_interface", "Unknown")
+            key = tuple(sorted(((name, local_interface), (target, remote_interface))))
+            current[(local_interface, target, remote_interface)] = key
+        
+        previous = self.adjacency.get(name, {})
+        self.adjacency[name] = current
+        # 先に新しいリンクを追加し、接続先を付け替えただけのデバイスが削除されないようにする
+        for (local_interface, target, remote_interface), key in current.items():
+            if key not in self.connections or name not in self.reporters[key]:
+                self.link_up(key, name, {
+                    "source": name,
+                    "source_interface": local_interface,
+                    "target": target,
+                    "target_interface": remote_interface,
+                })
+        for adjacency, key in previous.items():
+            if adjacency not in current:
+                self.link_down(key, name)
+        
+        if digest is not None:
+            self.digests[name] = digest
+        events, self.events = self.events, []
+        self.publish(events)
+        return events
+
+    def forget(self, ip: str) -> List[Dict[str, Any]]:
+        """ルーターの隣接情報を取り除く（報告していたリンクは他から報告されていなければdown）"""
+        self.events = []
+        name = self.find(ip=ip)
+        if name is not None and name in self.adjacency:
+            previous = self.adjacency.pop(name)
+            self.digests.pop(name, None)
+            for key in previous.values():
+                self.link_down(key, name)
+            if not self.links_by_device.get(name) and name in self.devices:
+                self.remove_device(name)
+        events, self.events = self.events, []
+        self.publish(events)
+        return events
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"type": "snapshot", "version": self.version, **self.to_dict()}
+
+    def subscribe(self) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=TOPOLOGY_EVENT_QUEUE_SIZE)
+        self.subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self.subscribers.discard(queue)
+
+    def publish(self, events: List[Dict[str, Any]]):
+        for queue in self.subscribers:
+            for event in events:
+                try:
+                    queue.put_nowait(event)
+                except asyncio.QueueFull:
+                    # 追いつけない購読者にはイベントを捨ててスナップショットを送り直す
+                    while not queue.empty():
+                        queue.get_nowait()
+                    queue.put_nowait(None)
+                    break
+
+topology_store = TopologyStore()
+
+def record_neighbors(ip: str, vendor, result: Dict[str, Any]):
+    """取得した隣接情報をトポロジへ反映"""
+    if result["success"]:
+        topology_store.update(ip, vendor, result["data"], result.get("digest"))
+
+@app.get("/topology")
+async def get_topology_snapshot():
+    """これまでに取得した隣接情報から構築したトポロジを返す（ルーターには問い合わせない）"""
+    return topology_store.snapshot()
+
+@app.websocket("/topology/events")
+async def topology_events(websocket: WebSocket):
+    """トポロジの変更をWebSocketで配信
+
+    接続時にスナップショットを送り、以降は device_added / device_removed /
+    link_up / link_down のイベントを version の順に送る。
+    """
+    await websocket.accept()
+    queue = topology_store.subscribe()
+    watcher = asyncio.create_task(websocket.receive_text())
+    try:
+        await websocket.send_json(topology_store.snapshot())
+        while True:
+            getter = asyncio.create_task(queue.get())
+            done, _ = await asyncio.wait({getter, watcher}, return_when=asyncio.FIRST_COMPLETED)
+            if watcher in done:
+                # クライアントの切断（送られてきたメッセージは無視する）
+                getter.cancel()
+                if watcher.exception() is not None:
+                    break
+                watcher = asyncio.create_task(websocket.receive_text())
+                continue
+            
+            event = getter.result()
+            if event is None:
+                await websocket.send_json(topology_store.snapshot())
+            else:
+                await websocket.send_json(event)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        topology_store.unsubscribe(queue)
+        watcher.cancel()
+
+# 複数ホップのトポロジ探索
+TOPOLOGY_MAX_DEPTH = int(os.getenv("TOPOLOGY_MAX_DEPTH", "3"))
+TOPOLOGY_CONCURRENCY = int(os.getenv("TOPOLOGY_CONCURRENCY", "50"))
+TOPOLOGY_MAX_DEVICES = int(os.getenv("TOPOLOGY_MAX_DEVICES", "5000"))  # 1回の探索で接続するデバイス数の上限
+TOPOLOGY_DEVICE_TIMEOUT = float(os.getenv("TOPOLOGY_DEVICE_TIMEOUT", "30"))
+
+async def query_device_neighbors(ip: str, credentials: RouterInfo, fresh: bool = False) -> Dict[str, Any]:
+    """1台のデバイスの隣接情報を取得（未接続なら共通の認証情報で接続し、終わったら切断）"""
+    session = session_registry.get_by_ip(ip)
+    opened = False
+    if session:
+        vendor = session["vendor"]
+    else:
+        router = RouterInfo(
+            ip=ip,
+            username=credentials.username,
+            password=credentials.password,
+            enable_password=credentials.enable_password,
+            connection_type=credentials.connection_type,
+            vendor=credentials.vendor if ip == credentials.ip else None,
+        )
+        connection_result = await ssh_backend.connect(router)
+        if not connection_result["success"]:
+            return {"success": False, "output": connection_result["message"], "vendor": None}
+        vendor = connection_result["vendor"]
+        opened = True
     
-    return {
-        "devices": devices,
-        "connections": connections
+    try:
+        result = await fetch_parsed(ip, vendor, "neighbors", parse_neighbors, fresh)
+    finally:
+        # 探索のために開いた接続は、その間にセッションが作られていなければ閉じる
+        if opened and not session_registry.get_by_ip(ip):
+            await ssh_backend.close(ip)
+            forget_router_semaphore(ip)
+    return {**result, "vendor": vendor}
+
+async def crawl_topology(seed: RouterInfo, max_depth: int, concurrency: int, fresh: bool = False) -> Dict[str, Any]:
+    """起点のルーターから隣接デバイスを幅優先で辿ってトポロジを構築
+
+    同じ深さのデバイスは並行して問い合わせる。深さ max_depth 未満のデバイスに接続し、
+    その隣接デバイスまでをグラフに含める。
+    """
+    started = time.monotonic()
+    graph = TopologyGraph()
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    
+    seed_name = graph.add_device(f"Router_{seed.ip}", "Router", seed.ip, seed.vendor, depth=0)
+    visited = {seed.ip}
+    frontier = [(seed_name, seed.ip)]
+    unreachable = []
+    crawled = 0
+    truncated = False
+    depth = 0
+    
+    async def visit(name, ip):
+        async with semaphore:
+            try:
+                return await asyncio.wait_for(query_device_neighbors(ip, seed, fresh), TOPOLOGY_DEVICE_TIMEOUT)
+            except asyncio.TimeoutError:
+                return {"success": False, "output": f"timed out after {TOPOLOGY_DEVICE_TIMEOUT}s", "vendor": None}
+            except Exception as e:
+                return {"success": False, "output": str(e), "vendor": None}
+    
+    while frontier and depth < max_depth:
+        if crawled + len(frontier) > TOPOLOGY_MAX_DEVICES:
+            frontier = frontier[:TOPOLOGY_MAX_DEVICES - crawled]
+            truncated = True
+        logger.info(f"Topology crawl from {seed.ip}: querying {len(frontier)} devices at depth {depth}")
+        results = await asyncio.gather(*(visit(name, ip) for name, ip in frontier))
+        crawled += len(frontier)
+        
+        next_frontier = []
+        for (name, ip), result in zip(frontier, results):
+            device = graph.devices[name]
+            if not result["success"]:
+                device["reachable"] = False
+                unreachable.append({"name": name, "ip": ip, "error": result["output"]})
+                continue
+            record_neighbors(ip, result["vendor"], result)
+            device["reachable"] = True
+            device["vendor"] = result["vendor"]
+            if name == seed_name:
+                device["model"] = result["vendor"]
+            for neighbor_name, neighbor_ip in graph.add_neighbors(name, result["data"], depth=depth + 1):
+                if neighbor_ip and neighbor_ip not in visited:
+                    visited.add(neighbor_ip)
+                    next_frontier.append((neighbor_name, neighbor_ip))
+        
+        frontier = next_frontier
+        depth += 1
+        if crawled >= TOPOLOGY_MAX_DEVICES:
+            truncated = truncated or bool(frontier)
+            break
+    
+    topology = graph.to_dict()
+    topology["unreachable"] = unreachable
+    topology["summary"] = {
+        "devices": len(graph.devices),
+        "connections": len(graph.connections),
+        "crawled": crawled,
+        "unreachable": len(unreachable),
+        "depth": depth,
+        "truncated": truncated,
+        "elapsed": round(time.monotonic() - started, 3),
     }
+    return topology
 
-def generate_dummy_topology():
-    """ダミーのネットワークトポロジを生成"""
-    return {
-        "devices": [
-            {
-                "name": "Router_192.168.1.1",
-                "type": "Router",
-                "ip": "192.168.1.1",
-                "model": "Cisco C892FSP-K9"
-            },
-            {
-                "name": "Switch1",
-                "type": "Switch",
-                "ip": "192.168.1.2",
-                "model": "Cisco WS-C2960X"
-            },
-            {
-                "name": "Router2",
-                "type": "Router",
-                "ip": "10.0.0.2",
-                "model": "Cisco C891F"
-            }
-        ],
-        "connections": [
-            {
-                "source": "Router_192.168.1.1",
-                "source_interface": "GigabitEthernet0/0",
-                "target": "Switch1",
-                "target_interface": "GigabitEthernet1/0/24"
-            },
-            {
-                "source": "Router_192.168.1.1",
-                "source_interface": "GigabitEthernet0/1",
-                "target": "Router2",
-                "target_interface": "GigabitEthernet0/0"
-            }
+@app.post("/topology/crawl")
+async def crawl_network_topology(request: TopologyCrawlRequest):
+    """起点のルーターから複数ホップ先までトポロジを探索"""
+    max_depth = TOPOLOGY_MAX_DEPTH if request.max_depth is None else max(request.max_depth, 0)
+    concurrency = request.concurrency or TOPOLOGY_CONCURRENCY
+    logger.info(f"Topology crawl from {request.ip} (depth {max_depth}, concurrency {concurrency})")
+    
+    topology = await crawl_topology(request, max_depth, concurrency, request.fresh)
+    summary = topology["summary"]
+    logger.info(
+        f"Topology crawl from {request.ip} finished: {summary['devices']} devices, "
+        f"{summary['connections']} connections, {summary['unreachable']} unreachable in {summary['elapsed']}s"
+    )
+    return topology
+
+# 複数ルーターからの一括収集
+BULK_CONCURRENCY = int(os.getenv("BULK_CONCURRENCY", "200"))
+BULK_DEVICE_TIMEOUT = float(os.getenv("BULK_DEVICE_TIMEOUT", "30"))
+
+# 収集データの種類 -> (コマンド種別, パーサー)
+BULK_COLLECTORS = {
+    "version": ("version", extract_router_info),
+    "interfaces": ("interfaces", parse_interfaces),
+    "routes": ("routing_table", parse_routes),
+    "neighbors": ("neighbors", parse_neighbors),
+}
+
+# 全ての一括収集リクエストで共有する同時実行数の上限
+bulk_semaphore = asyncio.Semaphore(BULK_CONCURRENCY)
+
+async def collect_device_data(ip, kinds, timeout, fresh=False):
+    """1台のルーターから指定された種類のデータを収集"""
+    session = session_registry.get_by_ip(ip)
+    if not session:
+        return {"ip": ip, "success": False, "error": "not connected"}
+    vendor = session["vendor"]
+    
+    async with bulk_semaphore:
+        try:
+            results = await asyncio.wait_for(
+                asyncio.gather(*(
+                    fetch_parsed(ip, vendor, BULK_COLLECTORS[kind][0], BULK_COLLECTORS[kind][1], fresh)
+                    for kind in kinds
+                )),
+                timeout,
+            )
+        except asyncio.TimeoutError:
+            return {"ip": ip, "vendor": vendor, "success": False, "error": f"timed out after {timeout}s"}
+    
+    data = {}
+    errors = {}
+    truncated = []
+    for kind, result in zip(kinds, results):
+        if kind == "neighbors":
+            record_neighbors(ip, vendor, result)
+        if result["success"]:
+            data[kind] = result["data"]
+            if result["truncated"]:
+                truncated.append(kind)
+        else:
+            errors[kind] = result["output"]
+    
+    return {"ip": ip, "vendor": vendor, "success": not errors, "data": data, "errors": errors, "truncated": truncated}
+
+@app.post("/bulk/collect")
+async def bulk_collect(request: BulkCollectRequest):
+    """複数ルーターから並行してデータを収集し、完了した順にNDJSONで返す
+
+    インターフェースは一覧のみ（詳細情報は取得しない）。
+    """
+    ips = request.ips if request.ips is not None else session_registry.ips()
+    kinds = list(dict.fromkeys(request.kinds))
+    timeout = request.timeout or BULK_DEVICE_TIMEOUT
+    logger.info(f"Bulk collection of {kinds} from {len(ips)} routers")
+    
+    async def stream():
+        started = time.monotonic()
+        succeeded = 0
+        tasks = [
+            asyncio.ensure_future(collect_device_data(ip, kinds, timeout, request.fresh))
+            for ip in dict.fromkeys(ips)
         ]
-    }
+        try:
+            for next_result in asyncio.as_completed(tasks):
+                result = await next_result
+                succeeded += result["success"]
+                yield dumps_json(result) + b"\n"
+            
+            yield dumps_json({
+                "summary": {
+                    "devices": len(tasks),
+                    "succeeded": succeeded,
+                    "failed": len(tasks) - succeeded,
+                    "elapsed": round(time.monotonic() - started, 3),
+                }
+            }) + b"\n"
+        finally:
+            # クライアントが切断した場合は残りの収集を中止
+            for task in tasks:
+                task.cancel()
+    
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
 
 # メイン
 if __name__ == "__main__":
@@ -0,0 +1,403 @@
+"""ルーターAPIの性能計測
+
+仮想ルーター（router-simulator.py）とAPI（uvicorn）を同じプロセス内で起動し、
+シナリオごとの応答時間を計測する。APIは別スレッドのイベントループで動かすため、
+APIのイベントループが塞がれると計測側からは応答時間の悪化として見える。
+
+    python router-bench.py load            # トレースルート実行中の /interfaces の応答時間
+    python router-bench.py detail-modes    # インターフェース詳細の取得方式（serial/parallel/batched）ごとの応答時間
+    python router-bench.py memory          # 100万ルートの show ip route を取得・解析したときのピークRSS
+                                           # （RouteTableと辞書のリストの比較を含む）
+    python router-bench.py json            # /routing-table のシリアライズと圧縮（1万〜100万ルート）
+
+127.0.0.0/8 全体がループバックになるLinuxを前提とする。
+"""
+import argparse
+import asyncio
+import contextlib
+import gc
+import importlib.util
+import json
+import logging
+import os
+import resource
+import socket
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple, get_args
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+try:
+    import uvicorn
+except ImportError:
+    uvicorn = None
+
+logger = logging.getLogger("router-bench")
+
+def load_module(name: str, filename: str):
+    """同じディレクトリのスクリプトを読み込む（ファイル名にハイフンを含むためimportlibを使う）"""
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), filename)
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+simulator = load_module("router_simulator", "router-simulator.py")
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def load_api(ssh_port: int, **settings: str):
+    """計測用の設定でAPIを読み込む（設定は読み込み時に環境変数から決まる）"""
+    os.environ["SSH_PORT"] = str(ssh_port)
+    os.environ.update(settings)
+    return simulator.load_api()
+
+@contextlib.asynccontextmanager
+async def running(api, routers, args):
+    """仮想ルーターとAPIを起動し、全ルーターに /connect 済みのクライアントを返す"""
+    if httpx is None or uvicorn is None:
+        raise RuntimeError("httpx and uvicorn are required (pip install httpx uvicorn)")
+    fleet = simulator.Simulator(routers, int(os.environ["SSH_PORT"]))
+    await fleet.start()
+    api_port = free_port()
+    server = uvicorn.Server(uvicorn.Config(api.app, host="127.0.0.1", port=api_port, log_level="warning"))
+    thread = threading.Thread(target=server.run, name="api", daemon=True)
+    thread.start()
+    try:
+        while not server.started:
+            if not thread.is_alive():
+                raise RuntimeError("API server failed to start")
+            await asyncio.sleep(0.05)
+        limits = httpx.Limits(max_connections=1000, max_keepalive_connections=1000)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{api_port}", timeout=args.timeout, limits=limits) as client:
+            for router in routers:
+                response = await client.post("/connect", json={
+                    "ip": router.ip, "username": args.username, "password": args.password, "vendor": router.vendor,
+                })
+                if not response.json().get("success"):
+                    raise RuntimeError(f"Failed to connect to {router.ip}: {response.json().get('message')}")
+            yield client
+    finally:
+        server.should_exit = True
+        await asyncio.to_thread(thread.join)
+        await fleet.stop()
+
+async def timed(client, path: str, **params) -> Tuple[bool, float]:
+    started = time.perf_counter()
+    try:
+        response = await client.get(path, params=params)
+        ok = response.status_code < 400
+    except httpx.HTTPError:
+        ok = False
+    return ok, time.perf_counter() - started
+
+async def repeat(deadline: float, request) -> List[Tuple[bool, float]]:
+    """期限まで request() を繰り返し、結果を集める"""
+    results = []
+    while time.perf_counter() < deadline:
+        results.append(await request())
+    return results
+
+# トレースルート実行中の応答時間（SSH処理をイベントループ外で実行する効果）
+async def run_ssh_inline(ip, func, *args, **kwargs):
+    """スレッドプールを使わずにSSH処理を実行（イベントループ外で実行する前の動作）"""
+    return func(*args, **kwargs)
+
+async def bench_load(args):
+    """/interfaces をポーリングしながらトレースルートを並行して実行し、応答時間を比較
+
+    idle はトレースルートなし、traceroutes-inline はSSH処理をイベントループ上で実行した場合（paramikoのみ）。
+    """
+    api = load_api(free_port() if args.ssh_port is None else args.ssh_port, SSH_BACKEND=args.backend)
+    settings = simulator.SimulatorSettings(
+        interfaces=args.interfaces, latency=args.latency, jitter=0, probe_interval=args.probe_interval, seed=args.seed
+    )
+    routers = simulator.build_fleet(args.routers, args.network, [args.vendor], settings)
+    phases = [("idle", 0, False), ("traceroutes", args.traceroutes, False)]
+    if api.ssh_backend.name == "paramiko":
+        phases.append(("traceroutes-inline", args.traceroutes, True))
+
+    async with running(api, routers, args) as client:
+        async def interfaces(worker: int):
+            router = routers[worker % len(routers)]
+            return await timed(client, f"/router/{router.ip}/interfaces", fresh="true")
+
+        async def traceroute(worker: int):
+            router = routers[-1 - worker % len(routers)]
+            return await timed(client, f"/router/{router.ip}/traceroute", target=f"198.51.100.{worker % 250 + 1}")
+
+        original = api.run_ssh
+        for name, traceroutes, inline in phases:
+            api.run_ssh = run_ssh_inline if inline else original
+            try:
+                started = time.perf_counter()
+                deadline = started + args.duration
+                results = await asyncio.gather(
+                    *(repeat(deadline, lambda i=i: interfaces(i)) for i in range(args.concurrency)),
+                    *(repeat(deadline, lambda i=i: traceroute(i)) for i in range(traceroutes)),
+                )
+                elapsed = time.perf_counter() - started
+            finally:
+                api.run_ssh = original
+            simulator.report(f"interfaces/{name}", [r for rs in results[:args.concurrency] for r in rs], elapsed)
+            if traceroutes:
+                simulator.report(f"traceroute/{name}", [r for rs in results[args.concurrency:] for r in rs], elapsed)
+
+# インターフェース詳細の取得方式の比較
+async def bench_detail_modes(args):
+    """detail_mode ごとに全ルーターの /interfaces を取得して応答時間を比較
+
+    errors には最初の方式と異なる結果を返したリクエストも含む。
+    """
+    api = load_api(free_port() if args.ssh_port is None else args.ssh_port, SSH_BACKEND=args.backend)
+    settings = simulator.SimulatorSettings(interfaces=args.interfaces, latency=args.latency, jitter=0, seed=args.seed)
+    vendors = [vendor.strip() for vendor in args.vendors.split(",")]
+    routers = simulator.build_fleet(args.routers, args.network, vendors, settings)
+    semaphore = asyncio.Semaphore(args.concurrency)
+    expected = {}
+
+    async with running(api, routers, args) as client:
+        async def call(router, mode: str) -> Tuple[bool, float]:
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    response = await client.get(
+                        f"/router/{router.ip}/interfaces", params={"detail_mode": mode, "fresh": "true"}
+                    )
+                    ok = response.status_code < 400
+                    if ok:
+                        data = response.json()
+                        ok = expected.setdefault(router.ip, data) == data
+                except httpx.HTTPError:
+                    ok = False
+                return ok, time.perf_counter() - started
+
+        for mode in get_args(api.InterfaceDetailMode):
+            started = time.perf_counter()
+            results = await asyncio.gather(*(call(router, mode) for _ in range(args.rounds) for router in routers))
+            simulator.report(f"interfaces/{mode}", results, time.perf_counter() - started)
+
+# 巨大なルーティングテーブルを取得・解析するときのメモリ使用量
+# ピークRSSはプロセス内で戻せないため、方式ごとに子プロセスで計測する
+def rss_bytes() -> int:
+    """現在のRSS（Linuxの /proc/self/statm から）"""
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+def peak_rss_bytes() -> int:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+async def read_buffered(api, ip: str, vendor, command: str, timeout: float):
+    """出力全体を文字列として受け取ってから解析（行イテレータを使う前の動作）"""
+    result = await api.ssh_backend.execute(ip, command, timeout)
+    if not result["success"]:
+        raise RuntimeError(f"{command} failed: {result['output']}")
+    return api.parse_routes(result["output"], vendor), result.get("truncated", False)
+
+async def execute_lines(api, ip: str, command: str, consumer, timeout: float):
+    result = await api.ssh_backend.execute_lines(ip, command, consumer, timeout)
+    if not result["success"]:
+        raise RuntimeError(f"{command} failed: {result['output']}")
+    return result["data"], result["truncated"]
+
+async def read_lines(api, ip: str, vendor, command: str, timeout: float):
+    """受信した行を順に解析し、出力全体を文字列として持たない"""
+    return await execute_lines(api, ip, command, lambda lines: api.parse_routes(lines, vendor), timeout)
+
+async def read_dicts(api, ip: str, vendor, command: str, timeout: float):
+    """受信した行を順に解析し、ルートを辞書のリストとして持つ（RouteTableを使う前の表現）"""
+    parser = api.get_parser(vendor)
+    return await execute_lines(api, ip, command, lambda lines: list(parser.parse_routes(lines)), timeout)
+
+MEMORY_CASES = {
+    "buffered": read_buffered,
+    "lines": read_lines,
+    "dicts": read_dicts,
+}
+
+async def measure_memory(args) -> Dict[str, Any]:
+    """1つの方式でルーティングテーブルを取得・解析し、前後のRSSを返す（子プロセスで実行）"""
+    # 出力の上限で打ち切られると比較にならないため上限を上げる
+    api = load_api(free_port() if args.ssh_port is None else args.ssh_port,
+                   SSH_BACKEND=args.backend, SSH_MAX_OUTPUT_BYTES=str(1 << 30))
+    settings = simulator.SimulatorSettings(routes=args.routes, latency=0, jitter=0, seed=args.seed)
+    router = simulator.build_fleet(2, args.network, [args.vendor], settings)[0]
+    fleet = simulator.Simulator([router], int(os.environ["SSH_PORT"]))
+    await fleet.start()
+    try:
+        vendor = api.VendorType(router.vendor)
+        connected = await api.ssh_backend.connect(api.RouterInfo(
+            ip=router.ip, username=args.username, password=args.password, vendor=vendor,
+        ))
+        if not connected["success"]:
+            raise RuntimeError(f"Failed to connect to {router.ip}: {connected['message']}")
+        command = api.VENDOR_COMMANDS[vendor]["routing_table"]
+
+        gc.collect()
+        before = rss_bytes()
+        started = time.perf_counter()
+        table, truncated = await MEMORY_CASES[args.case](api, router.ip, vendor, command, args.timeout)
+        elapsed = time.perf_counter() - started
+        gc.collect()
+        return {
+            "case": args.case,
+            "routes": len(table),
+            "truncated": truncated,
+            "seconds": elapsed,
+            "rss_before": before,
+            "rss_peak": peak_rss_bytes(),
+            "rss_after": rss_bytes(),
+        }
+    finally:
+        await api.ssh_backend.close_all()
+        await fleet.stop()
+
+async def bench_memory(args):
+    """方式ごとに子プロセスを起動し、RSSの変化を並べて表示"""
+    if args.case:
+        print(json.dumps(await measure_memory(args)))
+        return
+    for case in MEMORY_CASES:
+        command = [
+            sys.executable, os.path.abspath(__file__), "memory", "--case", case,
+            "--routes", str(args.routes), "--vendor", args.vendor, "--backend", args.backend,
+            "--network", args.network, "--timeout", str(args.timeout), "--seed", str(args.seed),
+            "--username", args.username, "--password", args.password,
+        ]
+        if args.ssh_port is not None:
+            command += ["--ssh-port", str(args.ssh_port)]
+        process = await asyncio.create_subprocess_exec(*command, stdout=asyncio.subprocess.PIPE)
+        stdout, _ = await process.communicate()
+        if process.returncode != 0:
+            raise RuntimeError(f"memory case {case} failed with exit status {process.returncode}")
+        result = json.loads(stdout.decode().strip().splitlines()[-1])
+        mb = 1024 * 1024
+        print(
+            f"{case:<10} routes={result['routes']:<8} truncated={str(result['truncated']).lower():<5} "
+            f"seconds={result['seconds']:>6.1f} rss_before={result['rss_before'] / mb:>6.0f}MB "
+            f"rss_peak={result['rss_peak'] / mb:>6.0f}MB peak_increase={(result['rss_peak'] - result['rss_before']) / mb:>6.0f}MB "
+            f"retained={(result['rss_after'] - result['rss_before']) / mb:>6.0f}MB"
+        )
+
+# /routing-table のレスポンス生成（シリアライズと圧縮）
+def build_route_table(api, count: int, seed: int):
+    """仮想ルーターの show ip route を解析して count 件のルートテーブルを作る"""
+    settings = simulator.SimulatorSettings(routes=count, seed=seed)
+    router = simulator.build_fleet(2, "127.2.0.0/30", ["cisco"], settings)[0]
+    return api.parse_routes(simulator.render(router.profile.routes(router)), api.VendorType.CISCO)
+
+def encode_default(api, table) -> bytes:
+    """FastAPIの既定の変換（jsonable_encoder と標準のjson）"""
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse
+    return JSONResponse(jsonable_encoder(table.to_list())).body
+
+def encode_with(fast_json: bool, accept_encoding: Optional[str] = None):
+    """APIの json_response でエンコード（FAST_JSON と Accept-Encoding を指定）"""
+    def encode(api, table) -> bytes:
+        api.FAST_JSON = fast_json
+        return api.json_response(table, accept_encoding).body
+    return encode
+
+async def bench_json(args):
+    """ルート数ごとに、各方式でレスポンスの本文を作る時間とサイズを比較"""
+    api = load_api(free_port())
+    encoders = {
+        "fastapi": encode_default,
+        "json": encode_with(False),
+    }
+    if api.orjson is not None:
+        encoders["orjson"] = encode_with(True)
+    # 圧縮はorjson（未インストールの場合は標準のjson）でシリアライズした後に行う
+    encoders["gzip"] = encode_with(True, "gzip")
+    if api.brotli is not None:
+        encoders["br"] = encode_with(True, "br")
+    else:
+        logger.warning("brotli is not installed, skipping br")
+
+    fast_json = api.FAST_JSON
+    try:
+        for count in (int(size) for size in args.sizes.split(",")):
+            table = build_route_table(api, count, args.seed)
+            for name, encode in encoders.items():
+                timings = []
+                for _ in range(args.repeat):
+                    started = time.perf_counter()
+                    body = encode(api, table)
+                    timings.append(time.perf_counter() - started)
+                best = min(timings)
+                print(
+                    f"routes={len(table):<8} encoder={name:<8} seconds={best:>7.3f} "
+                    f"size={len(body) / 1e6:>8.2f}MB routes/s={len(table) / best:>10.0f}"
+                )
+    finally:
+        api.FAST_JSON = fast_json
+
+BENCHMARKS = {
+    "load": bench_load,
+    "detail-modes": bench_detail_modes,
+    "memory": bench_memory,
+    "json": bench_json,
+}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks for the router API against in-process virtual routers")
+    subparsers = parser.add_subparsers(dest="mode", required=True)
+
+    load_parser = subparsers.add_parser("load", help="p99 of /interfaces while traceroutes run")
+    load_parser.add_argument("--routers", type=int, default=10)
+    load_parser.add_argument("--vendor", default="cisco", choices=simulator.VENDORS)
+    load_parser.add_argument("--interfaces", type=int, default=8)
+    load_parser.add_argument("--latency", type=float, default=0.02, help="seconds before each command responds")
+    load_parser.add_argument("--probe-interval", type=float, default=0.5, help="seconds between traceroute hops")
+    load_parser.add_argument("--concurrency", type=int, default=4, help="clients polling /interfaces")
+    load_parser.add_argument("--traceroutes", type=int, default=8, help="traceroutes kept running")
+    load_parser.add_argument("--duration", type=float, default=10, help="seconds per phase")
+
+    modes_parser = subparsers.add_parser("detail-modes", help="compare serial/parallel/batched interface detail collection")
+    modes_parser.add_argument("--routers", type=int, default=10)
+    modes_parser.add_argument("--vendors", default=",".join(simulator.VENDORS), help="vendors assigned round-robin")
+    modes_parser.add_argument("--interfaces", type=int, default=48)
+    modes_parser.add_argument("--latency", type=float, default=0.02, help="seconds before each command responds")
+    modes_parser.add_argument("--concurrency", type=int, default=10)
+    modes_parser.add_argument("--rounds", type=int, default=3)
+
+    memory_parser = subparsers.add_parser("memory", help="peak RSS while fetching and parsing a large routing table")
+    memory_parser.add_argument("--routes", type=int, default=1000000)
+    memory_parser.add_argument("--vendor", default="cisco", choices=simulator.VENDORS)
+    memory_parser.add_argument("--case", choices=list(MEMORY_CASES), help=argparse.SUPPRESS)
+
+    json_parser = subparsers.add_parser("json", help="compare JSON serialisation and compression of routing tables")
+    json_parser.add_argument("--sizes", default="10000,100000,1000000", help="route counts to measure")
+    json_parser.add_argument("--repeat", type=int, default=3, help="runs per encoder (the fastest is reported)")
+
+    for subparser in subparsers.choices.values():
+        subparser.add_argument("--backend", default=os.getenv("SSH_BACKEND", "paramiko"), choices=["paramiko", "asyncssh"])
+        subparser.add_argument("--network", default="127.2.0.0/16", help="loopback network for the virtual routers")
+        subparser.add_argument("--ssh-port", type=int, help="port for the virtual routers (default: any free port)")
+        subparser.add_argument("--timeout", type=float, default=120)
+        subparser.add_argument("--username", default="admin")
+        subparser.add_argument("--password", default="admin")
+        subparser.add_argument("--seed", type=int, default=1)
+
+    args = parser.parse_args(argv)
+    # 計測中のリクエストごとのログは出さない
+    for name in ("router_api", "httpx", "paramiko"):
+        logging.getLogger(name).setLevel(logging.WARNING)
+    try:
+        asyncio.run(BENCHMARKS[args.mode](args))
+    except KeyboardInterrupt:
+        pass
+    except (RuntimeError, ValueError) as e:
+        logger.error(str(e))
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,1230 @@
+"""ルーターAPIの負荷試験・回帰試験用のSSHデバイスシミュレーター
+
+Cisco / Juniper / HP / Huawei / MikroTik のCLIを模倣する仮想ルーターを
+asyncioのSSHサーバー（asyncssh）として起動する。仮想ルーターごとにループバックの
+アドレス（既定では 127.1.0.1 から順に）を割り当てるため、APIからは実機と同じく
+IPアドレスで区別できる。APIは SSH_PORT を同じポートにして起動すること。
+
+    python router-simulator.py serve --count 1000 --port 2222 --inventory routers.json
+    SSH_PORT=2222 uvicorn router-api:app
+    python router-simulator.py bench --inventory routers.json --api http://127.0.0.1:8000
+    python router-simulator.py parsers  # ping/tracerouteパーサーの速度計測
+
+出力はシード値から決定的に生成されるため、同じ引数なら同じ内容になる。
+127.0.0.0/8 全体がループバックになるLinuxを前提とする。
+"""
+import argparse
+import asyncio
+import ipaddress
+import json
+import logging
+import random
+import re
+import statistics
+import sys
+import time
+import zlib
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import asyncssh
+except ImportError:  # serve で必要
+    asyncssh = None
+try:
+    import httpx
+except ImportError:  # bench で必要
+    httpx = None
+
+# ロギングの設定
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+)
+logger = logging.getLogger("router-simulator")
+# 数千台分のリスナー作成・接続ログは出さない
+logging.getLogger("asyncssh").setLevel(logging.WARNING)
+
+VENDORS = ["cisco", "juniper", "hp", "huawei", "mikrotik"]
+
+# 出力中でプローブ間隔だけ待つ位置（ping/tracerouteの応答ごと）
+PAUSE = object()
+# 一度に書き込む出力の目安
+WRITE_CHUNK_SIZE = 32768
+
+class SimulatorSettings:
+    """仮想ルーターの出力規模・遅延・障害注入の設定"""
+
+    def __init__(
+        self,
+        interfaces: int = 8,
+        fanout: int = 3,
+        routes: int = 50,
+        latency: float = 0.05,
+        jitter: float = 0.02,
+        probe_interval: float = 0.1,
+        packet_loss: float = 0.0,
+        command_failure_rate: float = 0.0,
+        disconnect_rate: float = 0.0,
+        hang_rate: float = 0.0,
+        auth_failure_rate: float = 0.0,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        seed: int = 1,
+    ):
+        self.interfaces = interfaces  # 1台あたりのインターフェース数（隣接リンクが多ければそちらに合わせる）
+        self.fanout = fanout  # 木構造のトポロジで1台がぶら下げる子の数
+        self.routes = routes  # 接続ルート以外に生成するルート数
+        self.latency = latency  # コマンドの応答までの遅延（秒）
+        self.jitter = jitter
+        self.probe_interval = probe_interval  # ping/tracerouteの応答間隔（秒）
+        self.packet_loss = packet_loss  # ping/tracerouteのプローブが失われる確率
+        self.command_failure_rate = command_failure_rate  # stderrにエラーを返す確率
+        self.disconnect_rate = disconnect_rate  # 出力の途中で接続を切る確率
+        self.hang_rate = hang_rate  # 応答しない確率（クライアントのタイムアウト試験用）
+        self.auth_failure_rate = auth_failure_rate
+        self.username = username  # 指定時のみ認証情報を検査する
+        self.password = password
+        self.seed = seed
+
+class VirtualRouter:
+    """1台の仮想ルーター"""
+
+    def __init__(self, index: int, ip: str, vendor: str, settings: SimulatorSettings):
+        self.index = index
+        self.ip = ip
+        self.vendor = vendor
+        self.profile = PROFILES[vendor]
+        self.settings = settings
+        self.hostname = f"{vendor[:2].upper()}-R{index}"
+        self.serial = f"SIM{zlib.crc32(f'{settings.seed}:{index}'.encode()):08X}"
+        self.rng = random.Random(settings.seed * 1000003 + index)
+        self.booted = time.time() - self.rng.randrange(3600, 90 * 86400)
+        # ポート番号 -> (隣接ルーター, 隣接側のポート番号)
+        self.links: Dict[int, Tuple["VirtualRouter", int]] = {}
+
+    @property
+    def port_count(self) -> int:
+        return max(self.settings.interfaces, max(self.links, default=-1) + 1)
+
+    def port_name(self, port: int) -> str:
+        return self.profile.port_name(port)
+
+    def port_address(self, port: int) -> Optional[Tuple[str, int]]:
+        """ポートのIPアドレスとプレフィックス長（未設定のポートはNone）"""
+        if port in self.links:
+            peer, _ = self.links[port]
+            # リンクごとに子ルーターの番号から /30 を割り当てる（親側が .1、子側が .2）
+            child = max(self.index, peer.index)
+            network = int(ipaddress.IPv4Address("10.0.0.0")) + child * 4
+            host = 1 if self.index < peer.index else 2
+            return str(ipaddress.IPv4Address(network + host)), 30
+        if port % 4 == 3:
+            return None
+        return f"192.168.{port}.1", 24
+
+    def port_up(self, port: int) -> bool:
+        return port in self.links or port % 4 != 3
+
+    def mac(self, port: int, separator: str = ":") -> str:
+        value = (0x0011 << 32) | ((self.index & 0xFFFFFF) << 8) | (port & 0xFF)
+        octets = [f"{(value >> shift) & 0xFF:02x}" for shift in range(40, -1, -8)]
+        if separator == ".":
+            return ".".join("".join(octets[i:i + 2]) for i in range(0, 6, 2))
+        if separator == "-":
+            return "-".join("".join(octets[i:i + 2]) for i in range(0, 6, 2))
+        return ":".join(octets).upper() if self.vendor == "mikrotik" else ":".join(octets)
+
+    def description(self, port: int) -> Optional[str]:
+        if port in self.links:
+            peer, peer_port = self.links[port]
+            return f"to {peer.hostname} {peer.port_name(peer_port)}"
+        return None
+
+    def uplink(self) -> Optional[Tuple["VirtualRouter", int, int]]:
+        """既定経路の次ホップ（親ルーター）を (隣接ルーター, 自ポート, 隣接ポート) で返す"""
+        if 0 in self.links and self.links[0][0].index < self.index:
+            peer, peer_port = self.links[0]
+            return peer, 0, peer_port
+        return None
+
+    def uptime(self) -> Tuple[int, int, int, int]:
+        seconds = int(time.time() - self.booted)
+        return seconds // 86400, seconds % 86400 // 3600, seconds % 3600 // 60, seconds % 60
+
+    def connected_routes(self) -> Iterator[Tuple[str, int, int]]:
+        """(ネットワーク, プレフィックス長, ポート) を返す"""
+        for port in range(self.port_count):
+            address = self.port_address(port)
+            if address and self.port_up(port):
+                network = ipaddress.IPv4Network(f"{address[0]}/{address[1]}", strict=False)
+                yield str(network.network_address), address[1], port
+
+    def generated_routes(self) -> Iterator[Tuple[str, int, str, int]]:
+        """設定数の /24 ルートを (宛先, プレフィックス長, 次ホップ, ポート) で返す"""
+        linked = sorted(self.links)
+        if not linked:
+            return
+        base = int(ipaddress.IPv4Address("11.0.0.0"))
+        for k in range(self.settings.routes):
+            port = linked[(k * 2654435761 + self.index) % len(linked)]
+            peer, peer_port = self.links[port]
+            yield str(ipaddress.IPv4Address(base + k * 256)), 24, peer.port_address(peer_port)[0], port
+
+    def trace_path(self, target: str) -> List[Optional[str]]:
+        """宛先までの経路（Noneはタイムアウト）"""
+        hops = 2 + zlib.crc32(target.encode()) % 4
+        uplink = self.uplink()
+        first = uplink[0].port_address(uplink[2])[0] if uplink else "10.255.255.1"
+        path = [first] + [f"203.0.113.{(zlib.crc32(target.encode()) + i) % 250 + 1}" for i in range(1, hops)] + [target]
+        return [None if self.rng.random() < self.settings.packet_loss else hop for hop in path]
+
+    def rtt(self, hop: int = 1) -> float:
+        return round(0.5 + hop * 1.5 + self.rng.random() * 2, 3)
+
+def build_fleet(count: int, network: str, vendors: List[str], settings: SimulatorSettings) -> List[VirtualRouter]:
+    """仮想ルーターを作成し、fanout分岐の木構造で隣接関係を張る"""
+    hosts = ipaddress.IPv4Network(network).hosts()
+    routers = []
+    for index in range(count):
+        try:
+            ip = str(next(hosts))
+        except StopIteration:
+            raise ValueError(f"{network} has fewer than {count} host addresses")
+        routers.append(VirtualRouter(index, ip, vendors[index % len(vendors)], settings))
+
+    fanout = max(settings.fanout, 1)
+    for child in routers[1:]:
+        parent = routers[(child.index - 1) // fanout]
+        parent_port = (child.index - 1) % fanout + 1
+        child.links[0] = (parent, parent_port)
+        parent.links[parent_port] = (child, 0)
+    return routers
+
+# ベンダーごとのCLI
+PROFILES: Dict[str, "DeviceProfile"] = {}
+
+def register_profile(cls):
+    """CLIプロファイルをベンダーに登録するデコレーター"""
+    PROFILES[cls.vendor] = cls()
+    return cls
+
+class DeviceProfile:
+    """コマンドとその出力を生成するメソッドの対応
+
+    COMMANDS は (正規表現, メソッド名) の一覧。メソッドは出力の断片を返すジェネレーターで、
+    PAUSE を返した位置ではプローブ間隔だけ待つ。
+    """
+    vendor = ""
+    banner = "OpenSSH_8.0"
+    model = ""
+    platform = ""
+    COMMANDS: List[Tuple[str, str]] = []
+
+    def __init__(self):
+        self.commands = [(re.compile(pattern), getattr(self, method)) for pattern, method in self.COMMANDS]
+
+    def port_name(self, port: int) -> str:
+        return f"eth{port}"
+
+    def prompt(self, router: VirtualRouter) -> str:
+        return f"{router.hostname}#"
+
+    def error(self, command: str) -> str:
+        return f"% Invalid input: {command}\n"
+
+    def run(self, router: VirtualRouter, command: str) -> Iterator[Any]:
+        for pattern, method in self.commands:
+            match = pattern.fullmatch(command.strip())
+            if match:
+                return method(router, **{k: v for k, v in match.groupdict().items() if v is not None})
+        return iter([self.error(command)])
+
+    def find_port(self, router: VirtualRouter, name: str) -> Optional[int]:
+        for port in range(router.port_count):
+            if self.port_name(port).lower() == name.lower():
+                return port
+        return None
+
+@register_profile
+class CiscoProfile(DeviceProfile):
+    vendor = "cisco"
+    banner = "Cisco-1.25"
+    model = "C891F"
+    platform = "cisco C891F"
+    COMMANDS = [
+        (r"show version", "version"),
+        (r"show ip interface brief", "interfaces"),
+        (r"show interfaces(?: (?P<name>\S+))?", "interface_detail"),
+        (r"show ip route", "routes"),
+        (r"show cdp neighbors detail", "neighbors"),
+        (r"show run(?:ning-config)?", "config"),
+        (r"ping (?P<target>\S+)(?: repeat (?P<count>\d+))?", "ping"),
+        (r"traceroute (?P<target>\S+)", "traceroute"),
+    ]
+
+    def port_name(self, port):
+        return f"GigabitEthernet0/{port}"
+
+    def error(self, command):
+        return f"{command}\n^\n% Invalid input detected at '^' marker.\n"
+
+    def version(self, router):
+        days, hours, minutes, _ = router.uptime()
+        yield (
+            "Cisco IOS Software, C800 Software (C800-UNIVERSALK9-M), Version 15.7(3)M2, RELEASE SOFTWARE (fc1)\n"
+            "Technical Support: http://www.cisco.com/techsupport\n"
+            "ROM: System Bootstrap, Version 15.7(3r)M2, RELEASE SOFTWARE (fc1)\n\n"
+            f"{router.hostname} uptime is {days} days, {hours} hours, {minutes} minutes\n"
+            "System returned to ROM by power-on\n"
+            "System image file is \"flash:c800-universalk9-mz.SPA.157-3.M2.bin\"\n\n"
+            f"cisco {self.model} (revision 1.0) with 488524K/35763K bytes of memory.\n"
+            f"Processor board ID {router.serial}\n"
+            f"{router.port_count} Gigabit Ethernet interfaces\n"
+            "Configuration register is 0x2102\n"
+        )
+
+    def interfaces(self, router):
+        yield "Interface              IP-Address      OK? Method Status                Protocol\n"
+        for port in range(router.port_count):
+            address = router.port_address(port)
+            status = "up                    up" if router.port_up(port) else "administratively down down"
+            yield f"{self.port_name(port):<23}{address[0] if address else 'unassigned':<16}YES NVRAM  {status}\n"
+
+    def interface_detail(self, router, name=None):
+        ports = range(router.port_count) if name is None else [self.find_port(router, name)]
+        for port in ports:
+            if port is None:
+                yield f"                  ^\n% Invalid input detected at '^' marker.\n"
+                return
+            up = router.port_up(port)
+            address = router.port_address(port)
+            yield f"{self.port_name(port)} is {'up' if up else 'administratively down'}, line protocol is {'up' if up else 'down'}\n"
+            yield f"  Hardware is iGbE, address is {router.mac(port, '.')} (bia {router.mac(port, '.')})\n"
+            if router.description(port):
+                yield f"  Description: {router.description(port)}\n"
+            if address:
+                yield f"  Internet address is {address[0]}/{address[1]}\n"
+            yield "  MTU 1500 bytes, BW 1000000 Kbit/sec, DLY 10 usec,\n"
+            yield "     reliability 255/255, txload 1/255, rxload 1/255\n"
+            yield "  Encapsulation ARPA, loopback not set\n"
+            yield "  Full-duplex, 1000Mb/s, media type is RJ45\n"
+
+    def routes(self, router):
+        yield (
+            "Codes: L - local, C - connected, S - static, R - RIP, M - mobile, B - BGP\n"
+            "       D - EIGRP, EX - EIGRP external, O - OSPF, IA - OSPF inter area\n\n"
+        )
+        uplink = router.uplink()
+        if uplink:
+            gateway = uplink[0].port_address(uplink[2])[0]
+            yield f"Gateway of last resort is {gateway} to network 0.0.0.0\n\n"
+            yield f"S*    0.0.0.0/0 [1/0] via {gateway}\n"
+        else:
+            yield "Gateway of last resort is not set\n\n"
+        for network, prefix, port in router.connected_routes():
+            yield f"C     {network}/{prefix} is directly connected, {self.port_name(port)}\n"
+        for network, prefix, next_hop, _ in router.generated_routes():
+            yield f"S     {network}/{prefix} [1/0] via {next_hop}\n"
+
+    def neighbors(self, router):
+        for port, (peer, peer_port) in sorted(router.links.items()):
+            yield (
+                "-------------------------\n"
+                f"Device ID: {peer.hostname}\n"
+                "Entry address(es): \n"
+                f"  IP address: {peer.ip}\n"
+                f"Platform: {peer.profile.platform},  Capabilities: Router \n"
+                f"Interface: {self.port_name(port)},  Port ID (outgoing port): {peer.port_name(peer_port)}\n"
+                "Holdtime : 150 sec\n\n"
+            )
+
+    def config(self, router):
+        yield f"Building configuration...\n\nCurrent configuration : 2048 bytes\n!\nversion 15.7\nhostname {router.hostname}\n!\n"
+        for port in range(router.port_count):
+            address = router.port_address(port)
+            yield f"interface {self.port_name(port)}\n"
+            if router.description(port):
+                yield f" description {router.description(port)}\n"
+            if address:
+                netmask = ipaddress.IPv4Network(f"0.0.0.0/{address[1]}").netmask
+                yield f" ip address {address[0]} {netmask}\n"
+            else:
+                yield " no ip address\n shutdown\n"
+            yield "!\n"
+        uplink = router.uplink()
+        if uplink:
+            yield f"ip route 0.0.0.0 0.0.0.0 {uplink[0].port_address(uplink[2])[0]}\n"
+        yield "!\nend\n"
+
+    def ping(self, router, target, count="5"):
+        count = int(count)
+        yield f"Type escape sequence to abort.\nSending {count}, 100-byte ICMP Echos to {target}, timeout is 2 seconds:\n"
+        rtts = []
+        for _ in range(count):
+            yield PAUSE
+            if router.rng.random() < router.settings.packet_loss:
+                yield "."
+            else:
+                rtts.append(router.rtt())
+                yield "!"
+        received = len(rtts)
+        summary = f"\nSuccess rate is {received * 100 // count} percent ({received}/{count})"
+        if rtts:
+            summary += f", round-trip min/avg/max = {round(min(rtts))}/{round(sum(rtts) / received)}/{round(max(rtts))} ms"
+        yield summary + "\n"
+
+    def traceroute(self, router, target):
+        yield f"Type escape sequence to abort.\nTracing the route to {target}\nVRF info: (vrf in name/id, vrf out name/id)\n"
+        for hop, address in enumerate(router.trace_path(target), 1):
+            yield PAUSE
+            if address is None:
+                yield f"  {hop} * * *\n"
+            else:
+                yield f"  {hop} {address} {round(router.rtt(hop))} msec {round(router.rtt(hop))} msec {round(router.rtt(hop))} msec\n"
+
+@register_profile
+class JuniperProfile(DeviceProfile):
+    vendor = "juniper"
+    banner = "OpenSSH_7.5"  # Junosはバナーで判別できない
+    model = "mx204"
+    platform = "Juniper Networks MX204"
+    COMMANDS = [
+        (r"show version", "version"),
+        (r"show interfaces terse", "interfaces"),
+        (r"show interfaces(?: (?P<name>\S+))? detail", "interface_detail"),
+        (r"show route", "routes"),
+        (r"show lldp neighbors", "neighbors"),
+        (r"show configuration", "config"),
+        (r"ping (?P<target>\S+)(?: count (?P<count>\d+))?", "ping"),
+        (r"traceroute (?P<target>\S+)", "traceroute"),
+    ]
+
+    def port_name(self, port):
+        return f"ge-0/0/{port}"
+
+    def prompt(self, router):
+        return f"admin@{router.hostname}> "
+
+    def error(self, command):
+        return f"{' ' * len(command.split()[0]) if command.split() else ''}^\nunknown command.\n"
+
+    def version(self, router):
+        yield (
+            f"Hostname: {router.hostname}\n"
+            f"Model: {self.model}\n"
+            "Junos: 21.4R3.15\n"
+            "JUNOS OS Kernel 64-bit  [20230111.9fcf7a8_builder_stable_12]\n"
+            "JUNOS OS libs [20230111.9fcf7a8_builder_stable_12]\n"
+            "JUNOS Base OS boot [21.4R3.15]\n"
+        )
+
+    def interfaces(self, router):
+        yield "Interface               Admin Link Proto    Local                 Remote\n"
+        for port in range(router.port_count):
+            address = router.port_address(port)
+            state = "up    up  " if router.port_up(port) else "down  down"
+            yield f"{self.port_name(port):<24}{state}\n"
+            if address:
+                yield f"{self.port_name(port) + '.0':<24}{state} inet     {address[0]}/{address[1]}\n"
+
+    def interface_detail(self, router, name=None):
+        ports = range(router.port_count) if name is None else [self.find_port(router, name)]
+        for port in ports:
+            if port is None:
+                yield f"error: device {name} not found\n"
+                return
+            up = router.port_up(port)
+            yield f"Physical interface: {self.port_name(port)}, {'Enabled' if up else 'Administratively down'}, Physical link is {'Up' if up else 'Down'}\n"
+            yield f"  Interface index: {148 + port}, SNMP ifIndex: {526 + port}, Generation: {151 + port}\n"
+            if router.description(port):
+                yield f"  Description: {router.description(port)}\n"
+            yield "  Link-level type: Ethernet, MTU: 1514, Link-mode: Full-duplex, Speed: 1000mbps, BPDU Error: None,\n"
+            yield f"  Current address: {router.mac(port)}, Hardware address: {router.mac(port)}\n\n"
+
+    def routes(self, router):
+        connected = list(router.connected_routes())
+        total = len(connected) * 2 + router.settings.routes + (1 if router.uplink() else 0)
+        yield f"\ninet.0: {total} destinations, {total} routes ({total} active, 0 holddown, 0 hidden)\n+ = Active Route, - = Last Active, * = Both\n\n"
+        uplink = router.uplink()
+        if uplink:
+            yield f"0.0.0.0/0          *[Static/5] 5d 02:11:12\n                    >  to {uplink[0].port_address(uplink[2])[0]} via {self.port_name(0)}.0\n"
+        for network, prefix, port in connected:
+            yield f"{network + '/' + str(prefix):<19}*[Direct/0] 5d 02:11:12\n                    >  via {self.port_name(port)}.0\n"
+            yield f"{router.port_address(port)[0] + '/32':<19}*[Local/0] 5d 02:11:12\n                       Local via {self.port_name(port)}.0\n"
+        for network, prefix, next_hop, port in router.generated_routes():
+            yield f"{network + '/' + str(prefix):<19}*[Static/5] 5d 02:11:12\n                    >  to {next_hop} via {self.port_name(port)}.0\n"
+
+    def neighbors(self, router):
+        # 実機と同じ表形式（管理アドレスは含まれない）
+        yield "Local Interface    Parent Interface    Chassis Id          Port info          System Name\n"
+        for port, (peer, peer_port) in sorted(router.links.items()):
+            yield f"{self.port_name(port):<19}{'-':<20}{peer.mac(0):<20}{peer.port_name(peer_port):<19}{peer.hostname}\n"
+
+    def config(self, router):
+        yield f"system {{\n    host-name {router.hostname};\n}}\ninterfaces {{\n"
+        for port in range(router.port_count):
+            address = router.port_address(port)
+            yield f"    {self.port_name(port)} {{\n"
+            if router.description(port):
+                yield f"        description \"{router.description(port)}\";\n"
+            if address:
+                yield f"        unit 0 {{\n            family inet {{\n                address {address[0]}/{address[1]};\n            }}\n        }}\n"
+            else:
+                yield "        disable;\n"
+            yield "    }\n"
+        yield "}\n"
+
+    def ping(self, router, target, count="5"):
+        count = int(count)
+        yield f"PING {target} ({target}): 56 data bytes\n"
+        rtts = []
+        for seq in range(count):
+            yield PAUSE
+            if router.rng.random() >= router.settings.packet_loss:
+                rtts.append(router.rtt())
+                yield f"64 bytes from {target}: icmp_seq={seq} ttl=62 time={rtts[-1]:.3f} ms\n"
+        loss = round((count - len(rtts)) * 100 / count)
+        yield f"\n--- {target} ping statistics ---\n{count} packets transmitted, {len(rtts)} packets received, {loss}% packet loss\n"
+        if rtts:
+            yield f"round-trip min/avg/max/stddev = {min(rtts):.3f}/{sum(rtts) / len(rtts):.3f}/{max(rtts):.3f}/{statistics.pstdev(rtts):.3f} ms\n"
+
+    def traceroute(self, router, target):
+        yield f"traceroute to {target} ({target}), 30 hops max, 52 byte packets\n"
+        for hop, address in enumerate(router.trace_path(target), 1):
+            yield PAUSE
+            if address is None:
+                yield f"{hop:>2}  * * *\n"
+            else:
+                yield f"{hop:>2}  {address} ({address})  {router.rtt(hop):.3f} ms  {router.rtt(hop):.3f} ms  {router.rtt(hop):.3f} ms\n"
+
+class VrpStyleProfile(DeviceProfile):
+    """HP Comware / Huawei VRP 共通（displayコマンド系）"""
+    lldp_header = "LLDP neighbor-information of port {number}[{name}]:\n"
+
+    def prompt(self, router):
+        return f"<{router.hostname}>"
+
+    def routes(self, router):
+        connected = list(router.connected_routes())
+        total = len(connected) + router.settings.routes + (1 if router.uplink() else 0)
+        yield (
+            "Route Flags: R - relay, D - download to fib\n"
+            "------------------------------------------------------------------------------\n"
+            "Routing Tables: Public\n"
+            f"         Destinations : {total}       Routes : {total}\n\n"
+            "Destination/Mask    Proto   Pre  Cost      Flags NextHop         Interface\n\n"
+        )
+        uplink = router.uplink()
+        if uplink:
+            yield f"{'0.0.0.0/0':<20}Static  60   0           RD  {uplink[0].port_address(uplink[2])[0]:<16}{self.port_name(0)}\n"
+        for network, prefix, port in connected:
+            yield f"{network + '/' + str(prefix):<20}Direct  0    0           D   {router.port_address(port)[0]:<16}{self.port_name(port)}\n"
+        for network, prefix, next_hop, port in router.generated_routes():
+            yield f"{network + '/' + str(prefix):<20}Static  60   0           RD  {next_hop:<16}{self.port_name(port)}\n"
+
+    def error(self, command):
+        return f"{' ' * len(command)}^\n Error: Unrecognized command found at '^' position.\n"
+
+    def ping(self, router, target, count="5"):
+        count = int(count)
+        yield f"  PING {target}: 56  data bytes, press CTRL_C to break\n"
+        rtts = []
+        for seq in range(1, count + 1):
+            yield PAUSE
+            if router.rng.random() < router.settings.packet_loss:
+                yield "    Request time out\n"
+            else:
+                rtts.append(round(router.rtt()))
+                yield f"    Reply from {target}: bytes=56 Sequence={seq} ttl=254 time={rtts[-1]} ms\n"
+        loss = (count - len(rtts)) * 100 / count
+        yield f"\n  --- {target} ping statistics ---\n    {count} packet(s) transmitted\n    {len(rtts)} packet(s) received\n    {loss:.2f}% packet loss\n"
+        if rtts:
+            yield f"    round-trip min/avg/max = {min(rtts)}/{round(sum(rtts) / len(rtts))}/{max(rtts)} ms\n"
+
+    def traceroute(self, router, target):
+        yield f" traceroute to  {target}({target}), max hops: 30 ,packet length: 40,press CTRL_C to break\n"
+        for hop, address in enumerate(router.trace_path(target), 1):
+            yield PAUSE
+            if address is None:
+                yield f" {hop} * * *\n"
+            else:
+                yield f" {hop} {address} {round(router.rtt(hop))} ms  {round(router.rtt(hop))} ms  {round(router.rtt(hop))} ms\n"
+
+@register_profile
+class HPProfile(VrpStyleProfile):
+    vendor = "hp"
+    banner = "Comware-7.1.064"
+    model = "FlexNetwork MSR2003"
+    platform = "HPE FlexNetwork MSR2003"
+    COMMANDS = [
+        (r"display version", "version"),
+        (r"display interface brief", "interfaces"),
+        (r"display interface(?: (?P<name>\S+))?", "interface_detail"),
+        (r"display ip routing-table", "routes"),
+        (r"display lldp neighbor(?:-information)?", "neighbors"),
+        (r"display current-configuration", "config"),
+        (r"ping(?: -c (?P<count>\d+))? (?P<target>\S+)", "ping"),
+        (r"tracert (?P<target>\S+)", "traceroute"),
+    ]
+
+    def port_name(self, port):
+        return f"GigabitEthernet0/{port}"
+
+    def version(self, router):
+        days, hours, minutes, _ = router.uptime()
+        yield (
+            "HPE Comware Software, Version 7.1.064, Release 0821P11\n"
+            "Copyright (c) 2010-2019 Hewlett Packard Enterprise Development LP\n"
+            f"HPE {self.model} uptime is {days // 7} weeks, {days % 7} days, {hours} hours, {minutes} minutes\n"
+            "Last reboot reason : User reboot\n"
+        )
+
+    def interfaces(self, router):
+        yield (
+            "Brief information on interfaces in route mode:\n"
+            "Link: ADM - administratively down; Stby - standby\n"
+            "Protocol: (s) - spoofing\n"
+            "Interface            Link Protocol Primary IP      Description\n"
+        )
+        for port in range(router.port_count):
+            address = router.port_address(port)
+            link = "UP   UP      " if router.port_up(port) else "ADM  DOWN    "
+            yield f"{self.port_name(port):<21}{link} {address[0] if address else '--':<16}{router.description(port) or ''}\n"
+
+    def interface_detail(self, router, name=None):
+        ports = range(router.port_count) if name is None else [self.find_port(router, name)]
+        for port in ports:
+            if port is None:
+                yield self.error(f"display interface {name}")
+                return
+            up = router.port_up(port)
+            address = router.port_address(port)
+            yield f"{self.port_name(port)}\nCurrent state: {'UP' if up else 'Administratively DOWN'}\nLine protocol state: {'UP' if up else 'DOWN'}\n"
+            yield f"Description: {router.description(port) or self.port_name(port) + ' Interface'}\n"
+            yield "Bandwidth: 1000000 kbps\nMaximum transmission unit: 1500\n"
+            if address:
+                yield f"Internet address: {address[0]}/{address[1]} (primary)\n"
+            yield f"IP packet frame type: Ethernet II, hardware address: {router.mac(port, '-')}\n"
+            yield "Media type: twisted pair, Port hardware type: 1000_BASE_T\n1000Mbps-speed mode, full-duplex mode\n\n"
+
+    def neighbors(self, router):
+        for port, (peer, peer_port) in sorted(router.links.items()):
+            yield (
+                f"LLDP neighbor-information of port {port + 1}[{self.port_name(port)}]:\n"
+                "LLDP agent nearest-bridge:\n"
+                " LLDP neighbor index : 1\n"
+                " Chassis type        : MAC address\n"
+                f" Chassis ID          : {peer.mac(0, '-')}\n"
+                " Port ID type        : Interface name\n"
+                f" Port ID             : {peer.port_name(peer_port)}\n"
+                f" System name         : {peer.hostname}\n"
+                f" System description  : {peer.profile.platform}, Software Version 1.0\n"
+                " Management address type : IPv4\n"
+                f" Management address  : {peer.ip}\n\n"
+            )
+
+    def config(self, router):
+        yield f"#\n version 7.1.064, Release 0821P11\n#\n sysname {router.hostname}\n#\n"
+        for port in range(router.port_count):
+            address = router.port_address(port)
+            yield f"interface {self.port_name(port)}\n"
+            if router.description(port):
+                yield f" description {router.description(port)}\n"
+            if address:
+                yield f" ip address {address[0]} {address[1]}\n"
+            else:
+                yield " shutdown\n"
+            yield "#\n"
+        yield "return\n"
+
+    def ping(self, router, target, count="5"):
+        # Comware はBSD形式に近い（Huaweiとは形式が異なる）
+        count = int(count)
+        yield f"Ping {target} ({target}): 56 data bytes, press CTRL_C to break\n"
+        rtts = []
+        for seq in range(count):
+            yield PAUSE
+            if router.rng.random() < router.settings.packet_loss:
+                yield "Request time out\n"
+            else:
+                rtts.append(router.rtt())
+                yield f"56 bytes from {target}: icmp_seq={seq} ttl=254 time={rtts[-1]:.3f} ms\n"
+        loss = (count - len(rtts)) * 100 / count
+        yield f"\n--- Ping statistics for {target} ---\n{count} packet(s) transmitted, {len(rtts)} packet(s) received, {loss:.1f}% packet loss\n"
+        if rtts:
+            yield (
+                f"round-trip min/avg/max/std-dev = {min(rtts):.3f}/{sum(rtts) / len(rtts):.3f}/"
+                f"{max(rtts):.3f}/{statistics.pstdev(rtts):.3f} ms\n"
+            )
+
+    def traceroute(self, router, target):
+        yield f"traceroute to {target} ({target}), 30 hops at most, 40 bytes each packet, press CTRL_C to break\n"
+        for hop, address in enumerate(router.trace_path(target), 1):
+            yield PAUSE
+            if address is None:
+                yield f" {hop}  * * *\n"
+            else:
+                yield f" {hop}  {address} ({address})  {router.rtt(hop):.3f} ms  {router.rtt(hop):.3f} ms  {router.rtt(hop):.3f} ms\n"
+
+@register_profile
+class HuaweiProfile(VrpStyleProfile):
+    vendor = "huawei"
+    banner = "HUAWEI-1.5"
+    model = "NE40E-X8"
+    platform = "Huawei NE40E-X8"
+    COMMANDS = [
+        (r"display version", "version"),
+        (r"display ip interface brief", "interfaces"),
+        (r"display interface(?: (?P<name>\S+))?", "interface_detail"),
+        (r"display ip routing-table", "routes"),
+        (r"display lldp neighbor", "neighbors"),
+        (r"display current-configuration", "config"),
+        (r"ping(?: -c (?P<count>\d+))? (?P<target>\S+)", "ping"),
+        (r"tracert (?P<target>\S+)", "traceroute"),
+    ]
+
+    def port_name(self, port):
+        return f"GigabitEthernet0/0/{port}"
+
+    def version(self, router):
+        days, hours, minutes, _ = router.uptime()
+        yield (
+            "Huawei Versatile Routing Platform Software\n"
+            "VRP (R) software, Version 8.180 (NE40E V800R011C00SPC200)\n"
+            "Copyright (C) 2012-2018 Huawei Technologies Co., Ltd.\n"
+            f"HUAWEI {self.model} uptime is {days} days, {hours} hours, {minutes} minutes\n"
+        )
+
+    def interfaces(self, router):
+        up = sum(router.port_up(port) for port in range(router.port_count))
+        yield (
+            "*down: administratively down\n^down: standby\n(l): loopback\n(s): spoofing\n"
+            f"The number of interface that is UP in Physical is {up}\n"
+            f"The number of interface that is DOWN in Physical is {router.port_count - up}\n"
+            "Interface                         IP Address/Mask      Physical   Protocol  \n"
+        )
+        for port in range(router.port_count):
+            address = router.port_address(port)
+            state = "up         up        " if router.port_up(port) else "*down      down      "
+            yield f"{self.port_name(port):<34}{address[0] + '/' + str(address[1]) if address else 'unassigned':<21}{state}\n"
+
+    def interface_detail(self, router, name=None):
+        ports = range(router.port_count) if name is None else [self.find_port(router, name)]
+        for port in ports:
+            if port is None:
+                yield self.error(f"display interface {name}")
+                return
+            up = router.port_up(port)
+            address = router.port_address(port)
+            yield f"{self.port_name(port)} current state : {'UP' if up else 'Administratively DOWN'}\n"
+            yield f"Line protocol current state : {'UP' if up else 'DOWN'}\n"
+            if router.description(port):
+                yield f"Description:{router.description(port)}\n"
+            yield "Route Port,The Maximum Transmit Unit is 1500\n"
+            if address:
+                yield f"Internet Address is {address[0]}/{address[1]}\n"
+            yield f"IP Sending Frames' Format is PKTFMT_ETHNT_2, Hardware address is {router.mac(port, '-')}\n"
+            yield "Speed : 1000,  Loopback: NONE\nDuplex: FULL,  Negotiation: ENABLE\n\n"
+
+    def neighbors(self, router):
+        for port, (peer, peer_port) in sorted(router.links.items()):
+            yield (
+                f"{self.port_name(port)} has 1 neighbor(s):\n\n"
+                "Neighbor index                     :1\n"
+                "Chassis type                       :macAddress\n"
+                f"Chassisid                          :{peer.mac(0, '-')}\n"
+                "Port ID subtype                    :interfaceName\n"
+                f"Port ID                            :{peer.port_name(peer_port)}\n"
+                f"System name                        :{peer.hostname}\n"
+                f"System description                 :{peer.profile.platform}, Software Version 1.0\n"
+                "Management address type            :ipv4\n"
+                f"Management address value           :{peer.ip}\n\n"
+            )
+
+    def config(self, router):
+        yield f"#\n sysname {router.hostname}\n#\n"
+        for port in range(router.port_count):
+            address = router.port_address(port)
+            yield f"interface {self.port_name(port)}\n"
+            if router.description(port):
+                yield f" description {router.description(port)}\n"
+            if address:
+                yield f" ip address {address[0]} {address[1]}\n"
+            else:
+                yield " shutdown\n"
+            yield "#\n"
+        yield "return\n"
+
+@register_profile
+class MikroTikProfile(DeviceProfile):
+    vendor = "mikrotik"
+    banner = "ROSSSH"
+    model = "RB4011iGS+"
+    platform = "MikroTik"
+    COMMANDS = [
+        (r"/system resource print", "version"),
+        (r"/interface print detail(?: where name=(?P<name>\S+))?", "interfaces"),
+        (r"/ip route print detail", "routes"),
+        (r"/ip neighbor print detail", "neighbors"),
+        (r"/export", "config"),
+        (r"/ping (?P<target>\S+)(?: count=(?P<count>\d+))?", "ping"),
+        (r"/tool traceroute (?P<target>\S+)(?: count=\d+)?", "traceroute"),
+    ]
+
+    def port_name(self, port):
+        return f"ether{port + 1}"
+
+    def prompt(self, router):
+        return f"[admin@{router.hostname}] > "
+
+    def error(self, command):
+        word = command.split()[0] if command.split() else ""
+        return f"bad command name {word.lstrip('/')} (line 1 column 1)\n"
+
+    def version(self, router):
+        days, hours, minutes, seconds = router.uptime()
+        yield (
+            f"                   uptime: {days}d{hours}h{minutes}m{seconds}s\n"
+            "                  version: 6.49.10 (long-term)\n"
+            "               build-time: Sep/06/2023 09:29:31\n"
+            "              free-memory: 900.4MiB\n"
+            "             total-memory: 1024.0MiB\n"
+            "                      cpu: ARMv7\n"
+            "                cpu-count: 4\n"
+            f"               board-name: {self.model}\n"
+            "                 platform: MikroTik\n"
+        )
+
+    def interfaces(self, router, name=None):
+        yield "Flags: D - dynamic, X - disabled, R - running, S - slave \n"
+        for port in range(router.port_count):
+            if name is not None and self.port_name(port) != name:
+                continue
+            flags = "R" if router.port_up(port) else "X"
+            comment = f";;; {router.description(port)}\n       " if router.description(port) else ""
+            yield (
+                f" {port:>2} {flags}  {comment}name=\"{self.port_name(port)}\" default-name=\"{self.port_name(port)}\" type=\"ether\" "
+                "mtu=1500 actual-mtu=1500 l2mtu=1580 max-l2mtu=9578\n"
+                f"       mac-address={router.mac(port)} last-link-up-time=sep/06/2023 10:00:00 link-downs=0\n\n"
+            )
+
+    def routes(self, router):
+        yield (
+            "Flags: X - disabled, A - active, D - dynamic, C - connect, S - static, r - rip, b - bgp, o - ospf, "
+            "m - mme, B - blackhole, U - unreachable, P - prohibit \n"
+        )
+        entry = 0
+        uplink = router.uplink()
+        if uplink:
+            gateway = uplink[0].port_address(uplink[2])[0]
+            yield f" {entry} AS   dst-address=0.0.0.0/0 gateway={gateway} gateway-status={gateway} reachable via  {self.port_name(0)} distance=1 scope=30 target-scope=10\n\n"
+            entry += 1
+        for network, prefix, port in router.connected_routes():
+            yield (
+                f" {entry} ADC  dst-address={network}/{prefix} pref-src={router.port_address(port)[0]} gateway={self.port_name(port)} "
+                f"gateway-status={self.port_name(port)} reachable distance=0 scope=10\n\n"
+            )
+            entry += 1
+        for network, prefix, next_hop, port in router.generated_routes():
+            yield f" {entry} AS   dst-address={network}/{prefix} gateway={next_hop} gateway-status={next_hop} reachable via  {self.port_name(port)} distance=1 scope=30 target-scope=10\n\n"
+            entry += 1
+
+    def neighbors(self, router):
+        for entry, (port, (peer, peer_port)) in enumerate(sorted(router.links.items())):
+            yield (
+                f" {entry} interface={self.port_name(port)} address={peer.ip} mac-address={peer.mac(0).upper()} identity=\"{peer.hostname}\" "
+                f"platform=\"{peer.profile.platform}\" version=\"1.0\" unpack=none age=42s board=\"{peer.profile.model}\" "
+                f"interface-name=\"{peer.port_name(peer_port)}\"\n\n"
+            )
+
+    def config(self, router):
+        yield f"# sep/06/2023 10:00:00 by RouterOS 6.49.10\n#\n/interface ethernet\n"
+        for port in range(router.port_count):
+            if router.description(port):
+                yield f"set [ find default-name={self.port_name(port)} ] comment=\"{router.description(port)}\"\n"
+        yield "/ip address\n"
+        for port in range(router.port_count):
+            address = router.port_address(port)
+            if address:
+                yield f"add address={address[0]}/{address[1]} interface={self.port_name(port)}\n"
+        yield f"/system identity\nset name={router.hostname}\n"
+
+    def ping(self, router, target, count="5"):
+        count = int(count)
+        yield "  SEQ HOST                                     SIZE TTL TIME  STATUS                                   \n"
+        rtts = []
+        for seq in range(count):
+            yield PAUSE
+            if router.rng.random() < router.settings.packet_loss:
+                yield f"{seq:>5} {target:<40}                   timeout                                  \n"
+            else:
+                rtts.append(round(router.rtt()))
+                yield f"{seq:>5} {target:<40}   56  62 {rtts[-1]}ms \n"
+        loss = round((count - len(rtts)) * 100 / count)
+        summary = f"    sent={count} received={len(rtts)} packet-loss={loss}%"
+        if rtts:
+            summary += f" min-rtt={min(rtts)}ms avg-rtt={round(sum(rtts) / len(rtts))}ms max-rtt={max(rtts)}ms"
+        yield summary + " \n"
+
+    def traceroute(self, router, target):
+        yield " # ADDRESS                          LOSS SENT    LAST     AVG    BEST   WORST STD-DEV STATUS\n"
+        for hop, address in enumerate(router.trace_path(target), 1):
+            yield PAUSE
+            if address is None:
+                yield f"{hop:>2}                                  100%    3 timeout\n"
+            else:
+                rtt = router.rtt(hop)
+                yield f"{hop:>2} {address:<32}   0%    3 {rtt:>5.1f}ms {rtt:>7.1f} {rtt:>7.1f} {rtt:>7.1f}     0.1\n"
+
+# SSHサーバー
+class SimulatorServer(asyncssh.SSHServer if asyncssh else object):
+    """1接続分のSSHサーバー（認証と障害注入）"""
+
+    def __init__(self, router: VirtualRouter):
+        self.router = router
+
+    def begin_auth(self, username):
+        return True
+
+    def password_auth_supported(self):
+        return True
+
+    def validate_password(self, username, password):
+        settings = self.router.settings
+        if self.router.rng.random() < settings.auth_failure_rate:
+            return False
+        if settings.username is not None and username != settings.username:
+            return False
+        return settings.password is None or password == settings.password
+
+async def write_output(process, router: VirtualRouter, fragments) -> bool:
+    """出力の断片をまとめて書き込む（PAUSEではプローブ間隔だけ待つ）
+
+    障害注入で接続を切った場合はFalseを返す。
+    """
+    settings = router.settings
+    # 障害注入時はこのバイト数を書いたところで接続を切る
+    cut_at = router.rng.randrange(0, 4096) if router.rng.random() < settings.disconnect_rate else None
+
+    buffered = []
+    size = 0
+    written = 0
+    for fragment in fragments:
+        if fragment is PAUSE:
+            if buffered:
+                process.stdout.write("".join(buffered))
+                written += size
+                buffered, size = [], 0
+            await process.stdout.drain()
+            await asyncio.sleep(settings.probe_interval)
+            continue
+        buffered.append(fragment)
+        size += len(fragment)
+        if cut_at is not None and written + size >= cut_at:
+            break
+        if size >= WRITE_CHUNK_SIZE:
+            process.stdout.write("".join(buffered))
+            written += size
+            buffered, size = [], 0
+            await process.stdout.drain()
+
+    if cut_at is None:
+        if buffered:
+            process.stdout.write("".join(buffered))
+        return True
+
+    # 出力の途中で接続が切れたように見せる
+    process.stdout.write("".join(buffered)[:max(cut_at - written, 0)])
+    await process.stdout.drain()
+    logger.debug(f"{router.ip}: injected disconnect after {cut_at} bytes")
+    process.channel.get_connection().abort()
+    return False
+
+async def run_command(process, router: VirtualRouter, command: str) -> Optional[int]:
+    """1コマンドを実行（遅延と障害注入を含む）
+
+    終了ステータスを返す。応答しないまま閉じられた場合や接続を切った場合はNone。
+    """
+    settings = router.settings
+    delay = max(settings.latency + router.rng.uniform(-settings.jitter, settings.jitter), 0)
+    if delay:
+        await asyncio.sleep(delay)
+
+    if router.rng.random() < settings.hang_rate:
+        # 応答しない（クライアント側のタイムアウトで閉じられるまで待つ）
+        await process.wait_closed()
+        return None
+    if router.rng.random() < settings.command_failure_rate:
+        process.stderr.write(f"% Simulated failure executing '{command}'\n")
+        return 1
+    return 0 if await write_output(process, router, router.profile.run(router, command)) else None
+
+def make_process_handler(router: VirtualRouter):
+    async def handle(process):
+        try:
+            if process.command is not None:
+                # exec: APIからのコマンド実行
+                exit_status = await run_command(process, router, process.command)
+                if exit_status is not None:
+                    process.exit(exit_status)
+                return
+
+            # 対話シェル（手動での確認用）
+            process.stdout.write(router.profile.prompt(router))
+            while True:
+                line = await process.stdin.readline()
+                if not line:
+                    break
+                command = line.strip()
+                if command in ("exit", "quit", "logout"):
+                    break
+                if command and await run_command(process, router, command) is None:
+                    return
+                process.stdout.write(router.profile.prompt(router))
+            process.exit(0)
+        except (asyncssh.BreakReceived, asyncssh.TerminalSizeChanged, asyncssh.DisconnectError, ConnectionError):
+            process.close()
+        except Exception as e:
+            logger.error(f"{router.ip}: error handling command: {str(e)}")
+            process.close()
+    return handle
+
+class Simulator:
+    """仮想ルーター群のSSHサーバーを起動・停止する"""
+
+    def __init__(self, routers: List[VirtualRouter], port: int = 2222):
+        if asyncssh is None:
+            raise RuntimeError("asyncssh is not installed (pip install asyncssh)")
+        self.routers = routers
+        self.port = port
+        self.servers = []
+
+    async def start(self, batch_size: int = 256):
+        host_key = asyncssh.generate_private_key("ssh-ed25519")
+        started = time.monotonic()
+        for offset in range(0, len(self.routers), batch_size):
+            batch = self.routers[offset:offset + batch_size]
+            self.servers += await asyncio.gather(*(
+                asyncssh.create_server(
+                    lambda router=router: SimulatorServer(router),
+                    router.ip,
+                    self.port,
+                    server_host_keys=[host_key],
+                    server_version=router.profile.banner,
+                    process_factory=make_process_handler(router),
+                    encoding="utf-8",
+                )
+                for router in batch
+            ))
+        logger.info(f"Started {len(self.routers)} virtual routers on port {self.port} in {time.monotonic() - started:.1f}s")
+
+    async def stop(self):
+        for server in self.servers:
+            server.close()
+        await asyncio.gather(*(server.wait_closed() for server in self.servers), return_exceptions=True)
+        self.servers = []
+
+    def inventory(self) -> List[Dict[str, Any]]:
+        return [
+            {"ip": router.ip, "port": self.port, "vendor": router.vendor, "hostname": router.hostname}
+            for router in self.routers
+        ]
+
+# API のスループット計測
+async def bench(args):
+    """仮想ルーターに /connect した後、各エンドポイントを並行して呼び出し所要時間を集計"""
+    if httpx is None:
+        raise RuntimeError("httpx is not installed (pip install httpx)")
+    with open(args.inventory) as f:
+        inventory = json.load(f)
+    if args.limit:
+        inventory = inventory[:args.limit]
+    endpoints = [endpoint.strip() for endpoint in args.endpoints.split(",") if endpoint.strip()]
+    semaphore = asyncio.Semaphore(args.concurrency)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+
+    async with httpx.AsyncClient(base_url=args.api, timeout=args.timeout, limits=limits) as client:
+        async def call(method, path, kwargs):
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    response = await client.request(method, path, **kwargs)
+                    ok = response.status_code < 400 and (method != "POST" or response.json().get("success", True))
+                except httpx.HTTPError:
+                    ok = False
+                return ok, time.perf_counter() - started
+
+        async def phase(name, requests):
+            started = time.perf_counter()
+            results = await asyncio.gather(*(call(*request) for request in requests))
+            elapsed = time.perf_counter() - started
+            report(name, results, elapsed)
+
+        await phase("connect", [
+            ("POST", "/connect", {"json": {
+                "ip": device["ip"],
+                "username": args.username,
+                "password": args.password,
+                **({"vendor": device["vendor"]} if args.known_vendor else {}),
+            }})
+            for device in inventory
+        ])
+        for _ in range(args.rounds):
+            for endpoint in endpoints:
+                await phase(endpoint, [
+                    ("GET", f"/router/{device['ip']}/{endpoint}", {"params": {"fresh": "true"} if args.fresh else {}})
+                    for device in inventory
+                ])
+
+def report(name: str, results: List[Tuple[bool, float]], elapsed: float):
+    latencies = sorted(latency for _, latency in results)
+    errors = sum(not ok for ok, _ in results)
+
+    def percentile(p):
+        return latencies[min(int(len(latencies) * p), len(latencies) - 1)] * 1000 if latencies else 0
+
+    print(
+        f"{name:<20} requests={len(results):<6} errors={errors:<5} "
+        f"rps={len(results) / elapsed if elapsed else 0:>8.1f} "
+        f"p50={percentile(0.5):>7.1f}ms p95={percentile(0.95):>7.1f}ms p99={percentile(0.99):>7.1f}ms"
+    )
+
+# ping/traceroute パーサーのスループット計測
+# 解析結果の正しさは tests/fixtures の実機形式の出力で確認する
+def load_api():
+    """同じディレクトリの router-api.py を読み込む（ファイル名にハイフンを含むためimportlibを使う）"""
+    import importlib.util
+    import os
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "router-api.py")
+    spec = importlib.util.spec_from_file_location("router_api", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def render(fragments) -> str:
+    return "".join(fragment for fragment in fragments if fragment is not PAUSE)
+
+def bench_parsers(args):
+    """ベンダーごとのping/traceroute出力の解析速度を計測（仮想ルーターの出力を使用）"""
+    api = load_api()
+    failures = 0
+
+    settings = SimulatorSettings(packet_loss=args.packet_loss, seed=args.seed)
+    for vendor in VENDORS:
+        router = build_fleet(2, "127.1.0.0/30", [vendor], settings)[1]
+        profile = PROFILES[vendor]
+        targets = [f"198.51.100.{i % 250 + 1}" for i in range(args.samples)]
+        outputs = {
+            "ping": [render(profile.ping(router, target, str(args.count))) for target in targets],
+            "traceroute": [render(profile.traceroute(router, target)) for target in targets],
+        }
+        vendor_type = api.VendorType(vendor)
+        for kind, texts in outputs.items():
+            parse = api.parse_ping_result if kind == "ping" else api.parse_traceroute
+            lines = sum(text.count("\n") for text in texts)
+            size = sum(len(text) for text in texts)
+            started = time.perf_counter()
+            for text in texts:
+                result = parse(text, vendor_type)
+                if kind == "ping" and result["packets_sent"] != args.count:
+                    failures += 1
+            elapsed = time.perf_counter() - started
+            print(
+                f"{vendor:<10} {kind:<11} outputs={len(texts):<6} "
+                f"lines/s={lines / elapsed:>10.0f} MB/s={size / elapsed / 1e6:>6.1f} "
+                f"per-output={elapsed / len(texts) * 1e6:>6.1f}us"
+            )
+    if failures:
+        raise ValueError(f"{failures} parser checks failed")
+
+async def serve(args):
+    settings = SimulatorSettings(
+        interfaces=args.interfaces,
+        fanout=args.fanout,
+        routes=args.routes,
+        latency=args.latency,
+        jitter=args.jitter,
+        probe_interval=args.probe_interval,
+        packet_loss=args.packet_loss,
+        command_failure_rate=args.command_failure_rate,
+        disconnect_rate=args.disconnect_rate,
+        hang_rate=args.hang_rate,
+        auth_failure_rate=args.auth_failure_rate,
+        username=args.username,
+        password=args.password,
+        seed=args.seed,
+    )
+    vendors = [vendor.strip() for vendor in args.vendors.split(",")]
+    unknown = [vendor for vendor in vendors if vendor not in PROFILES]
+    if unknown:
+        raise ValueError(f"Unknown vendors: {', '.join(unknown)} (available: {', '.join(VENDORS)})")
+
+    simulator = Simulator(build_fleet(args.count, args.network, vendors, settings), args.port)
+    await simulator.start()
+    if args.inventory:
+        with open(args.inventory, "w") as f:
+            json.dump(simulator.inventory(), f, indent=2)
+        logger.info(f"Wrote inventory of {len(simulator.routers)} routers to {args.inventory}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await simulator.stop()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="SSH device simulator for the router API")
+    subparsers = parser.add_subparsers(dest="mode", required=True)
+
+    serve_parser = subparsers.add_parser("serve", help="start virtual routers")
+    serve_parser.add_argument("--count", type=int, default=10, help="number of virtual routers")
+    serve_parser.add_argument("--network", default="127.1.0.0/16", help="loopback network to allocate router addresses from")
+    serve_parser.add_argument("--port", type=int, default=2222)
+    serve_parser.add_argument("--vendors", default=",".join(VENDORS), help="vendors assigned round-robin")
+    serve_parser.add_argument("--interfaces", type=int, default=8)
+    serve_parser.add_argument("--fanout", type=int, default=3, help="children per router in the simulated topology")
+    serve_parser.add_argument("--routes", type=int, default=50, help="generated routes per router")
+    serve_parser.add_argument("--latency", type=float, default=0.05, help="seconds before each command responds")
+    serve_parser.add_argument("--jitter", type=float, default=0.02)
+    serve_parser.add_argument("--probe-interval", type=float, default=0.1, help="seconds between ping/traceroute replies")
+    serve_parser.add_argument("--packet-loss", type=float, default=0.0)
+    serve_parser.add_argument("--command-failure-rate", type=float, default=0.0)
+    serve_parser.add_argument("--disconnect-rate", type=float, default=0.0)
+    serve_parser.add_argument("--hang-rate", type=float, default=0.0)
+    serve_parser.add_argument("--auth-failure-rate", type=float, default=0.0)
+    serve_parser.add_argument("--username", help="only accept this username")
+    serve_parser.add_argument("--password", help="only accept this password")
+    serve_parser.add_argument("--seed", type=int, default=1)
+    serve_parser.add_argument("--inventory", help="write the router list as JSON")
+
+    bench_parser = subparsers.add_parser("bench", help="measure API throughput against running virtual routers")
+    bench_parser.add_argument("--inventory", required=True)
+    bench_parser.add_argument("--api", default="http://127.0.0.1:8000")
+    bench_parser.add_argument("--endpoints", default="info,interfaces,routing-table,neighbors")
+    bench_parser.add_argument("--concurrency", type=int, default=100)
+    bench_parser.add_argument("--rounds", type=int, default=1)
+    bench_parser.add_argument("--limit", type=int, help="only use the first N routers")
+    bench_parser.add_argument("--timeout", type=float, default=60)
+    bench_parser.add_argument("--fresh", action="store_true", help="bypass the API command cache")
+    bench_parser.add_argument("--known-vendor", action="store_true", help="pass the vendor on /connect to skip detection")
+    bench_parser.add_argument("--username", default="admin")
+    bench_parser.add_argument("--password", default="admin")
+
+    parsers_parser = subparsers.add_parser("parsers", help="benchmark the API's ping/traceroute parsers")
+    parsers_parser.add_argument("--samples", type=int, default=2000, help="outputs generated per vendor and command")
+    parsers_parser.add_argument("--count", type=int, default=5, help="pings per output")
+    parsers_parser.add_argument("--packet-loss", type=float, default=0.2)
+    parsers_parser.add_argument("--seed", type=int, default=1)
+
+    args = parser.parse_args(argv)
+    try:
+        if args.mode == "parsers":
+            bench_parsers(args)
+        else:
+            asyncio.run(serve(args) if args.mode == "serve" else bench(args))
+    except KeyboardInterrupt:
+        pass
+    except (RuntimeError, ValueError) as e:
+        logger.error(str(e))
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+import importlib.util
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+API_DIR = ROOT / "app" / "api"
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+
+def load_module(name: str, filename: str):
+    """app/api のスクリプトを読み込む（ファイル名にハイフンを含むためimportlibを使う）"""
+    spec = importlib.util.spec_from_file_location(name, API_DIR / filename)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def read_fixture(vendor: str, name: str) -> str:
+    return (FIXTURES / vendor / name).read_text(encoding="utf-8")
+
+@pytest.fixture(scope="session")
+def api():
+    return load_module("router_api", "router-api.py")
+
+class FakeBackend:
+    """(IP, コマンド) ごとに決めた出力を返すSSHバックエンド（実行したコマンドを記録する）
+
+    outputs にないコマンドは失敗として返す。
+    """
+    name = "fake"
+
+    def __init__(self):
+        self.outputs = {}
+        self.calls = []
+
+    async def execute(self, ip, command, timeout=30):
+        self.calls.append((ip, command))
+        output = self.outputs.get((ip, command))
+        if output is None:
+            return {"success": False, "output": f"No output for '{command}' on {ip}"}
+        return {"success": True, "output": output}
+
+    async def execute_lines(self, ip, command, consumer, timeout=30):
+        result = await self.execute(ip, command, timeout)
+        if not result["success"]:
+            return {**result, "data": None}
+        return {"success": True, "output": "", "data": consumer(iter(result["output"].splitlines())), "truncated": False}
+
+@pytest.fixture
+def backend(api, monkeypatch):
+    """ssh_backend を FakeBackend に置き換える（実行したルーターのキャッシュは後で削除）"""
+    fake = FakeBackend()
+    monkeypatch.setattr(api, "ssh_backend", fake)
+    yield fake
+    for ip in {ip for ip, _ in fake.calls}:
+        api.command_cache.invalidate(ip)
+
+@pytest.fixture
+def sessions(api):
+    """connect(ip, vendor) で接続済みのセッションを作る（テスト後に削除）"""
+    created = []
+
+    def connect(ip, vendor="cisco"):
+        session = api.session_registry.create(ip, api.VendorType(vendor))
+        created.append(session["session_id"])
+        return session
+
+    yield connect
+    for session_id in created:
+        api.session_registry.remove(session_id)
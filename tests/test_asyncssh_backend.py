@@ -0,0 +1,143 @@
+"""AsyncSSHBackend をプロセス内で起動した仮想ルーター（router-simulator.py）に接続して確認する"""
+import asyncio
+import socket
+import time
+
+import pytest
+
+from conftest import load_module
+
+pytest.importorskip("asyncssh")
+
+@pytest.fixture(scope="module")
+def simulator():
+    return load_module("router_simulator", "router-simulator.py")
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def run_with_router(api, simulator, monkeypatch, scenario, vendor="cisco", **settings):
+    """仮想ルーターを1台起動し、接続済みのバックエンドで scenario(backend, router) を実行"""
+    port = free_port()
+    monkeypatch.setattr(api, "SSH_PORT", port)
+    options = {"latency": 0, "jitter": 0, "probe_interval": 0.05, "seed": 1}
+    options.update(settings)
+    # ルートを生成するには隣接ルーターが必要（SSHサーバーは1台目だけ起動する）
+    router = simulator.build_fleet(2, "127.0.0.0/29", [vendor], simulator.SimulatorSettings(**options))[0]
+    info = api.RouterInfo(ip=router.ip, username="admin", password="admin", vendor=api.VendorType(vendor))
+
+    async def main():
+        server = simulator.Simulator([router], port=port)
+        await server.start()
+        backend = api.AsyncSSHBackend()
+        try:
+            result = await backend.connect(info)
+            assert result["success"], result["message"]
+            return await scenario(backend, router)
+        finally:
+            await backend.close_all()
+            api.forget_router_semaphore(router.ip)
+            await server.stop()
+
+    return asyncio.run(main())
+
+def test_execute(api, simulator, monkeypatch):
+    async def scenario(backend, router):
+        return await backend.execute(router.ip, "show version")
+
+    result = run_with_router(api, simulator, monkeypatch, scenario)
+    assert result["success"]
+    assert api.extract_router_info(result["output"], api.VendorType.CISCO)["model"] == "C891F"
+
+def test_execute_lines_matches_execute(api, simulator, monkeypatch):
+    async def scenario(backend, router):
+        consumer = lambda lines: api.parse_routes(lines, api.VendorType.CISCO)
+        streamed = await backend.execute_lines(router.ip, "show ip route", consumer)
+        buffered = await backend.execute(router.ip, "show ip route")
+        return streamed, buffered
+
+    streamed, buffered = run_with_router(api, simulator, monkeypatch, scenario, routes=5000)
+    assert streamed["success"] and not streamed["truncated"]
+    assert streamed["output"] == ""
+    expected = api.parse_routes(buffered["output"], api.VendorType.CISCO)
+    assert len(streamed["data"]) == len(expected) > 5000
+    assert streamed["data"].to_list() == expected.to_list()
+
+def test_execute_lines_parses_while_reading(api, simulator, monkeypatch):
+    # pingは応答ごとに間隔を空けて出力されるため、最初の行はコマンドの終了前に届く
+    async def scenario(backend, router):
+        arrivals = []
+
+        def consumer(lines):
+            for line in lines:
+                arrivals.append(time.monotonic())
+            return len(arrivals)
+
+        result = await backend.execute_lines(router.ip, "ping 192.0.2.1 repeat 5", consumer)
+        return result, arrivals, time.monotonic()
+
+    result, arrivals, finished = run_with_router(api, simulator, monkeypatch, scenario, probe_interval=0.2)
+    assert result["success"]
+    assert result["data"] == len(arrivals) > 1
+    assert finished - arrivals[0] >= 0.5
+
+def test_execute_lines_truncated(api, simulator, monkeypatch):
+    monkeypatch.setattr(api, "SSH_MAX_OUTPUT_BYTES", 4096)
+
+    async def scenario(backend, router):
+        return await backend.execute_lines(router.ip, "show ip route", lambda lines: sum(len(line) + 1 for line in lines))
+
+    result = run_with_router(api, simulator, monkeypatch, scenario, routes=2000)
+    assert result["success"]
+    assert result["truncated"]
+    assert result["data"] <= 4096 + 1
+
+def test_timeout_covers_whole_command(api, simulator, monkeypatch):
+    # 応答の間隔（0.2秒）はtimeoutより短いが、コマンド全体（約1秒）はtimeoutを超える
+    async def scenario(backend, router):
+        started = time.monotonic()
+        result = await backend.execute(router.ip, "ping 192.0.2.1 repeat 5", timeout=0.5)
+        return result, time.monotonic() - started
+
+    result, elapsed = run_with_router(api, simulator, monkeypatch, scenario, probe_interval=0.2)
+    assert not result["success"]
+    assert "timed out" in result["output"]
+    assert elapsed < 0.9
+
+def test_connect_closes_connection_when_detection_fails(api, simulator, monkeypatch):
+    opened = []
+
+    async def scenario(backend, router):
+        open_connection = backend._open
+
+        async def record(router_info):
+            conn = await open_connection(router_info)
+            opened.append(conn)
+            return conn
+
+        async def fail(conn, ip):
+            raise RuntimeError("detection failed")
+
+        backend._open = record
+        backend._detect_vendor = fail
+        info = api.RouterInfo(ip=router.ip, username="admin", password="admin")
+        monkeypatch.setattr(api, "known_vendor", lambda router_info: None)
+        result = await backend.connect(info)
+        await asyncio.wait_for(opened[0].wait_closed(), 5)
+        return result
+
+    result = run_with_router(api, simulator, monkeypatch, scenario)
+    assert not result["success"]
+    assert len(opened) == 1
+
+def test_close_forgets_router(api, simulator, monkeypatch):
+    async def scenario(backend, router):
+        await backend.execute(router.ip, "show version")
+        await backend.close(router.ip)
+        return backend
+
+    backend = run_with_router(api, simulator, monkeypatch, scenario)
+    assert not backend._connections
+    assert not backend._connect_locks
@@ -0,0 +1,79 @@
+"""複数ルーターからの一括収集（/bulk/collect）"""
+import asyncio
+import json
+
+from fastapi.testclient import TestClient
+
+from conftest import read_fixture
+
+IPS = ["192.0.2.61", "192.0.2.62", "192.0.2.63"]
+
+def collect(api, **request):
+    response = TestClient(api.app).post("/bulk/collect", json=request)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    *results, summary = [json.loads(line) for line in response.text.splitlines()]
+    return {result["ip"]: result for result in results}, summary["summary"]
+
+def serve(api, backend, ip):
+    commands = api.VENDOR_COMMANDS[api.VendorType.CISCO]
+    backend.outputs[ip, commands["version"]] = read_fixture("cisco", "show_version.txt")
+    backend.outputs[ip, commands["routing_table"]] = read_fixture("cisco", "show_ip_route.txt")
+
+def test_results_and_summary(api, backend, sessions):
+    for ip in IPS[:2]:
+        sessions(ip)
+    serve(api, backend, IPS[0])
+    # 192.0.2.62 は接続済みだがコマンドが失敗し、192.0.2.63 は未接続
+    results, summary = collect(api, ips=IPS + [IPS[0]], kinds=["version", "routes", "version"], fresh=True)
+    
+    assert set(results) == set(IPS)
+    assert results[IPS[0]]["success"] is True
+    assert results[IPS[0]]["data"]["version"] == json.loads(read_fixture("cisco", "show_version.json"))
+    assert len(results[IPS[0]]["data"]["routes"]) == 9
+    assert results[IPS[1]]["success"] is False
+    assert sorted(results[IPS[1]]["errors"]) == ["routes", "version"]
+    assert results[IPS[2]] == {"ip": IPS[2], "success": False, "error": "not connected"}
+    assert (summary["devices"], summary["succeeded"], summary["failed"]) == (3, 1, 2)
+    # 重複したIPと種類は1回だけ収集する
+    assert sorted(command for ip, command in backend.calls if ip == IPS[0]) == sorted(
+        api.VENDOR_COMMANDS[api.VendorType.CISCO][kind] for kind in ("version", "routing_table")
+    )
+
+def test_devices_are_collected_concurrently(api, backend, sessions, monkeypatch):
+    execute = backend.execute
+    started = []
+    
+    async def gated_execute(ip, command, timeout=30):
+        # 全台のコマンドが同時に実行中になるまで待つ（逐次実行ならタイムアウトする）
+        started.append(ip)
+        for _ in range(100):
+            if len(started) == len(IPS):
+                break
+            await asyncio.sleep(0.01)
+        return await execute(ip, command, timeout)
+    
+    monkeypatch.setattr(backend, "execute", gated_execute)
+    for ip in IPS:
+        sessions(ip)
+        serve(api, backend, ip)
+    results, summary = collect(api, kinds=["version"], ips=IPS, timeout=0.5, fresh=True)
+    assert summary["succeeded"] == len(IPS)
+    assert sorted(started) == IPS
+
+def test_slow_devices_time_out(api, backend, sessions, monkeypatch):
+    execute = backend.execute
+    
+    async def slow_execute(ip, command, timeout=30):
+        if ip == IPS[1]:
+            await asyncio.sleep(1)
+        return await execute(ip, command, timeout)
+    
+    monkeypatch.setattr(backend, "execute", slow_execute)
+    for ip in IPS[:2]:
+        sessions(ip)
+        serve(api, backend, ip)
+    results, summary = collect(api, kinds=["version"], ips=IPS[:2], timeout=0.2, fresh=True)
+    assert results[IPS[0]]["success"] is True
+    assert results[IPS[1]]["error"] == "timed out after 0.2s"
+    assert (summary["succeeded"], summary["failed"]) == (1, 1)
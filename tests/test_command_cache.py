@@ -0,0 +1,86 @@
+"""コマンド出力のキャッシュ（CommandCache）"""
+import asyncio
+import time
+
+KEY = ("192.0.2.51", "show version")
+
+def test_entries_expire_after_ttl(api):
+    cache = api.CommandCache()
+    cache.set(KEY, "output", ttl=0.05)
+    assert cache.get(KEY) == "output"
+    time.sleep(0.06)
+    assert cache.get(KEY) is None
+    assert cache.stats()["entries"] == 0
+
+def test_least_recently_used_entry_is_evicted(api):
+    cache = api.CommandCache(max_entries=2)
+    cache.set(("a", "cmd"), 1, ttl=60)
+    cache.set(("b", "cmd"), 2, ttl=60)
+    # a を参照すると b が最も古くなる
+    assert cache.get(("a", "cmd")) == 1
+    cache.set(("c", "cmd"), 3, ttl=60)
+    assert cache.get(("b", "cmd")) is None
+    assert (cache.get(("a", "cmd")), cache.get(("c", "cmd"))) == (1, 3)
+    assert cache.stats()["evictions"] == 1
+
+def test_concurrent_loads_are_coalesced(api):
+    cache = api.CommandCache()
+    calls = []
+
+    async def load():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "output"
+
+    async def main():
+        results = await asyncio.gather(*(cache.get_or_load(KEY, 60, load) for _ in range(5)))
+        # 取得後はキャッシュから返す
+        results.append(await cache.get_or_load(KEY, 60, load))
+        return results
+
+    assert asyncio.run(main()) == ["output"] * 6
+    assert len(calls) == 1
+    stats = cache.stats()
+    assert (stats["misses"], stats["coalesced"], stats["hits"], stats["inflight"]) == (1, 4, 1, 0)
+
+def test_fresh_and_cache_if(api):
+    cache = api.CommandCache()
+    values = iter(["first", "second", "third"])
+
+    async def load():
+        return next(values)
+
+    async def main():
+        first = await cache.get_or_load(KEY, 60, load)
+        second = await cache.get_or_load(KEY, 60, load, fresh=True)
+        # cache_if が偽の結果は返すがキャッシュしない
+        third = await cache.get_or_load(KEY, 60, load, fresh=True, cache_if=lambda value: False)
+        return first, second, third, cache.get(KEY)
+
+    assert asyncio.run(main()) == ("first", "second", "third", "second")
+
+def test_invalidate_by_router(api):
+    cache = api.CommandCache()
+    cache.set(("192.0.2.51", "show version"), 1, ttl=60)
+    cache.set(("192.0.2.51", "show ip route"), 2, ttl=60)
+    cache.set(("192.0.2.52", "show version"), 3, ttl=60)
+    assert cache.invalidate("192.0.2.51") == 2
+    assert cache.get(("192.0.2.52", "show version")) == 3
+    assert cache.invalidate() == 1
+    assert cache.stats()["invalidations"] == 3
+
+def test_fetch_command_caches_only_successes(api, backend):
+    ip = "192.0.2.53"
+    command = api.VENDOR_COMMANDS[api.VendorType.CISCO]["version"]
+
+    def fetch(fresh=False):
+        return asyncio.run(api.fetch_command(ip, api.VendorType.CISCO, "version", fresh=fresh))
+
+    # 失敗した結果はキャッシュしない
+    assert fetch()["success"] is False
+    backend.outputs[ip, command] = "Cisco IOS XE Software"
+    assert fetch()["output"] == "Cisco IOS XE Software"
+    backend.outputs[ip, command] = "changed"
+    assert fetch()["output"] == "Cisco IOS XE Software"
+    assert fetch(fresh=True)["output"] == "changed"
+    assert [call for call in backend.calls if call[0] == ip] == [(ip, command)] * 3
@@ -0,0 +1,110 @@
+"""診断エンジン（データの収集と各チェックの実行）、チェック結果の再利用、定期診断のスケジュール"""
+import asyncio
+import time
+
+from fastapi.testclient import TestClient
+
+from conftest import read_fixture
+
+INTERFACE_DOWN = "GigabitEthernet0/0/3   unassigned      YES NVRAM  down                  down"
+
+def serve_cisco(api, backend, ip, interfaces=None):
+    commands = api.VENDOR_COMMANDS[api.VendorType.CISCO]
+    backend.outputs[ip, commands["interfaces"]] = interfaces or read_fixture("cisco", "show_ip_interface_brief.txt")
+    backend.outputs[ip, commands["routing_table"]] = read_fixture("cisco", "show_ip_route.txt")
+
+def commands_run(backend, ip):
+    return sorted(command for call_ip, command in backend.calls if call_ip == ip)
+
+def test_required_commands_are_fetched_once(api, backend):
+    # default_route と duplicate_routes はどちらもルーティングテーブルを使う
+    ip = "192.0.2.11"
+    serve_cisco(api, backend, ip)
+    commands = api.VENDOR_COMMANDS[api.VendorType.CISCO]
+    asyncio.run(api.diagnose(ip, api.VendorType.CISCO, api.select_checks(), fresh=True))
+    assert commands_run(backend, ip) == sorted([commands["interfaces"], commands["routing_table"]])
+
+def test_config_is_fetched_only_when_a_check_needs_it(api, backend):
+    ip = "192.0.2.12"
+    serve_cisco(api, backend, ip)
+    commands = api.VENDOR_COMMANDS[api.VendorType.CISCO]
+    backend.outputs[ip, commands["config"]] = "interface GigabitEthernet0/0/0\n ip address 203.0.113.2 255.255.255.252\n"
+
+    asyncio.run(api.diagnose(ip, api.VendorType.CISCO, api.select_checks(), fresh=True))
+    assert commands["config"] not in commands_run(backend, ip)
+
+    checks = api.select_checks(["interface_status", "interface_config"])
+    result = asyncio.run(api.diagnose(ip, api.VendorType.CISCO, checks, fresh=True))
+    assert commands_run(backend, ip).count(commands["config"]) == 1
+    assert "skipped_checks" not in result
+
+def test_timings_per_check(api, backend, sessions):
+    ip = "192.0.2.13"
+    serve_cisco(api, backend, ip)
+    sessions(ip)
+    response = TestClient(api.app).get(f"/router/{ip}/diagnostics", params={"checks": "interface_status,default_route"})
+    assert response.status_code == 200
+    result = api.DiagnosticResult(**response.json())
+    assert set(result.timings) == {"collect", "interface_status", "default_route"}
+    assert all(milliseconds >= 0 for milliseconds in result.timings.values())
+
+def test_unchanged_inputs_reuse_previous_results(api, backend):
+    ip = "192.0.2.10"
+    serve_cisco(api, backend, ip)
+    checks = api.select_checks()
+    names = [check.name for check in checks]
+    state = {}
+
+    def diagnose():
+        return asyncio.run(api.diagnose(ip, api.VendorType.CISCO, checks, fresh=True, state=state))
+
+    first = diagnose()
+    assert "reused_checks" not in first
+    assert set(first["timings"]) == {"collect", *names}
+
+    second = diagnose()
+    assert second["reused_checks"] == names
+    assert set(second["timings"]) == {"collect"}
+    assert second["issues"] == first["issues"]
+
+    # インターフェースの出力だけが変わると、それを入力とするチェックだけ再評価する
+    serve_cisco(api, backend, ip, read_fixture("cisco", "show_ip_interface_brief.txt") + INTERFACE_DOWN + "\n")
+    third = diagnose()
+    assert third["reused_checks"] == [name for name in names if name != "interface_status"]
+    assert "interface_status" in third["timings"]
+    assert "GigabitEthernet0/0/3" in [issue["affected_component"] for issue in third["issues"]]
+
+def run_devices(scheduler, *ips):
+    async def run():
+        for ip in ips:
+            await scheduler.run_device(ip)
+    asyncio.run(run())
+
+def due(scheduler, now, *ips):
+    return [ip for ip in scheduler.due(now) if ip in ips]
+
+def test_failed_devices_retry_sooner(api, backend, sessions):
+    healthy, failing = "192.0.2.20", "192.0.2.21"
+    # failing はコマンドの出力を取得できない
+    serve_cisco(api, backend, healthy)
+    sessions(healthy)
+    sessions(failing)
+    scheduler = api.DiagnosticsScheduler(interval=300, jitter=0, retry_interval=60)
+    assert sorted(due(scheduler, time.time(), healthy, failing)) == [healthy, failing]
+
+    run_devices(scheduler, healthy, failing)
+    devices = scheduler.summary()["devices"]
+    assert devices[healthy]["consecutive_failures"] == 0
+    assert devices[failing]["consecutive_failures"] == 1
+    assert devices[failing]["skipped_checks"]
+    assert due(scheduler, time.time() + 120, healthy, failing) == [failing]
+
+def test_failed_devices_run_first(api, backend, sessions):
+    healthy, failing = "192.0.2.30", "192.0.2.31"
+    serve_cisco(api, backend, healthy)
+    sessions(healthy)
+    sessions(failing)
+    # 間隔が同じなら failing の予定時刻の方が後になるが、連続失敗回数の多い順に実行する
+    scheduler = api.DiagnosticsScheduler(interval=60, jitter=0, retry_interval=60)
+    run_devices(scheduler, healthy, failing)
+    assert due(scheduler, time.time() + 120, healthy, failing) == [failing, healthy]
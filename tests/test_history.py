@@ -0,0 +1,105 @@
+"""計測値の時系列ストア（HistoryStore）と /router/{ip}/history"""
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+IP = "192.0.2.1"
+# 1時間単位に揃えた時刻（バケットの境界をそろえる）
+BASE = 1_700_000_000 // 3600 * 3600
+# (経過秒, 値)
+SAMPLES = [(0, 10.0), (30, 20.0), (90, 30.0), (400, 40.0), (3700, 50.0)]
+
+@pytest.fixture
+def store(api):
+    store = api.HistoryStore("")
+    for offset, value in SAMPLES:
+        store.record(IP, [("ping_rtt", "203.0.113.1", value), ("interface_up", "Gi0/0", 1.0)], timestamp=BASE + offset)
+    yield store
+    store.close()
+
+def points(store, resolution, start=BASE, end=BASE + 7200):
+    (series,) = store.query(IP, start, end, resolution, metric="ping_rtt")
+    assert (series["metric"], series["key"]) == ("ping_rtt", "203.0.113.1")
+    return series["points"]
+
+def rollup(bucket, count, avg, low, high, last):
+    return {"timestamp": BASE + bucket, "count": count, "avg": avg, "min": low, "max": high, "last": last}
+
+def test_raw_samples(store):
+    assert points(store, "raw") == [{"timestamp": BASE + offset, "value": value} for offset, value in SAMPLES]
+
+@pytest.mark.parametrize("resolution,expected", [
+    ("1m", [
+        rollup(0, 2, 15.0, 10.0, 20.0, 20.0),
+        rollup(60, 1, 30.0, 30.0, 30.0, 30.0),
+        rollup(360, 1, 40.0, 40.0, 40.0, 40.0),
+        rollup(3660, 1, 50.0, 50.0, 50.0, 50.0),
+    ]),
+    ("5m", [
+        rollup(0, 3, 20.0, 10.0, 30.0, 30.0),
+        rollup(300, 1, 40.0, 40.0, 40.0, 40.0),
+        rollup(3600, 1, 50.0, 50.0, 50.0, 50.0),
+    ]),
+    ("1h", [
+        rollup(0, 4, 25.0, 10.0, 40.0, 40.0),
+        rollup(3600, 1, 50.0, 50.0, 50.0, 50.0),
+    ]),
+])
+def test_rollups(store, resolution, expected):
+    assert points(store, resolution) == expected
+
+def test_query_filters_series(store):
+    series = store.query(IP, BASE, BASE + 7200, "1h")
+    assert [(item["metric"], item["key"]) for item in series] == [("interface_up", "Gi0/0"), ("ping_rtt", "203.0.113.1")]
+    assert store.query(IP, BASE, BASE + 7200, "1h", metric="ping_rtt", key="other") == []
+    assert store.query("192.0.2.2", BASE, BASE + 7200, "1h") == []
+
+def test_prune_raw_samples(api, store):
+    # 生のサンプルだけが保持期間を過ぎている
+    store.prune(now=BASE + 100 + api.HISTORY_RETENTION["raw"])
+    assert [point["timestamp"] for point in points(store, "raw")] == [BASE + 400, BASE + 3700]
+    assert len(points(store, "1m")) == 4
+
+def test_prune_rollups(api, store):
+    # 1m のロールアップも保持期間を過ぎ、5m/1h は残る
+    store.prune(now=BASE + 100 + api.HISTORY_RETENTION["1m"])
+    assert points(store, "raw") == []
+    assert [point["timestamp"] for point in points(store, "1m")] == [BASE + 360, BASE + 3660]
+    assert len(points(store, "5m")) == 3
+    assert len(points(store, "1h")) == 2
+
+@pytest.mark.parametrize("start_ago,span,expected", [
+    (3600, 3600, "1m"),
+    # 1m では点数が多すぎる
+    (5 * 24 * 3600, 5 * 24 * 3600, "5m"),
+    (30 * 24 * 3600, 30 * 24 * 3600, "1h"),
+    # 期間は短いが、開始時刻が 1m の保持期間より前
+    (10 * 24 * 3600, 3600, "5m"),
+])
+def test_choose_resolution(api, start_ago, span, expected):
+    start = time.time() - start_ago
+    assert api.HistoryStore("").choose_resolution(start, start + span) == expected
+
+def test_history_endpoint(api, monkeypatch):
+    store = api.HistoryStore("")
+    monkeypatch.setattr(api, "history_store", store)
+    now = time.time()
+    store.record(IP, [("ping_rtt", "203.0.113.1", 5.0)], timestamp=now - 120)
+    store.record(IP, [("ping_rtt", "203.0.113.1", 7.0)], timestamp=now - 60)
+    client = TestClient(api.app)
+
+    response = client.get(f"/router/{IP}/history", params={"metric": "ping_rtt", "start": now - 3600, "end": now})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["resolution"] == "1m"
+    (series,) = body["series"]
+    assert sum(point["count"] for point in series["points"]) == 2
+    assert series["points"][-1]["last"] == 7.0
+
+    response = client.get(f"/router/{IP}/history", params={"resolution": "raw", "start": now - 3600, "end": now})
+    assert [point["value"] for point in response.json()["series"][0]["points"]] == [5.0, 7.0]
+
+    response = client.get(f"/router/{IP}/history", params={"start": now, "end": now - 60})
+    assert response.status_code == 400
+    store.close()
@@ -0,0 +1,18 @@
+"""起動・終了時の処理（lifespan）"""
+import warnings
+
+from fastapi.testclient import TestClient
+
+from conftest import load_module
+
+def test_lifespan_opens_and_closes_resources():
+    # 終了処理でエグゼキューターを止めるため、共有の api とは別に読み込む
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", DeprecationWarning)
+        module = load_module("router_api_lifespan", "router-api.py")
+    
+    with TestClient(module.app) as client:
+        assert client.get("/").status_code == 200
+        assert module.history_store._db is not None
+    assert module.history_store._db is None
+    assert module.ssh_executor._shutdown
@@ -0,0 +1,52 @@
+"""パーサーの処理速度（行/秒）の計測
+
+pytest-benchmark が必要。`pytest tests/test_parser_benchmarks.py --benchmark-only` で実行し、
+結果の extra_info に1秒あたりの行数を記録する。
+"""
+import pytest
+
+from conftest import read_fixture
+from test_parsers import FIXTURE_FILES, expected
+
+pytest.importorskip("pytest_benchmark")
+
+VENDORS = list(FIXTURE_FILES)
+ROUTES = 20000
+
+def repeated(vendor, kind, count):
+    """実機形式の出力を count 件以上のエントリになるまで繰り返す（繰り返し回数も返す）"""
+    filename = FIXTURE_FILES[vendor][kind]
+    entries = len(expected(vendor, filename))
+    times = -(-count // entries)
+    return read_fixture(vendor, filename).rstrip("\n") * times + "\n", times * entries
+
+def run(benchmark, parse, output, lines):
+    result = benchmark(parse, output)
+    benchmark.extra_info["lines"] = lines
+    if benchmark.stats:  # --benchmark-disable では1回実行するだけで統計はない
+        benchmark.extra_info["lines_per_sec"] = round(lines / benchmark.stats.stats.mean)
+    return result
+
+@pytest.mark.parametrize("vendor", VENDORS)
+def test_parse_routes_speed(benchmark, api, vendor):
+    vendor_type = api.VendorType(vendor)
+    output, routes = repeated(vendor, "routes", ROUTES)
+    table = run(benchmark, lambda output: api.parse_routes(output, vendor_type), output, output.count("\n"))
+    assert len(table) == routes
+
+@pytest.mark.parametrize("vendor", VENDORS)
+def test_parse_routes_streamed_speed(benchmark, api, vendor):
+    # execute_lines から渡される形（改行を除いた行のリスト）
+    vendor_type = api.VendorType(vendor)
+    output, routes = repeated(vendor, "routes", ROUTES)
+    lines = output.splitlines()
+    table = run(benchmark, lambda lines: api.parse_routes(lines, vendor_type), lines, len(lines))
+    assert len(table) == routes
+
+@pytest.mark.parametrize("vendor", VENDORS)
+def test_parse_interfaces_speed(benchmark, api, vendor):
+    vendor_type = api.VendorType(vendor)
+    output, _ = repeated(vendor, "interfaces", 2000)
+    parsed = run(benchmark, lambda output: api.parse_interfaces(output, vendor_type), output, output.count("\n"))
+    # インターフェース名ごとにまとめられるため、繰り返しても結果は元の出力と同じ
+    assert parsed == expected(vendor, FIXTURE_FILES[vendor]["interfaces"])
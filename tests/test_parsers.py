@@ -0,0 +1,103 @@
+"""ベンダーごとの実機形式の出力を解析し、記録済みの期待値（.json）と比較する"""
+import json
+
+import pytest
+
+from conftest import FIXTURES, read_fixture
+
+# ベンダー -> 種類 -> 出力ファイル（期待値は同じ名前の .json）
+FIXTURE_FILES = {
+    "cisco": {
+        "info": "show_version.txt",
+        "interfaces": "show_ip_interface_brief.txt",
+        "interface_details": "show_interfaces.txt",
+        "routes": "show_ip_route.txt",
+        "neighbors": "show_cdp_neighbors_detail.txt",
+    },
+    "juniper": {
+        "info": "show_version.txt",
+        "interfaces": "show_interfaces_terse.txt",
+        "interface_details": "show_interfaces_detail.txt",
+        "routes": "show_route.txt",
+        "neighbors": "show_lldp_neighbors.txt",
+    },
+    "hp": {
+        "info": "display_version.txt",
+        "interfaces": "display_interface_brief.txt",
+        "interface_details": "display_interface.txt",
+        "routes": "display_ip_routing-table.txt",
+        "neighbors": "display_lldp_neighbor-information.txt",
+    },
+    "huawei": {
+        "info": "display_version.txt",
+        "interfaces": "display_ip_interface_brief.txt",
+        "interface_details": "display_interface.txt",
+        "routes": "display_ip_routing-table.txt",
+        "neighbors": "display_lldp_neighbor.txt",
+    },
+    "mikrotik": {
+        "info": "system_resource_print.txt",
+        "interfaces": "interface_print_detail.txt",
+        "routes": "ip_route_print_detail.txt",
+        "neighbors": "ip_neighbor_print_detail.txt",
+    },
+}
+
+CASES = [
+    (vendor, kind, filename)
+    for vendor, files in FIXTURE_FILES.items()
+    for kind, filename in files.items()
+]
+
+def parse(api, vendor, kind, output):
+    vendor = api.VendorType(vendor)
+    if kind == "info":
+        return api.extract_router_info(output, vendor)
+    if kind == "interfaces":
+        return api.parse_interfaces(output, vendor)
+    if kind == "interface_details":
+        details = {}
+        for name, block in api.split_interface_details(output, vendor).items():
+            details[name] = {}
+            api.extract_interface_details(block, details[name], vendor)
+        return details
+    if kind == "routes":
+        return api.parse_routes(output, vendor).to_list()
+    if kind == "neighbors":
+        return api.parse_neighbors(output, vendor)
+    raise ValueError(kind)
+
+def expected(vendor, filename):
+    path = FIXTURES / vendor / filename.replace(".txt", ".json")
+    return json.loads(path.read_text(encoding="utf-8"))
+
+@pytest.mark.parametrize("vendor,kind,filename", CASES, ids=[f"{v}-{k}" for v, k, _ in CASES])
+def test_golden_output(api, vendor, kind, filename):
+    assert parse(api, vendor, kind, read_fixture(vendor, filename)) == expected(vendor, filename)
+
+@pytest.mark.parametrize("vendor,kind,filename", CASES, ids=[f"{v}-{k}" for v, k, _ in CASES])
+def test_streamed_lines_match_text(api, vendor, kind, filename):
+    # 大きな出力は行のイテラブルのまま解析されるため、文字列と同じ結果になることを確認
+    output = read_fixture(vendor, filename)
+    assert parse(api, vendor, kind, output.splitlines()) == parse(api, vendor, kind, output)
+
+def test_unknown_vendor_uses_cisco_format(api):
+    output = read_fixture("cisco", "show_ip_route.txt")
+    generic = api.parse_routes(output, api.VendorType.UNKNOWN).to_list()
+    assert generic == expected("cisco", "show_ip_route.txt")
+
+@pytest.mark.parametrize("vendor", list(FIXTURE_FILES))
+def test_routes_are_parsed_while_reading(api, vendor):
+    # ルートは1件ずつ返され、入力を最後まで読む前に RouteTable に追加できる
+    lines = read_fixture(vendor, FIXTURE_FILES[vendor]["routes"]).splitlines()
+    consumed = 0
+
+    def reader():
+        nonlocal consumed
+        for line in lines:
+            consumed += 1
+            yield line
+
+    routes = api.get_parser(api.VendorType(vendor)).parse_routes(reader())
+    assert next(routes) == expected(vendor, FIXTURE_FILES[vendor]["routes"])[0]
+    assert consumed < len(lines)
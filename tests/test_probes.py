@@ -0,0 +1,48 @@
+"""ベンダーごとの実機形式のping/traceroute出力を解析し、記録済みの期待値（.json）と比較する"""
+import pytest
+
+from conftest import FIXTURES, read_fixture
+from test_parsers import expected
+
+# ベンダー -> 出力ファイル（期待値は同じ名前の .json）
+PING_FILES = sorted(
+    (path.parent.name, path.name) for path in FIXTURES.glob("*/ping*.txt")
+)
+TRACEROUTE_FILES = sorted(
+    (path.parent.name, path.name) for path in FIXTURES.glob("*/traceroute*.txt")
+)
+
+def ids(cases):
+    return [f"{vendor}-{filename[:-4]}" for vendor, filename in cases]
+
+@pytest.mark.parametrize("vendor,filename", PING_FILES, ids=ids(PING_FILES))
+def test_ping_golden_output(api, vendor, filename):
+    output = read_fixture(vendor, filename)
+    assert api.parse_ping_result(output, api.VendorType(vendor)) == expected(vendor, filename)
+
+@pytest.mark.parametrize("vendor,filename", PING_FILES, ids=ids(PING_FILES))
+def test_ping_line_by_line_matches_output(api, vendor, filename):
+    # WebSocketでは1行ずつ解析するため、まとめて解析した結果と同じになることを確認
+    state = api.PingState()
+    for line in read_fixture(vendor, filename).splitlines():
+        api.parse_ping_line(line, api.VendorType(vendor), state)
+    assert state.result() == expected(vendor, filename)
+
+@pytest.mark.parametrize("vendor,filename", TRACEROUTE_FILES, ids=ids(TRACEROUTE_FILES))
+def test_traceroute_golden_output(api, vendor, filename):
+    output = read_fixture(vendor, filename)
+    assert api.parse_traceroute(output, api.VendorType(vendor)) == expected(vendor, filename)
+
+@pytest.mark.parametrize("vendor,filename", TRACEROUTE_FILES, ids=ids(TRACEROUTE_FILES))
+def test_traceroute_line_by_line_matches_output(api, vendor, filename):
+    hops = {}
+    for line in read_fixture(vendor, filename).splitlines():
+        hop = api.parse_traceroute_line(line, api.VendorType(vendor))
+        if hop:
+            hops[hop["hop"]] = hop
+    assert [hops[number] for number in sorted(hops)] == expected(vendor, filename)
+
+def test_every_vendor_has_probe_fixtures():
+    vendors = {path.name for path in FIXTURES.iterdir() if path.is_dir()}
+    assert {vendor for vendor, _ in PING_FILES} == vendors
+    assert {vendor for vendor, _ in TRACEROUTE_FILES} == vendors
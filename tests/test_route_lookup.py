@@ -0,0 +1,94 @@
+"""最長一致検索（RouteLookupIndex）と /router/{ip}/lookup"""
+import pytest
+from fastapi.testclient import TestClient
+
+from conftest import read_fixture
+
+IP = "192.0.2.41"
+
+def route(destination, prefix_length, next_hop, protocol="S", distance=1, metric=0):
+    return {
+        "destination": destination,
+        "prefix_length": prefix_length,
+        "next_hop": next_hop,
+        "interface": "GigabitEthernet0/0/0",
+        "protocol": protocol,
+        "metric": metric,
+        "administrative_distance": distance,
+        "type": "Static" if protocol == "S" else "Dynamic",
+    }
+
+DEFAULT = route("0.0.0.0", 0, "203.0.113.1")
+WIDE = route("10.0.0.0", 8, "10.255.0.1")
+NARROW = route("10.1.0.0", 16, "10.255.0.2")
+HOST = route("10.1.2.3", 32, "10.255.0.3")
+V6_DEFAULT = route("::", 0, "2001:db8::1")
+V6_WIDE = route("2001:db8::", 32, "fe80::1")
+V6_NARROW = route("2001:db8:1::", 48, "fe80::2")
+
+@pytest.fixture
+def index(api):
+    return api.RouteLookupIndex([DEFAULT, WIDE, NARROW, HOST, V6_DEFAULT, V6_WIDE, V6_NARROW])
+
+@pytest.mark.parametrize("destination,expected", [
+    ("10.1.2.3", HOST),
+    ("10.1.2.4", NARROW),
+    ("10.2.0.1", WIDE),
+    ("192.0.2.1", DEFAULT),
+    ("2001:db8:1::5", V6_NARROW),
+    ("2001:db8:2::5", V6_WIDE),
+    ("2001:db9::1", V6_DEFAULT),
+])
+def test_longest_prefix_match(index, destination, expected):
+    assert index.lookup(destination) == expected
+
+def test_families_are_separate(api):
+    # IPv4 のデフォルトルートは IPv6 の宛先に一致しない
+    index = api.RouteLookupIndex([DEFAULT])
+    assert index.lookup("2001:db8::1") is None
+    assert api.RouteLookupIndex([V6_DEFAULT]).lookup("192.0.2.1") is None
+
+def test_same_prefix_prefers_lower_distance_then_metric(api):
+    ospf = route("10.1.0.0", 16, "10.255.0.4", protocol="O", distance=110, metric=20)
+    ospf_better = route("10.1.0.0", 16, "10.255.0.5", protocol="O", distance=110, metric=10)
+    # 順序に関係なく管理距離、メトリックの小さいルートを選ぶ
+    assert api.RouteLookupIndex([ospf, NARROW, ospf_better]).lookup("10.1.0.1") == NARROW
+    assert api.RouteLookupIndex([ospf, ospf_better]).lookup("10.1.0.1") == ospf_better
+    assert api.RouteLookupIndex([ospf, ospf_better]).size == 1
+
+def test_invalid_address(index):
+    with pytest.raises(ValueError):
+        index.lookup("10.1.2.300")
+    assert index.lookup_many(["10.1.2.3", "not-an-address"]) == [
+        {"destination": "10.1.2.3", "route": HOST},
+        {"destination": "not-an-address", "route": None, "error": "invalid address"},
+    ]
+
+@pytest.fixture
+def client(api, backend, sessions):
+    command = api.VENDOR_COMMANDS[api.VendorType.CISCO]["routing_table"]
+    backend.outputs[IP, command] = read_fixture("cisco", "show_ip_route.txt")
+    sessions(IP)
+    return TestClient(api.app)
+
+def test_lookup_endpoint(client):
+    body = client.get(f"/router/{IP}/lookup", params={"dst": "10.30.0.9", "fresh": True}).json()
+    assert (body["route"]["destination"], body["route"]["prefix_length"]) == ("10.30.0.0", 24)
+    assert body["truncated"] is False
+    
+    body = client.get(f"/router/{IP}/lookup", params={"dst": "10.255.0.1"}).json()
+    assert (body["route"]["destination"], body["route"]["prefix_length"]) == ("10.255.0.1", 32)
+    
+    response = client.get(f"/router/{IP}/lookup", params={"dst": "10.10.0.256"})
+    assert response.status_code == 400
+
+def test_batch_lookup_endpoint(client):
+    response = client.post(f"/router/{IP}/lookup", params={"fresh": True}, json={"destinations": ["10.40.1.1", "8.8.8.8", "bogus"]})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["routes"] == 9
+    results = body["results"]
+    assert [result["destination"] for result in results] == ["10.40.1.1", "8.8.8.8", "bogus"]
+    assert (results[0]["route"]["destination"], results[0]["route"]["prefix_length"]) == ("10.40.0.0", 16)
+    assert (results[1]["route"]["destination"], results[1]["route"]["prefix_length"]) == ("0.0.0.0", 0)
+    assert results[2] == {"destination": "bogus", "route": None, "error": "invalid address"}
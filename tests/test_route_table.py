@@ -0,0 +1,51 @@
+"""列指向のルートテーブル（RouteTable）"""
+
+def connected(index):
+    return {
+        "destination": f"10.{index // 256}.{index % 256}.0",
+        "prefix_length": 24,
+        "next_hop": "Connected",
+        "interface": f"Vlan{index + 1}",
+        "protocol": "C",
+        "metric": 0,
+        "administrative_distance": 0,
+        "type": "Direct",
+    }
+
+def test_many_interfaces_before_static_route(api):
+    # 300本のVLANインターフェースの後に初めて "S"/"Static" が出てもコードがあふれない
+    routes = [connected(index) for index in range(300)]
+    routes.append({
+        "destination": "0.0.0.0",
+        "prefix_length": 0,
+        "next_hop": "203.0.113.1",
+        "interface": "Vlan1",
+        "protocol": "S",
+        "metric": 0,
+        "administrative_distance": 1,
+        "type": "Static",
+    })
+    table = api.RouteTable.from_routes(routes)
+    assert table.to_list() == routes
+
+def test_more_interfaces_than_uint16(api):
+    # インターフェース名とネクストホップの文字列が65536種類を超えても往復できる
+    routes = [connected(index) for index in range(70000)]
+    for index, route in enumerate(routes):
+        if index % 2:
+            route["next_hop"] = f"fe80::{index:x}"
+            route["protocol"] = "O"
+            route["type"] = "Dynamic"
+    table = api.RouteTable.from_routes(routes)
+    assert len(table) == len(routes)
+    assert table[-1] == routes[-1]
+    assert table.to_list() == routes
+
+def test_large_cisco_output_with_many_vlans(api):
+    lines = [f"C        10.{i // 256}.{i % 256}.0/24 is directly connected, Vlan{i + 1}" for i in range(300)]
+    lines.append("S*    0.0.0.0/0 [1/0] via 203.0.113.1")
+    table = api.parse_routes("\n".join(lines), api.VendorType.CISCO)
+    assert len(table) == 301
+    assert table[-1]["protocol"] == "S"
+    assert table[-1]["type"] == "Static"
+    assert table[299]["interface"] == "Vlan300"
@@ -0,0 +1,87 @@
+"""ルーティングテーブルの差分追跡（RouteTableTracker）と ETag/304"""
+from fastapi.testclient import TestClient
+
+from conftest import read_fixture
+
+IP = "192.0.2.31"
+STATIC_ROUTE = "S        198.51.100.0/24 [1/0] via 10.10.0.254"
+
+def route(destination, next_hop="203.0.113.1", metric=0):
+    return {
+        "destination": destination,
+        "prefix_length": 24,
+        "next_hop": next_hop,
+        "interface": "GigabitEthernet0/0/0",
+        "protocol": "S",
+        "metric": metric,
+        "administrative_distance": 1,
+        "type": "Static",
+    }
+
+A, B, C = route("10.0.1.0"), route("10.0.2.0"), route("10.0.3.0")
+B2 = route("10.0.2.0", metric=10)
+
+def test_changes_since_each_version(api):
+    tracker = api.RouteTableTracker()
+    v1 = tracker.update(IP, [A, B], "d1")
+    # B のメトリック変更と C の追加
+    v2 = tracker.update(IP, [A, B2, C], "d2")
+    # A の削除
+    v3 = tracker.update(IP, api.RouteTable.from_routes([B2, C]), "d3")
+    assert v1 < v2 < v3
+    
+    assert tracker.changes(IP, v3) == {"version": v3, "added": [], "removed": [], "modified": []}
+    assert tracker.changes(IP, v2) == {"version": v3, "added": [], "removed": [A], "modified": []}
+    assert tracker.changes(IP, v1) == {
+        "version": v3,
+        "added": [C],
+        "removed": [A],
+        "modified": [{"before": B, "after": B2}],
+    }
+    # 履歴にないバージョンと未知のルーター
+    assert tracker.changes(IP, v1 - 1) is None
+    assert tracker.changes("192.0.2.32", v1) is None
+    assert tracker.full(IP) == {"version": v3, "full": True, "routes": [B2, C]}
+
+def test_unchanged_routes_keep_version(api):
+    tracker = api.RouteTableTracker()
+    version = tracker.update(IP, [A, B], "d1")
+    assert tracker.update(IP, [A, C], "d1") == version
+    # 生の出力が違っても、ルートが同じならバージョンは変わらない
+    assert tracker.update(IP, [A, B], "d2") == version
+
+def test_etag_and_changes_endpoints(api, backend, sessions, monkeypatch):
+    monkeypatch.setattr(api, "route_tracker", api.RouteTableTracker())
+    command = api.VENDOR_COMMANDS[api.VendorType.CISCO]["routing_table"]
+    output = read_fixture("cisco", "show_ip_route.txt")
+    backend.outputs[IP, command] = output
+    sessions(IP)
+    client = TestClient(api.app)
+    
+    response = client.get(f"/router/{IP}/routing-table")
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+    version = api.route_tracker.version(IP)
+    assert etag == api.route_etag(IP, version)
+    
+    response = client.get(f"/router/{IP}/routing-table", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["ETag"] == etag
+    
+    # ルートが1本増えると ETag が変わり、古い ETag では304にならない
+    backend.outputs[IP, command] = output.rstrip("\n") + "\n" + STATIC_ROUTE + "\n"
+    response = client.get(f"/router/{IP}/routing-table", params={"fresh": True}, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    
+    body = client.get(f"/router/{IP}/routing-table/changes", params={"since": version}).json()
+    assert body["full"] is False
+    assert [(item["destination"], item["prefix_length"]) for item in body["added"]] == [("198.51.100.0", 24)]
+    assert body["removed"] == body["modified"] == []
+    
+    body = client.get(f"/router/{IP}/routing-table/changes", params={"since": 1}).json()
+    assert body["full"] is True
+    assert len(body["routes"]) == len(response.json())
+    
+    assert client.get("/router/192.0.2.32/routing-table/changes").status_code == 404
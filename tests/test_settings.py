@@ -0,0 +1,15 @@
+"""環境変数による設定の検証"""
+import logging
+
+from conftest import load_module
+
+def test_unknown_interface_detail_mode_falls_back(monkeypatch, caplog):
+    monkeypatch.setenv("INTERFACE_DETAIL_MODE", "bogus")
+    with caplog.at_level(logging.ERROR):
+        module = load_module("router_api_bad_detail_mode", "router-api.py")
+    assert module.INTERFACE_DETAIL_MODE == "parallel"
+    assert any("INTERFACE_DETAIL_MODE bogus" in record.getMessage() for record in caplog.records)
+
+def test_interface_detail_mode_from_env(monkeypatch):
+    monkeypatch.setenv("INTERFACE_DETAIL_MODE", "batched")
+    assert load_module("router_api_batched_detail_mode", "router-api.py").INTERFACE_DETAIL_MODE == "batched"
@@ -0,0 +1,83 @@
+"""複数ホップのトポロジ探索（crawl_topology）"""
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+# IP -> [(デバイスID, IP, ローカルIF, リモートIF)]
+NETWORK = {
+    "10.1.0.1": [("r2", "10.1.0.2", "Gi0/0/1", "Gi0/0/0"), ("r3", "10.1.0.3", "Gi0/0/2", "Gi0/0/0")],
+    "10.1.0.2": [("r1", "10.1.0.1", "Gi0/0/0", "Gi0/0/1"), ("r3", "10.1.0.3", "Gi0/0/1", "Gi0/0/1"), ("r4", "10.1.0.4", "Gi0/0/2", "Gi0/0/0")],
+    "10.1.0.3": [("r1", "10.1.0.1", "Gi0/0/0", "Gi0/0/2"), ("r2", "10.1.0.2", "Gi0/0/1", "Gi0/0/1")],
+    "10.1.0.4": [("r2", "10.1.0.2", "Gi0/0/0", "Gi0/0/2"), ("r5", "10.1.0.5", "Gi0/0/1", "Gi0/0/0")],
+}
+
+def cdp_detail(entries):
+    return "".join(
+        "-------------------------\n"
+        f"Device ID: {device_id}\n"
+        "Entry address(es): \n"
+        f"  IP address: {ip}\n"
+        "Platform: Cisco ISR4321/K9,  Capabilities: Router IGMP \n"
+        f"Interface: {local_interface},  Port ID (outgoing port): {remote_interface}\n"
+        "Holdtime : 150 sec\n\n"
+        for device_id, ip, local_interface, remote_interface in entries
+    )
+
+def neighbors(ip):
+    return [
+        {"device_id": device_id, "ip_address": address, "platform": "Cisco ISR4321/K9",
+         "local_interface": local_interface, "remote_interface": remote_interface}
+        for device_id, address, local_interface, remote_interface in NETWORK[ip]
+    ]
+
+def test_graph_deduplicates_devices_and_links(api):
+    graph = api.TopologyGraph()
+    r1 = graph.add_device("Router_10.1.0.1", "Router", "10.1.0.1")
+    graph.add_neighbors(r1, neighbors("10.1.0.1"))
+    # r2 から見た r1 は名前が違っても IP で同じデバイスと判定し、同じリンクは1本にまとめる
+    graph.add_neighbors(graph.find(ip="10.1.0.2"), neighbors("10.1.0.2"))
+    topology = graph.to_dict()
+    assert [device["name"] for device in topology["devices"]] == ["Router_10.1.0.1", "r2", "r3", "r4"]
+    assert len(topology["connections"]) == 4
+
+@pytest.fixture
+def network(api, backend, sessions, monkeypatch):
+    monkeypatch.setattr(api, "topology_store", api.TopologyStore())
+    command = api.VENDOR_COMMANDS[api.VendorType.CISCO]["neighbors"]
+    for ip, entries in NETWORK.items():
+        backend.outputs[ip, command] = cdp_detail(entries)
+        sessions(ip)
+    # r5 は接続済みだが隣接情報を取得できない
+    sessions("10.1.0.5")
+    return backend
+
+def seed(api):
+    return api.RouterInfo(ip="10.1.0.1", username="admin", password="secret", vendor=api.VendorType.CISCO)
+
+def queried(backend):
+    return sorted(ip for ip, _ in backend.calls)
+
+def test_crawl_stops_at_max_depth(api, network):
+    topology = asyncio.run(api.crawl_topology(seed(api), max_depth=2, concurrency=4, fresh=True))
+    # 深さ2未満のデバイスだけに接続し、r3 は2台から見えても1回だけ問い合わせる
+    assert queried(network) == ["10.1.0.1", "10.1.0.2", "10.1.0.3"]
+    depths = {device["name"]: device["depth"] for device in topology["devices"]}
+    assert depths == {"Router_10.1.0.1": 0, "r2": 1, "r3": 1, "r4": 2}
+    links = {tuple(sorted((link["source"], link["target"]))) for link in topology["connections"]}
+    assert links == {("Router_10.1.0.1", "r2"), ("Router_10.1.0.1", "r3"), ("r2", "r3"), ("r2", "r4")}
+    summary = topology["summary"]
+    assert (summary["devices"], summary["connections"], summary["crawled"], summary["depth"]) == (4, 4, 3, 2)
+    assert topology["unreachable"] == []
+
+def test_crawl_reports_unreachable_devices(api, network):
+    response = TestClient(api.app).post("/topology/crawl", json={
+        "ip": "10.1.0.1", "username": "admin", "password": "secret", "vendor": "cisco", "max_depth": 5, "fresh": True,
+    })
+    assert response.status_code == 200
+    topology = response.json()
+    assert queried(network) == ["10.1.0.1", "10.1.0.2", "10.1.0.3", "10.1.0.4", "10.1.0.5"]
+    assert [(device["name"], device["ip"]) for device in topology["unreachable"]] == [("r5", "10.1.0.5")]
+    assert (topology["summary"]["crawled"], topology["summary"]["depth"]) == (5, 4)
+    # 探索で取得した隣接情報は共有のトポロジにも反映される
+    assert len(api.topology_store.snapshot()["connections"]) == 5
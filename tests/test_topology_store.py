@@ -0,0 +1,63 @@
+"""差分更新するトポロジ（TopologyStore）と変更イベント"""
+
+def neighbor(device_id, ip, local_interface, remote_interface, platform="Cisco ISR4321/K9"):
+    return {
+        "device_id": device_id,
+        "ip_address": ip,
+        "platform": platform,
+        "local_interface": local_interface,
+        "remote_interface": remote_interface,
+    }
+
+CORE = neighbor("core-sw-01", "10.0.0.2", "Gi0/0/1", "Gi1/0/24", platform="cisco WS-C3850-24T Switch")
+BRANCH = neighbor("branch-rtr-02", "10.0.0.3", "Gi0/0/2", "Gi0/0/0")
+# branch-rtr-02 側から見た同じリンク
+BRANCH_BACK = neighbor("edge", "10.0.0.1", "Gi0/0/0", "Gi0/0/2")
+
+def summary(events):
+    return [
+        (event["type"], event["device"]["name"] if "device" in event else event["connection"]["target"])
+        for event in events
+    ]
+
+def test_store_emits_only_changes(api):
+    store = api.TopologyStore()
+    queue = store.subscribe()
+    
+    events = store.update("10.0.0.1", "cisco", [CORE, BRANCH], digest="d1")
+    assert summary(events) == [
+        ("device_added", "Router_10.0.0.1"),
+        ("device_added", "core-sw-01"),
+        ("device_added", "branch-rtr-02"),
+        ("link_up", "core-sw-01"),
+        ("link_up", "branch-rtr-02"),
+    ]
+    assert [event["version"] for event in events] == [1, 2, 3, 4, 5]
+    assert [queue.get_nowait() for _ in range(queue.qsize())] == events
+    # 同じ出力なら何も起きない
+    assert store.update("10.0.0.1", "cisco", [CORE, BRANCH], digest="d1") == []
+    
+    # 対向から報告された既存のリンクはイベントにならない
+    assert store.update("10.0.0.3", "cisco", [BRANCH_BACK]) == []
+    # 片方の端から報告されている間は up のまま
+    events = store.update("10.0.0.1", "cisco", [CORE], digest="d2")
+    assert events == []
+    assert len(store.connections) == 2
+    
+    # どちらの端からも報告されなくなると down になり、孤立したデバイスは削除される
+    events = store.forget("10.0.0.3")
+    assert summary(events) == [("link_down", "branch-rtr-02"), ("device_removed", "branch-rtr-02")]
+    events = store.update("10.0.0.1", "cisco", [], digest="d3")
+    assert summary(events) == [("link_down", "core-sw-01"), ("device_removed", "core-sw-01")]
+    assert store.snapshot()["version"] == 9
+    assert [device["name"] for device in store.snapshot()["devices"]] == ["Router_10.0.0.1"]
+    store.unsubscribe(queue)
+
+def test_slow_subscriber_gets_a_snapshot_marker(api, monkeypatch):
+    monkeypatch.setattr(api, "TOPOLOGY_EVENT_QUEUE_SIZE", 2)
+    store = api.TopologyStore()
+    queue = store.subscribe()
+    store.update("10.0.0.1", "cisco", [CORE, BRANCH])
+    # 溢れたイベントは捨て、スナップショットを送り直す合図（None）だけが残る
+    assert queue.get_nowait() is None
+    assert queue.empty()